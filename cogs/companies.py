@@ -2,12 +2,12 @@ import discord
 from discord.ext import commands
 from discord.commands import SlashCommandGroup
 import random
-from datetime import datetime, timedelta
 
 from utils.database import (
     get_pool, 
     get_player,
-    update_player_credits
+    get_guild_settings,
+    update_company_limit
 )
 from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, NEON_YELLOW, NEON_MAGENTA, LINE, THIN_LINE
 
@@ -225,24 +225,22 @@ DEFAULT_COMPANY_LIMIT = 3
 class Companies(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
+        self._app_owner_id = None   # application_info() owner, fetched once
     
     company = SlashCommandGroup("company", "Manage your business empire")
     
     async def _get_company_limit(self, guild_id: int) -> int:
         """Get the company limit for a guild (default: 3)"""
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            result = await conn.fetchrow(
-                "SELECT company_limit FROM guild_settings WHERE guild_id = $1",
-                guild_id
-            )
-            return result['company_limit'] if result else DEFAULT_COMPANY_LIMIT
+        settings = await get_guild_settings(guild_id)
+        return settings['company_limit'] if settings else DEFAULT_COMPANY_LIMIT
     
     async def _has_admin_perms(self, ctx: discord.ApplicationContext) -> bool:
         """Check if user has admin permissions, bot owner, or trusted role"""
-        # Check if user is bot owner
-        app_info = await self.bot.application_info()
-        if ctx.author.id == app_info.owner.id:
+        # Check if user is bot owner (the owner can't change while we run)
+        if self._app_owner_id is None:
+            app_info = await self.bot.application_info()
+            self._app_owner_id = app_info.owner.id
+        if ctx.author.id == self._app_owner_id:
             return True
         
         # Check if user is guild owner
@@ -274,16 +272,7 @@ class Companies(commands.Cog):
                 ephemeral=True
             )
         
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            await conn.execute(
-                """
-                INSERT INTO guild_settings (guild_id, company_limit)
-                VALUES ($1, $2)
-                ON CONFLICT (guild_id) DO UPDATE SET company_limit = $2
-                """,
-                ctx.guild_id, limit
-            )
+        await update_company_limit(ctx.guild_id, limit)
         
         embed = RiskEmbed(title="⚙️ Company Limit Updated", color=NEON_GREEN)
         embed.description = (
@@ -397,18 +386,25 @@ class Companies(commands.Cog):
         
         business_name = name if name else data['name']
         
-        await update_player_credits(player['id'], -data['cost'])
-        
+        # Pay and found in one statement; the cost moves from credits into
+        # asset_value, so net worth is unchanged.
         pool = await get_pool()
         async with pool.acquire() as conn:
             company = await conn.fetchrow(
                 """
+                WITH paid AS (
+                    UPDATE players SET credits = credits - $4, asset_value = asset_value + $4
+                    WHERE id = $1 AND credits >= $4
+                    RETURNING id
+                )
                 INSERT INTO companies (owner_id, company_type, name, last_collect)
-                VALUES ($1, $2, $3, NOW())
+                SELECT id, $2, $3, NOW() FROM paid
                 RETURNING *
                 """,
-                player['id'], company_type, business_name
+                player['id'], company_type, business_name, data['cost']
             )
+        if not company:
+            return await ctx.respond("You can no longer afford this business.", ephemeral=True)
         
         embed = RiskEmbed(title="✅ Business Established", color=NEON_GREEN)
         embed.description = f"**{business_name}**\n`{data['desc']}`\n{LINE}"
@@ -445,16 +441,23 @@ class Companies(commands.Cog):
     
     @company.command(name="status", description="View all your businesses")
     async def company_status(self, ctx: discord.ApplicationContext):
-        player = await get_player(ctx.author.id)
-        if not player:
-            return await ctx.respond("Register first with `/register`.", ephemeral=True)
-        
+        # Per-company rows with the company_portfolios totals alongside
         pool = await get_pool()
         async with pool.acquire() as conn:
-            companies = await conn.fetch(
-                "SELECT * FROM companies WHERE owner_id = $1 ORDER BY id",
-                player['id']
+            rows = await conn.fetch(
+                """SELECT p.id AS player_id, e.*,
+                          pf.hourly_rate AS total_hourly, pf.invested_value AS total_value
+                   FROM players p
+                   LEFT JOIN company_earnings e ON e.owner_id = p.id
+                   LEFT JOIN LATERAL (SELECT hourly_rate, invested_value FROM company_portfolios
+                                      WHERE owner_id = p.id) pf ON TRUE
+                   WHERE p.discord_id = $1
+                   ORDER BY e.id""",
+                ctx.author.id
             )
+        if not rows:
+            return await ctx.respond("Register first with `/register`.", ephemeral=True)
+        companies = [r for r in rows if r['id'] is not None]
         
         if not companies:
             return await ctx.respond(
@@ -469,20 +472,13 @@ class Companies(commands.Cog):
             f"`Portfolio: {len(companies)}/{company_limit} companies`\n{LINE}\n"
         )
         
-        total_value = 0
-        total_hourly = 0
+        total_value = companies[0]['total_value']
+        total_hourly = companies[0]['total_hourly']
         
         for comp in companies:
             comp_data = COMPANY_TYPES[comp['company_type']]
-            
-            minutes_passed = (datetime.now() - comp['last_collect']).total_seconds() / 60
-            active_earnings = int(minutes_passed * comp_data['income_per_min'])
-            stockpiled_earnings = int(comp['stockpiled_minutes'] * comp_data['income_per_min'])
-            total_pending = active_earnings + stockpiled_earnings
-            
-            hourly = comp_data['income_per_min'] * 60
-            total_hourly += hourly
-            total_value += comp_data['cost'] + comp['total_invested']
+            total_pending = comp['pending_earnings']
+            hourly = comp['hourly_rate']
             
             status_emoji = "🟢" if total_pending > 0 else "🟡"
             
@@ -510,16 +506,20 @@ class Companies(commands.Cog):
     
     @company.command(name="collect", description="Collect earnings from all businesses")
     async def collect_earnings(self, ctx: discord.ApplicationContext):
-        player = await get_player(ctx.author.id)
-        if not player:
-            return await ctx.respond("Register first with `/register`.", ephemeral=True)
-        
+        # Round trip 1: the player and every company they own
         pool = await get_pool()
         async with pool.acquire() as conn:
-            companies = await conn.fetch(
-                "SELECT * FROM companies WHERE owner_id = $1",
-                player['id']
+            rows = await conn.fetch(
+                """SELECT p.id AS player_id, e.*
+                   FROM players p LEFT JOIN company_earnings e ON e.owner_id = p.id
+                   WHERE p.discord_id = $1
+                   ORDER BY e.id""",
+                ctx.author.id
             )
+        if not rows:
+            return await ctx.respond("Register first with `/register`.", ephemeral=True)
+        player_id = rows[0]['player_id']
+        companies = [r for r in rows if r['id'] is not None]
         
         if not companies:
             return await ctx.respond(
@@ -529,14 +529,11 @@ class Companies(commands.Cog):
         
         total_earned = 0
         results = []
+        updates = []   # (company id, amount credited, then the row state it was computed from)
         
         for comp in companies:
             comp_data = COMPANY_TYPES[comp['company_type']]
-            
-            minutes_passed = (datetime.now() - comp['last_collect']).total_seconds() / 60
-            active_earnings = int(minutes_passed * comp_data['income_per_min'])
-            stockpiled_earnings = int(comp['stockpiled_minutes'] * comp_data['income_per_min'])
-            total_collect = active_earnings + stockpiled_earnings
+            total_collect = comp['pending_earnings']
             
             if total_collect <= 0:
                 continue
@@ -550,6 +547,7 @@ class Companies(commands.Cog):
                     'sabotage': f"💣 Sabotaged by competitors"
                 }
                 results.append({
+                    'id': comp['id'],
                     'name': comp['name'],
                     'profit': 0,
                     'event': events[event_type]
@@ -558,22 +556,45 @@ class Companies(commands.Cog):
             else:
                 total_earned += total_collect
                 results.append({
+                    'id': comp['id'],
                     'name': comp['name'],
                     'profit': total_collect,
                     'event': None
                 })
-            
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE companies SET last_collect = NOW(), stockpiled_minutes = 0, total_earned = total_earned + $1 WHERE id = $2",
-                    total_collect, comp['id']
-                )
+            updates.append((comp['id'], total_collect, comp['last_collect'],
+                            comp['stockpiled_minutes'], comp['total_invested']))
         
         if total_earned == 0 and not results:
             return await ctx.respond("Nothing to collect yet. Come back later!", ephemeral=True)
         
-        await update_player_credits(player['id'], total_earned)
+        # Round trip 2: every company row and the credit in one statement.  A
+        # row only updates if last_collect, stockpiled_minutes and
+        # total_invested are still what the payout was computed from, so a
+        # concurrent collect can't pay out twice and a concurrent invest's
+        # stockpile isn't wiped.
+        async with pool.acquire() as conn:
+            collected = await conn.fetch(
+                """WITH upd AS (
+                       UPDATE companies c
+                       SET last_collect = NOW(), stockpiled_minutes = 0, total_earned = c.total_earned + u.amount
+                       FROM unnest($1::int[], $2::numeric[], $3::timestamp[], $5::numeric[], $6::numeric[])
+                            AS u(id, amount, seen, minutes, invested)
+                       WHERE c.id = u.id AND c.owner_id = $4 AND c.last_collect = u.seen
+                         AND c.stockpiled_minutes = u.minutes AND c.total_invested = u.invested
+                       RETURNING c.id, u.amount
+                   ), paid AS (
+                       UPDATE players SET credits = GREATEST(0, credits + (SELECT COALESCE(SUM(amount), 0) FROM upd))
+                       WHERE id = $4
+                   )
+                   SELECT id FROM upd""",
+                [u[0] for u in updates], [u[1] for u in updates], [u[2] for u in updates], player_id,
+                [u[3] for u in updates], [u[4] for u in updates]
+            )
+        collected_ids = {r['id'] for r in collected}
+        if not collected_ids:
+            return await ctx.respond("Those businesses changed while collecting. Check `/company status`.", ephemeral=True)
+        results = [r for r in results if r['id'] in collected_ids]
+        total_earned = sum(r['profit'] for r in results)
         
         embed = RiskEmbed(
             title="💰 COLLECTION COMPLETE",
@@ -603,43 +624,50 @@ class Companies(commands.Cog):
         company_id: discord.Option(int, "Company ID from /company status"),
         amount: discord.Option(int, "Amount to invest (buys earning hours)")
     ):
-        player = await get_player(ctx.author.id)
-        if not player:
-            return await ctx.respond("Register first with `/register`.", ephemeral=True)
-        
         if amount < 100:
             return await ctx.respond("Minimum investment is 100 ₵.", ephemeral=True)
         
-        if player['credits'] < amount:
-            return await ctx.respond(
-                f"You only have `{player['credits']:,.0f} ₵`.",
-                ephemeral=True
-            )
-        
         pool = await get_pool()
         async with pool.acquire() as conn:
             company = await conn.fetchrow(
-                "SELECT * FROM companies WHERE id = $1 AND owner_id = $2",
-                company_id, player['id']
+                """SELECT p.id AS player_id, p.credits, e.id, e.name, e.hourly_rate
+                   FROM players p LEFT JOIN company_earnings e ON e.id = $2 AND e.owner_id = p.id
+                   WHERE p.discord_id = $1""",
+                ctx.author.id, company_id
             )
-        
         if not company:
-            return await ctx.respond("You don't own that company.", ephemeral=True)
+            return await ctx.respond("Register first with `/register`.", ephemeral=True)
+        
+        if company['credits'] < amount:
+            return await ctx.respond(
+                f"You only have `{company['credits']:,.0f} ₵`.",
+                ephemeral=True
+            )
         
-        comp_data = COMPANY_TYPES[company['company_type']]
+        if company['id'] is None:
+            return await ctx.respond("You don't own that company.", ephemeral=True)
         
-        hourly_rate = comp_data['income_per_min'] * 60
+        hourly_rate = company['hourly_rate']
         hours_bought = amount / hourly_rate
         minutes_bought = hours_bought * 60
         
-        await update_player_credits(player['id'], -amount)
-        
-        pool = await get_pool()
+        # Charge and stockpile together: the charge only goes through if the
+        # balance still covers it and the company still exists.
         async with pool.acquire() as conn:
-            await conn.execute(
-                "UPDATE companies SET stockpiled_minutes = stockpiled_minutes + $1, total_invested = total_invested + $2 WHERE id = $3",
-                minutes_bought, amount, company_id
+            invested = await conn.fetchval(
+                """WITH paid AS (
+                       UPDATE players SET credits = credits - $2, asset_value = asset_value + $2
+                       WHERE id = $1 AND credits >= $2
+                         AND EXISTS (SELECT 1 FROM companies WHERE id = $3 AND owner_id = $1)
+                       RETURNING id
+                   )
+                   UPDATE companies SET stockpiled_minutes = stockpiled_minutes + $4, total_invested = total_invested + $2
+                   WHERE id = $3 AND owner_id IN (SELECT id FROM paid)
+                   RETURNING id""",
+                company['player_id'], amount, company_id, minutes_bought
             )
+        if invested is None:
+            return await ctx.respond("Investment failed — check your balance and `/company status`.", ephemeral=True)
         
         embed = RiskEmbed(title="📈 Investment Processed", color=NEON_GREEN)
         embed.description = (
@@ -657,36 +685,44 @@ class Companies(commands.Cog):
         ctx: discord.ApplicationContext,
         company_id: discord.Option(int, "Company ID from /company status")
     ):
-        player = await get_player(ctx.author.id)
-        if not player:
-            return await ctx.respond("Register first with `/register`.", ephemeral=True)
-        
         pool = await get_pool()
         async with pool.acquire() as conn:
             company = await conn.fetchrow(
-                "SELECT * FROM companies WHERE id = $1 AND owner_id = $2",
-                company_id, player['id']
+                """SELECT p.id AS player_id, e.*
+                   FROM players p LEFT JOIN company_earnings e ON e.id = $2 AND e.owner_id = p.id
+                   WHERE p.discord_id = $1""",
+                ctx.author.id, company_id
             )
-        
         if not company:
-            return await ctx.respond("You don't own that company.", ephemeral=True)
-        
-        comp_data = COMPANY_TYPES[company['company_type']]
+            return await ctx.respond("Register first with `/register`.", ephemeral=True)
         
-        minutes_passed = (datetime.now() - company['last_collect']).total_seconds() / 60
-        uncollected = int(minutes_passed * comp_data['income_per_min'])
-        stockpiled = int(company['stockpiled_minutes'] * comp_data['income_per_min'])
-        final_payout = uncollected + stockpiled
+        if company['id'] is None:
+            return await ctx.respond("You don't own that company.", ephemeral=True)
         
-        total_investment = comp_data['cost'] + company['total_invested']
-        salvage_value = int(total_investment * 0.6)
+        final_payout = company['pending_earnings']
+        salvage_value = company['salvage_value']
         total_return = salvage_value + final_payout
         
-        await update_player_credits(player['id'], total_return)
-        
-        pool = await get_pool()
+        # Delete and pay out in one statement.  A collect or invest in
+        # between changes last_collect, stockpiled_minutes or total_invested
+        # (and so the payout), and then nothing happens.
         async with pool.acquire() as conn:
-            await conn.execute("DELETE FROM companies WHERE id = $1", company_id)
+            closed = await conn.fetchval(
+                """WITH gone AS (
+                       DELETE FROM companies
+                       WHERE id = $1 AND owner_id = $2 AND last_collect = $3
+                         AND stockpiled_minutes = $6 AND total_invested = $7
+                       RETURNING id
+                   ), paid AS (
+                       UPDATE players SET credits = credits + $4, asset_value = asset_value - $5
+                       WHERE id = $2 AND EXISTS (SELECT 1 FROM gone)
+                   )
+                   SELECT id FROM gone""",
+                company_id, company['player_id'], company['last_collect'], total_return,
+                company['invested_value'], company['stockpiled_minutes'], company['total_invested']
+            )
+        if closed is None:
+            return await ctx.respond("That company changed while closing — try again.", ephemeral=True)
         
         embed = RiskEmbed(title="🗑️ Business Closed", color=NEON_YELLOW)
         embed.description = f"Shut down **{company['name']}**.\n{LINE}"
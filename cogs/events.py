@@ -1,118 +1,70 @@
 # cogs/events.py
 import discord
 import random
-import asyncio
-from discord.ext import commands, tasks
-from utils.database import (
-    get_all_territories, log_event, update_player_credits, update_player_hp
-)
-from utils.game_data import RANDOM_EVENTS
-from utils.styles import RiskEmbed, NEON_RED
-import os
+from discord.ext import commands
+from utils.database import apply_event, set_announce_channel
+from utils.game_data import RANDOM_EVENTS, IMPLANTS
+from utils.modifiers import resolve_modifier
+from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, event_embed
 
-GUILD_ID = int(os.getenv("DISCORD_GUILD_ID", "0"))
-EVENT_CHANNEL_NAME = "city-events"  # The bot will try to post here
+EVENT_KEYS = [e["key"] for e in RANDOM_EVENTS]
 
 
 class EventsCog(commands.Cog, name="Events"):
-    """Background random event system — fires every 30 minutes."""
+    """Random city events — fired by the scheduler (see ScheduledTasks.random_events)."""
 
     def __init__(self, bot):
         self.bot = bot
-        self.event_loop.start()
-
-    def cog_unload(self):
-        self.event_loop.cancel()
-
-    # ── Periodic event loop ──────────────────────────────────
-    @tasks.loop(minutes=30)
-    async def event_loop(self):
-        guild = self.bot.get_guild(GUILD_ID)
-        if not guild:
-            # Try to fetch if not cached
-            try:
-                guild = await self.bot.fetch_guild(GUILD_ID)
-            except Exception:
-                return
-
-        # Find or create the events channel
-        channel = None
-        for ch in guild.text_channels:
-            if ch.name == EVENT_CHANNEL_NAME:
-                channel = ch
-                break
-        if not channel:
-            try:
-                channel = await guild.create_text_channel(
-                    EVENT_CHANNEL_NAME,
-                    reason="Riskpunk event channel"
-                )
-            except Exception:
-                return  # No permission
-
-        # Pick a random event
-        event = random.choice(RANDOM_EVENTS)
-        await log_event(event["key"])
-
-        # Post the embed
-        embed = event_embed(event)
-        await channel.send(embed=embed)
-
-        # ── Apply mechanical effects ───────────────────────
-        # Credit modifier to ALL players
-        if event["credit_mod"] != 0:
-            from utils.database import get_db
-            async with await get_db() as db:
-                # Fetch all players
-                cur = await db.execute("SELECT discord_id FROM players")
-                players = await cur.fetchall()
-                for p in players:
-                    await update_player_credits(p["discord_id"], event["credit_mod"])
-
-        # Virus outbreak — damage HP
-        if event["key"] == "virus_outbreak":
-            from utils.database import get_db
-            async with await get_db() as db:
-                cur = await db.execute("SELECT discord_id, id FROM players")
-                players = await cur.fetchall()
-                for p in players:
-                    # Check if they own a MedKit
-                    cur2 = await db.execute(
-                        "SELECT quantity FROM inventory WHERE player_id = ? AND item_name = 'MedKit'",
-                        (p["id"],)
-                    )
-                    has_kit = await cur2.fetchone()
-                    if not has_kit or has_kit["quantity"] <= 0:
-                        await update_player_hp(p["discord_id"], -15)
-
-        # Gang war — boost Void Street defense
-        if event["key"] == "gang_war":
-            from utils.database import get_db
-            async with await get_db() as db:
-                await db.execute(
-                    "UPDATE territories SET defense = MIN(100, defense + 20) WHERE key = 'void_street'"
-                )
-                await db.commit()
 
     # ── Manual trigger (admin) ───────────────────────────────
     @discord.slash_command(name="trigger_event", description="[ADMIN] Manually trigger a random city event.")
-    async def trigger_event(self, ctx: discord.ApplicationContext):
+    @discord.option("event", description="Event to fire (random if omitted)", choices=EVENT_KEYS, required=False, default=None)
+    @discord.option("dry_run", description="Report who would be affected without applying anything", type=bool, default=False)
+    async def trigger_event(self, ctx: discord.ApplicationContext, event: str, dry_run: bool):
         # Simple admin check — only guild owner
-        if ctx.guild and ctx.author.id != ctx.guild.owner_id:
+        if not ctx.guild or ctx.author.id != ctx.guild.owner_id:
+            await ctx.respond(content="Admin only.", ephemeral=True)
+            return
+        await ctx.defer(ephemeral=dry_run)
+        chosen = next((e for e in RANDOM_EVENTS if e["key"] == event), None) or random.choice(RANDOM_EVENTS)
+        modifier = resolve_modifier(chosen.get("modifier"), IMPLANTS)
+        result = await apply_event(chosen, modifier, dry_run=dry_run)
+
+        if dry_run:
+            embed = RiskEmbed(title=f"🧪 DRY RUN — {chosen['title']}", color=NEON_CYAN)
+            embed.description = "`Rolled back.  Nothing was applied.`"
+        else:
+            embed = event_embed(chosen)
+        mod_text = f"{modifier['subsystem']} for {modifier['minutes']} min" if modifier else "none"
+        embed.add_field(
+            name="📊 Would Apply" if dry_run else "📊 Applied",
+            value=(
+                f"Players changed: `{result['players']}`\n"
+                f"Players hurt: `{result['hurt']}`\n"
+                f"Modifier: `{mod_text}`\n"
+                f"⏱️ `{result['duration'] * 1000:.1f} ms`"
+            ),
+            inline=False
+        )
+        await ctx.followup.send(embed=embed)
+
+    # ── Announcement channel (admin) ─────────────────────────
+    @discord.slash_command(name="set_announcements", description="[ADMIN] Choose where city events, income and war reports are posted.")
+    @discord.option("channel", description="Channel to post in (omit to pick automatically)", type=discord.TextChannel, required=False, default=None)
+    async def set_announcements(self, ctx: discord.ApplicationContext, channel: discord.TextChannel):
+        if not ctx.guild or ctx.author.id != ctx.guild.owner_id:
             await ctx.respond(content="Admin only.", ephemeral=True)
             return
-        event = random.choice(RANDOM_EVENTS)
-        await log_event(event["key"])
-        embed = event_embed(event)
-        # Apply effects
-        if event["credit_mod"] != 0:
-            from utils.database import get_db
-            async with await get_db() as db:
-                cur = await db.execute("SELECT discord_id FROM players")
-                players = await cur.fetchall()
-                for p in players:
-                    await update_player_credits(p["discord_id"], event["credit_mod"])
-        await ctx.respond(embed=embed)
+        if channel and not channel.permissions_for(ctx.guild.me).send_messages:
+            await ctx.respond(content=f"I can't post in {channel.mention}.", ephemeral=True)
+            return
+        await set_announce_channel(ctx.guild.id, channel.id if channel else None)
+        embed = RiskEmbed(title="📢 Announcements Routed", color=NEON_GREEN)
+        embed.description = (
+            f"City announcements will be posted in {channel.mention}." if channel else
+            "Announcements will go to `#city-events`, or the first channel I can post in."
+        )
+        await ctx.respond(embed=embed, ephemeral=True)
 
 
 def setup(bot):
@@ -1,14 +1,13 @@
 # cogs/factions.py
 import discord
-import random
 from discord.ext import commands
 from utils.database import (
     get_all_factions, get_faction, get_faction_members,
-    get_player, set_player_faction, declare_war, get_active_wars, resolve_war,
-    get_all_territories, claim_territory, update_player_credits, update_player_xp
+    get_player, set_player_faction, declare_war, get_active_wars
 )
 from utils.game_data import FACTIONS_SEED
-from utils.styles import RiskEmbed, NEON_CYAN, NEON_RED, NEON_GREEN, NEON_MAGENTA, LINE, FACTION_COLORS
+from utils.war_engine import WAR_TICK_MINUTES, WAR_VICTORY_CREDITS, WAR_VICTORY_XP
+from utils.styles import RiskEmbed, NEON_CYAN, NEON_RED, NEON_MAGENTA, LINE, FACTION_COLORS
 
 
 class FactionsCog(commands.Cog, name="Factions"):
@@ -73,7 +72,7 @@ class FactionsCog(commands.Cog, name="Factions"):
         await ctx.respond(embed=embed)
 
     # ── /factions war ────────────────────────────────────────
-    @factions_grp.command(name="war", description="Declare war on another faction (faction leader only — simulated).")
+    @factions_grp.command(name="war", description="Declare war on another faction — battles play out every few minutes.")
     @discord.option("target_faction", description="Enemy faction codename")
     async def factions_war(self, ctx: discord.ApplicationContext, target_faction: str):
         player = await get_player(ctx.author.id)
@@ -101,35 +100,15 @@ class FactionsCog(commands.Cog, name="Factions"):
                 await ctx.respond(embed=RiskEmbed(title="⚠️ War Already Active", description=f"**{attacker['name']}** and **{defender['name']}** are already at war.", color=NEON_RED), ephemeral=True)
                 return
         war = await declare_war(attacker["id"], defender["id"])
-        # Simulate the war instantly with a dice roll weighted by aggression + random
-        atk_power = attacker["aggression"] + random.randint(10, 60)
-        def_power = defender["aggression"] + random.randint(10, 60)
-        winner_faction = attacker if atk_power >= def_power else defender
-        loser_faction  = defender if atk_power >= def_power else attacker
-        await resolve_war(war["id"], winner_faction["id"])
-        # Winner claims a random unclaimed or enemy territory
-        territories = await get_all_territories()
-        claimable = [t for t in territories if t["owner_faction"] != winner_faction["id"]]
-        if claimable:
-            prize = random.choice(claimable)
-            await claim_territory(prize["key"], winner_faction["id"])
-            prize_text = f"\n🗺️ **{winner_faction['name']}** seized **{prize['name']}**!"
-        else:
-            prize_text = ""
-        # Reward all members of the winning faction
-        winners = await get_faction_members(winner_faction["id"])
-        for w in winners:
-            await update_player_credits(w["discord_id"], 2000)
-            await update_player_xp(w["discord_id"], 150)
-        embed = RiskEmbed(title="⚔️ WAR RESOLVED", color=NEON_GREEN)
+        # Battles are fought by the war engine tick (cogs/scheduled_tasks.py)
+        embed = RiskEmbed(title="⚔️ WAR DECLARED", color=NEON_RED)
         embed.description = (
             f"{LINE}\n"
-            f"**{attacker['name']}** vs **{defender['name']}**\n"
+            f"**{attacker['name']}** vs **{defender['name']}**  ┆  War #{war['id']}\n"
             f"{LINE}\n"
-            f"⚡ ATK Power: `{atk_power}`  ┆  DEF Power: `{def_power}`\n"
-            f"🏆 **VICTOR: {winner_faction['name']}**\n"
-            f"{prize_text}\n"
-            f"💰 All {winner_faction['name']} members: `+2,000 ₵` & `+150 XP`\n"
+            f"⏱️ A battle is fought every `{WAR_TICK_MINUTES} min` — the victor seizes a border district.\n"
+            f"🏆 The war ends when one side holds no territory.\n"
+            f"💰 Every member of the victorious faction: `+{WAR_VICTORY_CREDITS:,} ₵` & `+{WAR_VICTORY_XP} XP`\n"
             f"{LINE}"
         )
         await ctx.respond(embed=embed)
@@ -2,7 +2,7 @@
 import discord
 from discord.ext import commands
 from utils.database import get_leaderboard
-from utils.styles import RiskEmbed, NEON_YELLOW
+from utils.styles import RiskEmbed, NEON_YELLOW, leaderboard_embed
 
 
 class LeaderboardCog(commands.Cog, name="Leaderboard"):
@@ -40,6 +40,15 @@ class LeaderboardCog(commands.Cog, name="Leaderboard"):
             return
         await ctx.respond(embed=leaderboard_embed(players, "Rep"))
 
+    # ── /leaderboard networth ────────────────────────────────
+    @leaderboard_grp.command(name="networth", description="Top 10 by net worth: credits, gear, implants and companies.")
+    async def lb_networth(self, ctx: discord.ApplicationContext):
+        players = await get_leaderboard("networth", 10)
+        if not players:
+            await ctx.respond(embed=RiskEmbed(title="🏆 No Data", description="No data.", color=NEON_YELLOW))
+            return
+        await ctx.respond(embed=leaderboard_embed(players, "Net Worth"))
+
 
 def setup(bot):
     bot.add_cog(LeaderboardCog(bot))
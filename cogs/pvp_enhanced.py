@@ -2,100 +2,33 @@
 # Enhanced PvP system with ranking, achievements, and combat stances
 
 import discord
+import asyncio
+import json
+import logging
 import random
-from discord.ext import commands
+import time
+from discord.ext import commands, tasks
 from utils.database import (
     get_player, get_player_implants, get_player_skills, get_equipped_items,
     update_player_hp, update_player_xp, update_player_credits, log_pvp,
-    set_hp_absolute, get_pool
+    get_pvp_match, set_hp_absolute, get_pool,
+    record_pvp_result, recompute_pvp_ratings, get_pvp_elo, get_combat_loadouts, world_modifiers
+)
+from utils.elo import ELO_K_FACTOR
+from utils.combat import (
+    COMBAT_STANCES, ENGINE_VERSION, compute_effective_stats, simulate_duel,
+    new_seed, duel_snapshot, replay_duel
 )
-from utils.game_data import IMPLANTS, ITEM_CATALOG
 from utils.styles import RiskEmbed, NEON_CYAN, NEON_RED, NEON_GREEN, NEON_YELLOW, LINE
 from utils.economy import PVP_WIN_REWARD, PVP_WIN_XP, PVP_ENTRY_FEE
 from utils.cooldowns import check_cooldown, set_cooldown, format_cooldown_time
+from utils.matchmaking import MatchQueue, search_window
 
+logger = logging.getLogger('riskpunk')
 
-# Combat stances
-COMBAT_STANCES = {
-    "aggressive": {
-        "name": "Aggressive",
-        "desc": "High damage, low defense",
-        "atk_mult": 1.3,
-        "def_mult": 0.7,
-        "emoji": "⚔️"
-    },
-    "defensive": {
-        "name": "Defensive", 
-        "desc": "Low damage, high defense",
-        "atk_mult": 0.7,
-        "def_mult": 1.3,
-        "emoji": "🛡️"
-    },
-    "balanced": {
-        "name": "Balanced",
-        "desc": "Normal damage and defense",
-        "atk_mult": 1.0,
-        "def_mult": 1.0,
-        "emoji": "⚖️"
-    },
-    "tactical": {
-        "name": "Tactical",
-        "desc": "Bonus to speed, normal damage/def",
-        "atk_mult": 1.0,
-        "def_mult": 1.0,
-        "spd_mult": 1.2,
-        "emoji": "🎯"
-    }
-}
-
-
-def _compute_effective_stats(player, implants, skills, equipped_items, stance="balanced"):
-    """Return dict with effective atk, def, spd, max_hp after all bonuses + stance."""
-    stats = {
-        "atk":    player["atk"],
-        "def":    player["def"],
-        "spd":    player["spd"],
-        "max_hp": player["max_hp"],
-        "hp":     player["hp"],
-    }
-    
-    # Apply implant bonuses
-    for imp in implants:
-        data = IMPLANTS.get(imp["implant_key"], {})
-        for stat, val in data.get("bonuses", {}).items():
-            if stat in stats:
-                stats[stat] += val
-    
-    # Apply skill bonuses
-    skill_bonus_keys = ["combat_basics", "dual_strike", "killswitch",
-                        "shadow_step", "ghost_protocol", "phantom_strike", "god_mode"]
-    from utils.game_data import SKILL_TREE
-    for s in skills:
-        if s["skill_key"] in skill_bonus_keys:
-            tree_data = SKILL_TREE.get(s["skill_key"], {})
-            for stat, val in tree_data.get("bonus", {}).items():
-                if stat in stats:
-                    stats[stat] += val * s["level"]
-    
-    # Apply equipment bonuses
-    for eq_item in equipped_items:
-        item_data = ITEM_CATALOG.get(eq_item["item_name"], {})
-        if 'atk_bonus' in item_data:
-            stats["atk"] += item_data['atk_bonus']
-        if 'def_bonus' in item_data:
-            stats["def"] += item_data['def_bonus']
-        if 'spd_bonus' in item_data:
-            stats["spd"] += item_data['spd_bonus']
-    
-    # Apply stance modifiers
-    stance_data = COMBAT_STANCES.get(stance, COMBAT_STANCES["balanced"])
-    stats["atk"] = int(stats["atk"] * stance_data["atk_mult"])
-    stats["def"] = int(stats["def"] * stance_data["def_mult"])
-    stats["spd"] = int(stats["spd"] * stance_data.get("spd_mult", 1.0))
-    
-    # Clamp hp
-    stats["hp"] = min(stats["hp"], stats["max_hp"])
-    return stats
+MATCH_TICK_SECONDS = 5
+MATCH_BATCH = 200          # Max pairs resolved per tick
+MATCH_CONCURRENCY = 4      # Pairs settled in parallel (DB pool is 10)
 
 
 class PvPEnhancedCog(commands.Cog, name="PvP Enhanced"):
@@ -103,6 +36,11 @@ class PvPEnhancedCog(commands.Cog, name="PvP Enhanced"):
 
     def __init__(self, bot):
         self.bot = bot
+        self.queue = MatchQueue()
+        self.matchmaking_tick.start()
+
+    def cog_unload(self):
+        self.matchmaking_tick.cancel()
 
     pvp_grp = discord.SlashCommandGroup("pvp", "PvP combat system")
 
@@ -170,107 +108,217 @@ class PvPEnhancedCog(commands.Cog, name="PvP Enhanced"):
         p2_equipped  = await get_equipped_items(p2["id"])
 
         # Opponent uses balanced stance by default
-        s1 = _compute_effective_stats(p1, p1_implants, p1_skills, p1_equipped, stance)
-        s2 = _compute_effective_stats(p2, p2_implants, p2_skills, p2_equipped, "balanced")
-
-        # Simulate combat
-        hp1 = s1["hp"]
-        hp2 = s2["hp"]
-        rounds = 0
-        max_rounds = 50
-        log_lines = []
-
-        # Determine who goes first
-        if s1["spd"] > s2["spd"]:
-            first, second = 1, 2
-        elif s2["spd"] > s1["spd"]:
-            first, second = 2, 1
-        else:
-            first, second = random.choice([(1, 2), (2, 1)])
-
-        while hp1 > 0 and hp2 > 0 and rounds < max_rounds:
-            rounds += 1
-            for attacker_id in [first, second]:
-                if hp1 <= 0 or hp2 <= 0:
-                    break
-                if attacker_id == 1:
-                    a_name, a_stats = p1["name"], s1
-                    d_name, d_stats = p2["name"], s2
-                    raw_dmg = a_stats["atk"] + random.randint(0, max(1, a_stats["atk"] // 2))
-                    actual_dmg = max(1, raw_dmg - d_stats["def"] + random.randint(-3, 3))
-                    hp2 -= actual_dmg
-                    log_lines.append(f"Rnd {rounds}: {a_name} → {actual_dmg} dmg  [{d_name} HP: {max(0, hp2)}]")
-                else:
-                    a_name, a_stats = p2["name"], s2
-                    d_name, d_stats = p1["name"], s1
-                    raw_dmg = a_stats["atk"] + random.randint(0, max(1, a_stats["atk"] // 2))
-                    actual_dmg = max(1, raw_dmg - d_stats["def"] + random.randint(-3, 3))
-                    hp1 -= actual_dmg
-                    log_lines.append(f"Rnd {rounds}: {a_name} → {actual_dmg} dmg  [{d_name} HP: {max(0, hp1)}]")
-
-        # Determine winner
-        if hp1 > 0 and hp2 <= 0:
-            winner_name = p1["name"]
-            winner_discord = p1["discord_id"]
-            loser_discord  = p2["discord_id"]
-            winner_id      = p1["id"]
-        elif hp2 > 0 and hp1 <= 0:
-            winner_name = p2["name"]
-            winner_discord = p2["discord_id"]
-            loser_discord  = p1["discord_id"]
-            winner_id      = p2["id"]
-        else:
-            winner_name = "DRAW"
-            winner_discord = None
-            loser_discord  = None
-            winner_id      = None
-
-        # Apply consequences
-        if winner_discord:
-            await update_player_xp(winner_discord, PVP_WIN_XP)
-            await update_player_credits(winner_discord, PVP_WIN_REWARD)
-            
-            # Update HP
-            if winner_id == p1["id"]:
-                await set_hp_absolute(p1["discord_id"], max(1, hp1))
-                await set_hp_absolute(p2["discord_id"], 1)
-            else:
-                await set_hp_absolute(p2["discord_id"], max(1, hp2))
-                await set_hp_absolute(p1["discord_id"], 1)
-            
-            # Loser loses entry fee
-            await update_player_credits(loser_discord, -PVP_ENTRY_FEE)
-            
-            # Update PvP stats
-            await _update_pvp_stats(winner_id, True)
-            await _update_pvp_stats(p1["id"] if winner_id == p2["id"] else p2["id"], False)
+        world = world_modifiers().combat_effects()
+        s1 = compute_effective_stats(p1, p1_implants, p1_skills, p1_equipped, stance, world)
+        s2 = compute_effective_stats(p2, p2_implants, p2_skills, p2_equipped, "balanced", world)
+
+        duel = await _settle_duel(p1, s1, stance, p2, s2, "balanced")
 
         # Set cooldown
         set_cooldown("pvp", ctx.author.id)
         
-        # Log & respond
-        await log_pvp(p1["id"], p2["id"], winner_id, rounds, "\n".join(log_lines[-30:]))
+        await ctx.respond(embed=_duel_embed(p1, stance, p2, duel))
+
+    # ── /pvp queue ────────────────────────────────────────────────
+    @pvp_grp.command(name="queue", description="Join the ranked queue and get matched by rating.")
+    @discord.option("stance", description="Combat stance", choices=list(COMBAT_STANCES.keys()), default="balanced")
+    async def pvp_queue(self, ctx: discord.ApplicationContext, stance: str):
+        is_ready, remaining = check_cooldown("pvp", ctx.author.id)
+        if not is_ready:
+            await ctx.respond(
+                embed=RiskEmbed(
+                    title="⏱️ Cooldown Active",
+                    description=f"You can duel again in `{format_cooldown_time(remaining)}`",
+                    color=NEON_RED
+                ),
+                ephemeral=True
+            )
+            return
+
+        player = await get_player(ctx.author.id)
+        if not player:
+            await ctx.respond(content="Not registered.", ephemeral=True)
+            return
+        if player["id"] in self.queue:
+            await ctx.respond(content="You're already queued. `/pvp leave` to drop out.", ephemeral=True)
+            return
+        if player["credits"] < PVP_ENTRY_FEE:
+            await ctx.respond(
+                embed=RiskEmbed(
+                    title="💸 Insufficient Credits",
+                    description=f"PvP entry fee: `{PVP_ENTRY_FEE} ₵`",
+                    color=NEON_RED
+                ),
+                ephemeral=True
+            )
+            return
+
+        elo = await get_pvp_elo(player["id"])
+        self.queue.join(player["id"], elo, stance=stance, channel_id=ctx.channel_id)
+        embed = RiskEmbed(title="📡 Searching for Opponent", color=NEON_CYAN)
+        embed.description = (
+            f"ELO `{elo}`  ┆  Stance {COMBAT_STANCES[stance]['emoji']} `{stance}`\n"
+            f"Runners in queue: `{len(self.queue)}`\n"
+            f"{LINE}\n"
+            f"`Search widens from ±{search_window(0)} the longer you wait. The loser pays the {PVP_ENTRY_FEE} ₵ entry fee.`"
+        )
+        await ctx.respond(embed=embed, ephemeral=True)
+
+    # ── /pvp leave ────────────────────────────────────────────────
+    @pvp_grp.command(name="leave", description="Leave the ranked queue.")
+    async def pvp_leave(self, ctx: discord.ApplicationContext):
+        player = await get_player(ctx.author.id)
+        if not player or self.queue.leave(player["id"]) is None:
+            await ctx.respond(content="You aren't queued.", ephemeral=True)
+            return
+        await ctx.respond(content="Left the ranked queue.", ephemeral=True)
+
+    # ── Matchmaking tick ──────────────────────────────────────────
+    @tasks.loop(seconds=MATCH_TICK_SECONDS)
+    async def matchmaking_tick(self):
+        pairs = self.queue.pop_matches(limit=MATCH_BATCH)
+        if not pairs:
+            return
+        started = set()     # Pairs handed to _resolve_queued; never requeued
+        try:
+            ids = [e["player_id"] for pair in pairs for e in pair]
+            loadouts = await get_combat_loadouts(ids)
+            gate = asyncio.Semaphore(MATCH_CONCURRENCY)
+
+            async def run(n, a, b):
+                async with gate:
+                    started.add(n)
+                    try:
+                        await self._resolve_queued(a, b, loadouts)
+                    except Exception as e:
+                        logger.error(f"Queued duel {a['player_id']} vs {b['player_id']} failed: {e}")
+
+            await asyncio.gather(*(run(n, a, b) for n, (a, b) in enumerate(pairs)))
+        except Exception as e:
+            # An exception escaping the loop would stop matchmaking for good
+            waiting = [pair for n, pair in enumerate(pairs) if n not in started]
+            logger.error(f"Matchmaking tick failed, requeueing {len(waiting)} pairs: {e}")
+            for pair in waiting:
+                for entry in pair:
+                    self._requeue(entry)
+
+    def _requeue(self, entry: dict):
+        """Put a popped entry back in line, keeping its place in the search window."""
+        if entry["player_id"] not in self.queue:
+            self.queue.join(entry["player_id"], entry["elo"], now=entry["joined_at"],
+                            stance=entry["stance"], channel_id=entry["channel_id"])
+
+    @matchmaking_tick.before_loop
+    async def before_matchmaking_tick(self):
+        await self.bot.wait_until_ready()
+
+    async def _resolve_queued(self, a: dict, b: dict, loadouts: dict):
+        la, lb = loadouts.get(a["player_id"]), loadouts.get(b["player_id"])
+        # Anyone who can no longer pay drops out; their partner goes back in line
+        for entry, other, lo in ((a, b, la), (b, a, lb)):
+            if not lo or lo["player"]["credits"] < PVP_ENTRY_FEE:
+                other_lo = loadouts.get(other["player_id"])
+                if other_lo and other_lo["player"]["credits"] >= PVP_ENTRY_FEE:
+                    self._requeue(other)
+                return
+
+        # No prepay: _settle_duel charges the loser the entry fee
+        p1, p2 = la["player"], lb["player"]
+        world = world_modifiers().combat_effects()
+        s1 = compute_effective_stats(p1, la["implants"], la["skills"], la["equipped"], a["stance"], world)
+        s2 = compute_effective_stats(p2, lb["implants"], lb["skills"], lb["equipped"], b["stance"], world)
+        duel = await _settle_duel(p1, s1, a["stance"], p2, s2, b["stance"])
+        set_cooldown("pvp", p1["discord_id"])
+        set_cooldown("pvp", p2["discord_id"])
+
+        embed = _duel_embed(p1, a["stance"], p2, duel)
+        for channel_id in {a["channel_id"], b["channel_id"]}:
+            channel = self.bot.get_channel(channel_id)
+            if channel:
+                await channel.send(content=f"<@{p1['discord_id']}> vs <@{p2['discord_id']}>", embed=embed)
+
+    # ── /pvp replay ───────────────────────────────────────────────
+    @pvp_grp.command(name="replay", description="Regenerate the full battle log of a past duel.")
+    @discord.option("match_id", description="Match ID shown after the duel", type=int)
+    async def pvp_replay(self, ctx: discord.ApplicationContext, match_id: int):
+        match = await get_pvp_match(match_id)
+        if not match:
+            await ctx.respond(
+                embed=RiskEmbed(title="❌ Match Not Found", description=f"No duel with ID `{match_id}`.", color=NEON_RED),
+                ephemeral=True
+            )
+            return
+        
+        # Pre-seed rows only have the stored text log
+        if match["seed"] is None:
+            embed = RiskEmbed(title=f"🎞️ REPLAY — Match #{match_id}", color=NEON_CYAN)
+            embed.description = f"`Legacy match — stored log only.`\n{LINE}"
+            if match["log_text"]:
+                embed.add_field(name="📜 Battle Log", value=f"```{match['log_text'][-1500:]}```", inline=False)
+            await ctx.respond(embed=embed)
+            return
+        
+        snapshot = json.loads(match["snapshot"])
+        result = replay_duel(snapshot, match["seed"])
+        p1, p2 = snapshot["p1"], snapshot["p2"]
+        
+        if result["winner"] == 1:
+            winner_name = p1["name"]
+        elif result["winner"] == 2:
+            winner_name = p2["name"]
+        else:
+            winner_name = "DRAW"
         
-        embed = RiskEmbed(title="⚔️ PvP DUEL COMPLETE", color=NEON_GREEN if winner_name else NEON_RED)
-        stance_emoji = COMBAT_STANCES[stance]["emoji"]
+        embed = RiskEmbed(title=f"🎞️ REPLAY — Match #{match_id}", color=NEON_CYAN)
         embed.description = (
-            f"`{p1['name']}` {stance_emoji} vs `{p2['name']}`\n"
+            f"`{p1['name']}` {COMBAT_STANCES[p1['stance']]['emoji']} vs "
+            f"`{p2['name']}` {COMBAT_STANCES[p2['stance']]['emoji']}\n"
             f"{LINE}\n"
-            f"🏆 Winner: **{winner_name or 'DRAW'}** after `{rounds}` rounds\n"
+            f"🏆 Winner: **{winner_name}** after `{result['rounds']}` rounds\n"
+            f"⏱️ Fought: <t:{int(match['fought_at'].timestamp())}:R>\n"
             f"{LINE}"
         )
-        if log_lines:
-            embed.add_field(name="📜 Battle Log", value=f"```{chr(10).join(log_lines[-25:][:1500])}```", inline=False)
+        for side in (p1, p2):
+            st = side["stats"]
+            embed.add_field(
+                name=f"📊 {side['name']}",
+                value=f"ATK `{st['atk']}` ┆ DEF `{st['def']}` ┆ SPD `{st['spd']}` ┆ HP `{st['hp']}/{st['max_hp']}`",
+                inline=True
+            )
+        
+        log_text = "\n".join(result["log"])
+        embed.add_field(name="📜 Battle Log", value=f"```{log_text[-1500:]}```", inline=False)
         
-        if winner_discord:
+        if match["engine_version"] != ENGINE_VERSION:
             embed.add_field(
-                name="🏆 Rewards",
-                value=f"Winner **{winner_name}**: `+{PVP_WIN_REWARD} ₵` & `+{PVP_WIN_XP} XP`\nLoser: `-{PVP_ENTRY_FEE} ₵` & set to 1 HP",
+                name="⚠️ Engine Changed",
+                value=f"Fought on engine v{match['engine_version']}, replayed on v{ENGINE_VERSION} — log may differ.",
                 inline=False
             )
+        elif result["rounds"] != match["rounds"]:
+            embed.add_field(name="⚠️ Mismatch", value="Replay diverged from the recorded result.", inline=False)
         
         await ctx.respond(embed=embed)
 
+    # ── /pvp recompute ────────────────────────────────────────────
+    @pvp_grp.command(name="recompute", description="[ADMIN] Rebuild all PvP ratings from the match log.")
+    @discord.option("k_factor", description="ELO K-factor to replay with", type=float, min_value=1, max_value=100, default=ELO_K_FACTOR)
+    async def pvp_recompute(self, ctx: discord.ApplicationContext, k_factor: float):
+        # Simple admin check — only guild owner
+        if not ctx.guild or ctx.author.id != ctx.guild.owner_id:
+            await ctx.respond(content="Admin only.", ephemeral=True)
+            return
+        await ctx.defer(ephemeral=True)
+        started = time.perf_counter()
+        result = await recompute_pvp_ratings(k_factor)
+        elapsed = time.perf_counter() - started
+        embed = RiskEmbed(title="📈 Ratings Recomputed", color=NEON_GREEN)
+        embed.description = (
+            f"Replayed `{result['matches']:,}` matches for `{result['players']:,}` players\n"
+            f"K-factor `{k_factor:g}`  ┆  `{elapsed:.2f}s`"
+        )
+        await ctx.followup.send(embed=embed, ephemeral=True)
+
     # ── /pvp rank ─────────────────────────────────────────────────
     @pvp_grp.command(name="rank", description="View PvP rankings.")
     async def pvp_rank(self, ctx: discord.ApplicationContext):
@@ -305,33 +353,83 @@ class PvPEnhancedCog(commands.Cog, name="PvP Enhanced"):
         await ctx.respond(embed=embed)
 
 
-async def _update_pvp_stats(player_id: int, won: bool):
-    """Update PvP statistics for a player"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        # Check if stats exist
-        stats = await conn.fetchrow("SELECT * FROM pvp_stats WHERE player_id = $1", player_id)
-        
-        if stats:
-            # Update existing stats
-            new_wins = stats['wins'] + (1 if won else 0)
-            new_losses = stats['losses'] + (0 if won else 1)
-            elo_change = 25 if won else -15
-            new_elo = max(0, stats['elo'] + elo_change)
-            
-            await conn.execute(
-                """UPDATE pvp_stats 
-                   SET wins = $1, losses = $2, elo = $3
-                   WHERE player_id = $4""",
-                new_wins, new_losses, new_elo, player_id
-            )
-        else:
-            # Create new stats
-            await conn.execute(
-                """INSERT INTO pvp_stats (player_id, wins, losses, elo)
-                   VALUES ($1, $2, $3, $4)""",
-                player_id, 1 if won else 0, 0 if won else 1, 1000
-            )
+async def _settle_duel(p1, s1, stance1: str, p2, s2, stance2: str) -> dict:
+    """
+    Fight two loaded players and apply every consequence: rewards, HP,
+    loser fee, ELO and the replayable pvp_log row.  Entry fees are the
+    caller's business.
+    """
+    # Simulate combat — the seed alone (plus the stat snapshot) reproduces the fight
+    seed = new_seed()
+    result = simulate_duel(s1, s2, random.Random(seed), names=(p1["name"], p2["name"]))
+    hp1, hp2 = result["hp1"], result["hp2"]
+
+    # Determine winner
+    if result["winner"] == 1:
+        winner, loser = p1, p2
+        winner_hp = hp1
+    elif result["winner"] == 2:
+        winner, loser = p2, p1
+        winner_hp = hp2
+    else:
+        winner = loser = None
+
+    # Apply consequences
+    if winner:
+        await update_player_xp(winner["discord_id"], PVP_WIN_XP)
+        await update_player_credits(winner["discord_id"], PVP_WIN_REWARD)
+        await set_hp_absolute(winner["discord_id"], max(1, winner_hp))
+        await set_hp_absolute(loser["discord_id"], 1)
+        # Loser loses entry fee
+        await update_player_credits(loser["discord_id"], -PVP_ENTRY_FEE)
+    winner_id = winner["id"] if winner else None
+
+    # Update ratings (draws move ELO toward each other too)
+    new_elo = await record_pvp_result(p1["id"], p2["id"], winner_id)
+
+    snapshot = duel_snapshot(p1["name"], s1, stance1, p2["name"], s2, stance2, world_modifiers().combat_effects())
+    match_id = await log_pvp(p1["id"], p2["id"], winner_id, result["rounds"], seed, snapshot, ENGINE_VERSION)
+
+    return {
+        "winner_id":   winner_id,
+        "winner_name": winner["name"] if winner else "DRAW",
+        "rounds":      result["rounds"],
+        "log":         result["log"],
+        "elo":         new_elo,
+        "match_id":    match_id,
+    }
+
+
+def _duel_embed(p1, stance: str, p2, duel: dict) -> discord.Embed:
+    winner_name = duel["winner_name"]
+    embed = RiskEmbed(title="⚔️ PvP DUEL COMPLETE", color=NEON_GREEN if winner_name else NEON_RED)
+    stance_emoji = COMBAT_STANCES[stance]["emoji"]
+    embed.description = (
+        f"`{p1['name']}` {stance_emoji} vs `{p2['name']}`\n"
+        f"{LINE}\n"
+        f"🏆 Winner: **{winner_name or 'DRAW'}** after `{duel['rounds']}` rounds\n"
+        f"{LINE}"
+    )
+    log_lines = duel["log"]
+    if log_lines:
+        embed.add_field(name="📜 Battle Log", value=f"```{chr(10).join(log_lines[-25:][:1500])}```", inline=False)
+    
+    if duel["winner_id"]:
+        embed.add_field(
+            name="🏆 Rewards",
+            value=f"Winner **{winner_name}**: `+{PVP_WIN_REWARD} ₵` & `+{PVP_WIN_XP} XP`\nLoser: `-{PVP_ENTRY_FEE} ₵` & set to 1 HP",
+            inline=False
+        )
+    embed.add_field(
+        name="📈 Rating",
+        value="\n".join(
+            f"`{p['name']}`: ELO `{duel['elo'][p['id']]}`"
+            for p in (p1, p2)
+        ),
+        inline=False
+    )
+    embed.add_field(name="🎞️ Replay", value=f"`/pvp replay {duel['match_id']}`", inline=False)
+    return embed
 
 
 def setup(bot):
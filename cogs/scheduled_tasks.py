@@ -1,130 +1,173 @@
 # cogs/scheduled_tasks.py
-# Automated game systems: territory income, random events, faction wars
+# Automated game systems: territory income, random events, faction wars.
+# Jobs are driven by the scheduled_jobs table rather than in-process timers:
+# a short poll claims whatever is due, runs it (catching up on missed
+# periods) and records when it ran and how long it took.  Only the elected
+# leader replica (utils/leader.py) polls.
 import discord
 from discord.ext import commands, tasks
 import random
 import logging
+import time
 
-from utils.database import get_pool, update_player_credits, get_player
-from utils.game_data import RANDOM_EVENTS
-from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, NEON_YELLOW
+from utils.database import (
+    distribute_territory_income, apply_event, world_modifiers, sync_world_modifiers,
+    get_territory_graph, sync_territory_state, get_faction_members, update_player_xp,
+    load_war_tick, apply_war_tick,
+    register_jobs, claim_due_jobs, finish_job, release_job, get_scheduled_jobs,
+    reconcile_net_worth, purge_outbox
+)
+from utils.game_data import RANDOM_EVENTS, IMPLANTS
+from utils.announce import broadcast, outbox, OUTBOX_MAX_ATTEMPTS
+from utils.leader import leader
+from utils.modifiers import resolve_modifier
+from utils.war_engine import (
+    WAR_TICK_MINUTES, WAR_VICTORY_CREDITS, WAR_VICTORY_XP, faction_power, resolve_tick
+)
+from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, event_embed
 
 logger = logging.getLogger('riskpunk')
 
+# name -> (interval seconds, coalesce missed runs into one).  Income is paid
+# for every missed day; events and war ticks just run once when late.
+JOBS = {
+    "territory_income": (24 * 3600, False),
+    "random_events":    (30 * 60, True),
+    "faction_wars":     (WAR_TICK_MINUTES * 60, True),
+    "net_worth_reconcile": (24 * 3600, True),
+    "outbox_purge":     (24 * 3600, True),
+}
+SCHEDULER_POLL_SECONDS = 30
+JOB_LEASE_SECONDS = 900        # A crashed runner's claim expires after this
+MAX_CATCH_UP_RUNS = 7
+
 
 class ScheduledTasks(commands.Cog):
     """Background tasks for territory income, events, and faction wars"""
     
     def __init__(self, bot):
         self.bot = bot
-        self.events_channel_id = None  # Will be set via config or first channel found
         
     @commands.Cog.listener()
     async def on_ready(self):
-        """Start all scheduled tasks when bot is ready"""
-        if not self.territory_income.is_running():
-            self.territory_income.start()
-            logger.info("✅ Territory income task started (weekly)")
-        
-        if not self.random_events.is_running():
-            self.random_events.start()
-            logger.info("✅ Random events task started (every 30 min)")
-        
-        if not self.faction_wars.is_running():
-            self.faction_wars.start()
-            logger.info("✅ Faction wars task started (daily)")
+        """Register jobs and start the scheduler when bot is ready"""
+        leader.start()
+        outbox.start(self.bot)
+        if not self.scheduler.is_running():
+            await sync_world_modifiers()   # Restore modifiers still running from before a restart
+            await register_jobs(JOBS)
+            self.scheduler.start()
+            logger.info(f"✅ Scheduler started ({', '.join(JOBS)})")
     
     def cog_unload(self):
-        """Stop tasks when cog unloads"""
-        self.territory_income.cancel()
-        self.random_events.cancel()
-        self.faction_wars.cancel()
+        """Stop the scheduler when cog unloads"""
+        self.scheduler.cancel()
+    
+    # ── SCHEDULER ───────────────────────────────────────────────
+    @tasks.loop(seconds=SCHEDULER_POLL_SECONDS)
+    async def scheduler(self):
+        """Claim due jobs and run them (leader only)"""
+        if not leader.is_leader:
+            return
+        try:
+            due = await claim_due_jobs(list(JOBS), JOB_LEASE_SECONDS)
+        except Exception as e:
+            logger.error(f"Scheduler poll failed: {e}")
+            return
+        for job in due:
+            if not leader.is_leader:
+                # Lost the lease mid-poll: hand the claims back to the next leader
+                await release_job(job['name'])
+                continue
+            await self._run_job(job)
+    
+    async def _run_job(self, job):
+        name = job['name']
+        runs = 1 if job['coalesce_runs'] else min(job['due_runs'], MAX_CATCH_UP_RUNS)
+        if job['due_runs'] > runs:
+            logger.warning(f"Job {name}: {job['due_runs']} periods due, running {runs}")
+        handler = getattr(self, name)
+        done = 0
+        error = None
+        started = time.perf_counter()
+        try:
+            for _ in range(runs):
+                await handler()
+                done += 1
+        except Exception as e:
+            error = f"{type(e).__name__}: {e}"
+        duration = time.perf_counter() - started
+        try:
+            await finish_job(name, done, duration, error)
+        except Exception as e:
+            logger.error(f"Job {name}: could not record completion: {e}")
+        if error:
+            logger.error(f"Job {name} failed after {done}/{runs} run(s): {error}")
+    
+    async def _after_commit(self, what: str, coro):
+        """
+        Follow-up work (announcements, XP) for a job whose result is already
+        committed.  A failure is logged but not raised: the job succeeded,
+        and a retry would apply it a second time.
+        """
+        try:
+            return await coro
+        except Exception as e:
+            logger.error(f"{what} failed after the job committed: {e}")
+    
+    # ── /jobs ───────────────────────────────────────────────────
+    @commands.slash_command(name="jobs", description="[ADMIN] Scheduled job timings")
+    async def jobs(self, ctx: discord.ApplicationContext):
+        # Simple admin check — only guild owner
+        if not ctx.guild or ctx.author.id != ctx.guild.owner_id:
+            return await ctx.respond("Admin only.", ephemeral=True)
+        embed = RiskEmbed(title="⏱️ Scheduled Jobs", color=NEON_CYAN)
+        for job in await get_scheduled_jobs():
+            last = f"<t:{int(job['last_run_at'].timestamp())}:R>" if job['last_run_at'] else "never"
+            took = f"`{job['last_duration'] * 1000:.0f} ms`" if job['last_duration'] is not None else "`-`"
+            value = (
+                f"Every `{job['interval_seconds'] // 60} min` · runs `{job['run_count']:,}`\n"
+                f"Last {last} in {took} · next <t:{int(job['next_run_at'].timestamp())}:R>"
+            )
+            if job['last_error']:
+                value += f"\n⚠️ `{job['last_error'][:200]}`"
+            embed.add_field(name=job['name'], value=value, inline=False)
+        await ctx.respond(embed=embed, ephemeral=True)
     
     # ── TERRITORY INCOME (Daily) ──────────────────────────
-    @tasks.loop(hours=24)  # Every 24 hours (daily)
     async def territory_income(self):
         """Distribute daily income from controlled territories to faction members"""
         try:
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                # Get all territories with owners
-                territories = await conn.fetch(
-                    "SELECT * FROM territories WHERE owner_faction IS NOT NULL"
-                )
-                
-                if not territories:
-                    logger.info("No territories owned, skipping income distribution")
-                    return
-                
-                # Group by faction
-                faction_income = {}
-                for terr in territories:
-                    faction_id = terr['owner_faction']
-                    if faction_id not in faction_income:
-                        faction_income[faction_id] = []
-                    faction_income[faction_id].append({
-                        'name': terr['name'],
-                        'income': terr['income']
-                    })
-                
-                # Distribute to faction members
-                total_distributed = 0
-                for faction_id, terr_list in faction_income.items():
-                    # Get faction info
-                    faction = await conn.fetchrow("SELECT * FROM factions WHERE id = $1", faction_id)
-                    if not faction:
-                        continue
-                    
-                    # Get all faction members
-                    members = await conn.fetch(
-                        "SELECT * FROM players WHERE faction_id = $1", faction_id
-                    )
-                    
-                    if not members:
-                        continue
-                    
-                    # Calculate total income
-                    total_income = sum(t['income'] for t in terr_list)
-                    
-                    # Divide equally among members
-                    per_member = total_income / len(members)
-                    
-                    # Distribute
-                    for member in members:
-                        await update_player_credits(member['discord_id'], per_member)
-                        total_distributed += per_member
-                    
-                    logger.info(f"Distributed {total_income:,.0f} ₵ to {len(members)} members of {faction['name']}")
-                
-                # Announce in a channel
-                channel = await self.get_announcement_channel()
-                if channel:
-                    embed = RiskEmbed(
-                        title="💰 DAILY INCOME DISTRIBUTED",
-                        description=f"Territory income paid out to faction members.\n**Total: {total_distributed:,.0f} ₵**",
-                        color=NEON_GREEN
-                    )
-                    
-                    for faction_id, terr_list in faction_income.items():
-                        faction = await conn.fetchrow("SELECT * FROM factions WHERE id = $1", faction_id)
-                        if faction:
-                            terr_names = ", ".join(t['name'] for t in terr_list)
-                            total = sum(t['income'] for t in terr_list)
-                            embed.add_field(
-                                name=f"{faction['name']}",
-                                value=f"`{terr_names}`\n💵 {total:,.0f} ₵",
-                                inline=False
-                            )
-                    
-                    await channel.send(embed=embed)
-                
+            # One transaction: a failure pays no one, so the retry can't double-pay
+            paid = await distribute_territory_income()
+            if not paid:
+                logger.info("No territories owned, skipping income distribution")
+                return
+            
+            total_distributed = sum(f['total'] for f in paid)
+            for f in paid:
+                logger.info(f"Distributed {f['total']:,.0f} ₵ to {f['members']} members of {f['name']}")
+            
         except Exception as e:
             logger.error(f"Territory income distribution failed: {e}")
             import traceback
             traceback.print_exc()
+            raise
+        
+        embed = RiskEmbed(
+            title="💰 DAILY INCOME DISTRIBUTED",
+            description=f"Territory income paid out to faction members.\n**Total: {total_distributed:,.0f} ₵**",
+            color=NEON_GREEN
+        )
+        for f in paid:
+            embed.add_field(
+                name=f"{f['name']}",
+                value=f"`{f['territories']}`\n💵 {f['total']:,.0f} ₵",
+                inline=False
+            )
+        await self._after_commit("Income announcement", broadcast(self.bot, embed=embed))
     
     # ── RANDOM EVENTS (Every 30 minutes) ────────────────────────
-    @tasks.loop(minutes=30)
     async def random_events(self):
         """Trigger random city events"""
         try:
@@ -133,195 +176,121 @@ class ScheduledTasks(commands.Cog):
                 return
             
             event = random.choice(RANDOM_EVENTS)
+            result = await apply_event(event, resolve_modifier(event.get('modifier'), IMPLANTS))
             
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                # Log the event
-                await conn.execute("INSERT INTO event_log (event_key) VALUES ($1)", event['key'])
-                
-                # Apply effects
-                if event['credit_mod'] != 0:
-                    # Apply to all players
-                    await conn.execute(
-                        "UPDATE players SET credits = GREATEST(0, credits + $1)",
-                        event['credit_mod']
-                    )
-                
-                if event['rep_mod'] != 0:
-                    await conn.execute(
-                        "UPDATE players SET rep = rep + $1",
-                        event['rep_mod']
-                    )
-                
-                # Special effects
-                if event['key'] == 'virus_outbreak':
-                    # All players lose 15 HP unless they have a MedKit
-                    await conn.execute("""
-                        UPDATE players SET hp = GREATEST(0, hp - 15)
-                        WHERE id NOT IN (
-                            SELECT player_id FROM inventory WHERE item_name = 'MedKit'
-                        )
-                    """)
-                
-                elif event['key'] == 'gang_war':
-                    # Boost Void Street defense (if it exists in new schema)
-                    # This territory might not exist, so try but don't fail
-                    try:
-                        await conn.execute(
-                            "UPDATE territories SET defense = LEAST(100, defense + 20) WHERE key = 'undercity'"
-                        )
-                    except:
-                        pass
-            
-            # Announce event
-            channel = await self.get_announcement_channel()
-            if channel:
-                embed = RiskEmbed(
-                    title=f"⚠️ {event['title']}",
-                    description=event['description'],
-                    color=NEON_YELLOW
-                )
-                embed.add_field(name="Effect", value=event['effect'], inline=False)
-                await channel.send(embed=embed)
-                
-            logger.info(f"Random event triggered: {event['key']}")
+            logger.info(
+                f"Random event triggered: {event['key']} ({result['players']} players, "
+                f"{result['hurt']} hurt) in {result['duration'] * 1000:.0f} ms"
+            )
             
         except Exception as e:
             logger.error(f"Random event failed: {e}")
             import traceback
             traceback.print_exc()
+            raise
+        
+        await self._after_commit("Event announcement", broadcast(self.bot, embed=event_embed(event)))
     
-    # ── FACTION WARS (Daily combat) ─────────────────────────────
-    @tasks.loop(hours=24)
+    # ── FACTION WARS (Tick-based combat) ────────────────────────
     async def faction_wars(self):
-        """Process ongoing faction wars"""
+        """Fight one battle in every active war; commit the whole tick at once"""
         try:
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                # Get active wars
-                wars = await conn.fetch(
-                    "SELECT * FROM faction_wars WHERE ended_at IS NULL"
-                )
-                
-                if not wars:
-                    return
-                
-                for war in wars:
-                    faction_a = await conn.fetchrow("SELECT * FROM factions WHERE id = $1", war['faction_a'])
-                    faction_b = await conn.fetchrow("SELECT * FROM factions WHERE id = $1", war['faction_b'])
-                    
-                    if not faction_a or not faction_b:
-                        continue
-                    
-                    # Get members and calculate total power
-                    members_a = await conn.fetch("SELECT * FROM players WHERE faction_id = $1", war['faction_a'])
-                    members_b = await conn.fetch("SELECT * FROM players WHERE faction_id = $1", war['faction_b'])
-                    
-                    power_a = sum(m['atk'] + m['def'] + m['spd'] for m in members_a) if members_a else 0
-                    power_b = sum(m['atk'] + m['def'] + m['spd'] for m in members_b) if members_b else 0
-                    
-                    # Add faction aggression bonus
-                    power_a += faction_a['aggression'] * len(members_a)
-                    power_b += faction_b['aggression'] * len(members_b)
-                    
-                    # Add randomness
-                    power_a += random.randint(0, 100)
-                    power_b += random.randint(0, 100)
-                    
-                    # Determine winner
-                    winner_id = war['faction_a'] if power_a > power_b else war['faction_b']
-                    loser_id = war['faction_b'] if power_a > power_b else war['faction_a']
-                    winner_name = faction_a['name'] if power_a > power_b else faction_b['name']
-                    loser_name = faction_b['name'] if power_a > power_b else faction_a['name']
-                    
-                    # Winner takes a random territory from loser
-                    loser_territories = await conn.fetch(
-                        "SELECT * FROM territories WHERE owner_faction = $1",
-                        loser_id
-                    )
-                    
-                    captured_territory = None
-                    if loser_territories:
-                        captured_territory = random.choice(loser_territories)
-                        await conn.execute(
-                            "UPDATE territories SET owner_faction = $1 WHERE id = $2",
-                            winner_id, captured_territory['id']
-                        )
-                    
-                    # Check if war should end (loser has no territories left)
-                    remaining = await conn.fetchval(
-                        "SELECT COUNT(*) FROM territories WHERE owner_faction = $1",
-                        loser_id
-                    )
-                    
-                    if remaining == 0:
-                        # War ends, winner declared
-                        await conn.execute(
-                            "UPDATE faction_wars SET ended_at = CURRENT_TIMESTAMP, winner = $1 WHERE id = $2",
-                            winner_id, war['id']
-                        )
-                        
-                        # Announce war end
-                        channel = await self.get_announcement_channel()
-                        if channel:
-                            embed = RiskEmbed(
-                                title="🏆 WAR CONCLUDED",
-                                description=f"**{winner_name}** has completely conquered **{loser_name}**!",
-                                color=NEON_GREEN
-                            )
-                            await channel.send(embed=embed)
-                        
-                        logger.info(f"War ended: {winner_name} defeated {loser_name}")
-                    else:
-                        # War continues, announce battle result
-                        channel = await self.get_announcement_channel()
-                        if channel:
-                            embed = RiskEmbed(
-                                title="⚔️ WAR BATTLE",
-                                description=f"**{winner_name}** vs **{loser_name}**",
-                                color=NEON_RED
-                            )
-                            embed.add_field(
-                                name="Winner",
-                                value=f"**{winner_name}** (Power: {power_a if power_a > power_b else power_b})",
-                                inline=True
-                            )
-                            embed.add_field(
-                                name="Loser", 
-                                value=f"**{loser_name}** (Power: {power_b if power_a > power_b else power_a})",
-                                inline=True
-                            )
-                            if captured_territory:
-                                embed.add_field(
-                                    name="Territory Captured",
-                                    value=f"📍 **{captured_territory['name']}**",
-                                    inline=False
-                                )
-                            await channel.send(embed=embed)
-                        
-                        logger.info(f"War battle: {winner_name} captured {captured_territory['name'] if captured_territory else 'nothing'}")
-                
+            started = time.perf_counter()
+            await sync_territory_state(force=True)   # Target borders as of now, whoever captured last
+            wars, factions, territories = await load_war_tick()
+            if not wars:
+                return
+            
+            mods = world_modifiers()
+            result = resolve_tick(
+                [(w['id'], w['faction_a'], w['faction_b']) for w in wars],
+                {fid: {"name": f['name'], "power": faction_power(f['stats'], f['members'], f['aggression'])}
+                 for fid, f in factions.items()},
+                {t['key']: {"name": t['name'], "owner": t['owner_faction'], "defense": t['defense'] + mods.defense_bonus(t['key'])}
+                 for t in territories},
+                await get_territory_graph()
+            )
+            applied, ended = await apply_war_tick(result['transfers'], result['endings'], WAR_VICTORY_CREDITS)
+            
+            logger.info(
+                f"War tick: {len(wars)} wars, {len(applied)} captures, {len(ended)} ended "
+                f"in {(time.perf_counter() - started) * 1000:.0f} ms"
+            )
+            
         except Exception as e:
             logger.error(f"Faction wars processing failed: {e}")
             import traceback
             traceback.print_exc()
-    
-    # ── HELPER METHODS ──────────────────────────────────────────
-    async def get_announcement_channel(self):
-        """Get the first available text channel for announcements"""
-        if self.events_channel_id:
-            channel = self.bot.get_channel(self.events_channel_id)
-            if channel:
-                return channel
+            raise
         
-        # Find first text channel we can send to
-        for guild in self.bot.guilds:
-            for channel in guild.text_channels:
-                if channel.permissions_for(guild.me).send_messages:
-                    self.events_channel_id = channel.id
-                    return channel
-        
-        return None
+        if ended:
+            await self._after_commit("War victory XP", self._award_war_xp(ended))
+        if applied or ended:
+            await self._after_commit(
+                "War report", self._announce_war_tick(result['battles'], applied, ended, factions, territories)
+            )
+    
+    async def _award_war_xp(self, ended):
+        # XP goes through update_player_xp for level-ups; wars end rarely
+        for _, winner_id, _ in ended:
+            for member in await get_faction_members(winner_id):
+                await update_player_xp(member['discord_id'], WAR_VICTORY_XP)
+    
+    # ── NET WORTH RECONCILIATION (Daily) ────────────────────────
+    async def net_worth_reconcile(self):
+        """Recompute every player's asset_value; drift means a write path missed it"""
+        try:
+            started = time.perf_counter()
+            drifted = await reconcile_net_worth()
+            log = logger.warning if drifted else logger.info
+            log(f"Net worth reconciled: {drifted} players corrected in {(time.perf_counter() - started) * 1000:.0f} ms")
+            
+        except Exception as e:
+            logger.error(f"Net worth reconciliation failed: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+    
+    # ── OUTBOX PURGE (Daily) ────────────────────────────────────
+    async def outbox_purge(self):
+        """Drop announcements that failed for good, reporting what was lost"""
+        try:
+            dropped = await purge_outbox(OUTBOX_MAX_ATTEMPTS)
+            for d in dropped:
+                logger.warning(f"Outbox purge: dropped {d['messages']} message(s) for channel {d['channel_id']}: {d['last_error']}")
+            if not dropped:
+                logger.info("Outbox purge: nothing undeliverable")
+            
+        except Exception as e:
+            logger.error(f"Outbox purge failed: {e}")
+            import traceback
+            traceback.print_exc()
+            raise
+    
+    async def _announce_war_tick(self, battles, applied, ended, factions, territories):
+        """One embed per tick: captures and war endings (quiet skirmishes are skipped)."""
+        names = {t['key']: t['name'] for t in territories}
+        captured = {key for key, _, _ in applied}
+        closed = {war_id for war_id, _, _ in ended}
+        embed = RiskEmbed(title="⚔️ WAR REPORT", color=NEON_RED)
+        # The outbox splits this into 25-field embeds as needed
+        for b in battles:
+            winner = factions[b['winner']]['name']
+            loser = factions[b['loser']]['name']
+            if b['war_id'] in closed:
+                embed.add_field(
+                    name=f"🏆 War #{b['war_id']} concluded",
+                    value=f"**{winner}** has completely conquered **{loser}**!",
+                    inline=False
+                )
+            elif b['captured'] in captured:
+                embed.add_field(
+                    name=f"War #{b['war_id']}: {winner} vs {loser}",
+                    value=f"📍 **{names[b['captured']]}** captured (Power {b['power'][0]} vs {b['power'][1]})",
+                    inline=False
+                )
+        if embed.fields:
+            await broadcast(self.bot, embed=embed)
 
 
 def setup(bot):
@@ -2,18 +2,22 @@
 # ENHANCED TERRITORY SYSTEM - More complex and challenging
 import discord
 from discord.ext import commands
+import asyncio
 import random
-from datetime import datetime, timedelta
 from utils.database import (
     get_pool, get_player, get_faction,
     update_player_credits, update_player_xp,
-    get_all_territories, get_territory
+    get_all_territories, get_territory, bump_territory_version,
+    capture_territory, start_siege, record_siege_hit, complete_siege, get_active_sieges,
+    siege_version, get_territory_graph, world_modifiers
 )
 from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, NEON_BLUE, NEON_YELLOW, LINE
 
 # Import the visual map function
 try:
-    from cogs.territory_visual_map import MapView, generate_map_image, create_text_map, PIL_AVAILABLE
+    from cogs.territory_visual_map import (
+        MapView, map_message, remember_map_message, create_text_map, PIL_AVAILABLE
+    )
     VISUAL_MAP_AVAILABLE = True
 except:
     VISUAL_MAP_AVAILABLE = False
@@ -51,8 +55,40 @@ def territory_card(t, owner_name, recent_activity=None):
 class Territory(commands.Cog):
     def __init__(self, bot):
         self.bot = bot
-        # Track ongoing sieges (territory_key -> {attacker_faction, start_time, siege_hp})
+        # Open sieges (territory_key -> siege_history row as a dict).  Write-through
+        # cache: every change hits the DB first, then this dict; loaded lazily so
+        # sieges survive restarts and cog reloads, and reloaded whenever the
+        # sieges counter moves (a siege opened or closed on another replica).
         self.active_sieges = {}
+        self._sieges_version = None
+        self._load_lock = asyncio.Lock()
+        self._siege_locks = {}     # territory_key -> asyncio.Lock serialising its siege
+    
+    async def _sieges(self):
+        version = await siege_version()
+        if version is None or version != self._sieges_version:
+            async with self._load_lock:
+                if version is None or version != self._sieges_version:
+                    self.active_sieges = {s['territory_key']: dict(s) for s in await get_active_sieges()}
+                    self._sieges_version = version
+        return self.active_sieges
+    
+    def _own_siege_write(self, version):
+        """Keep the cache after our own open/close if nothing else moved the counter."""
+        if version is not None and self._sieges_version is not None and version == self._sieges_version + 1:
+            self._sieges_version = version
+    
+    def _siege_lock(self, territory_key):
+        lock = self._siege_locks.get(territory_key)
+        if lock is None:
+            lock = self._siege_locks[territory_key] = asyncio.Lock()
+        return lock
+    
+    @commands.Cog.listener()
+    async def on_ready(self):
+        sieges = await self._sieges()
+        if sieges:
+            print(f"[TERRITORY] Restored {len(sieges)} active siege(s)")
     
     territory_grp = discord.SlashCommandGroup("territory", "Territory warfare commands")
 
@@ -69,14 +105,17 @@ class Territory(commands.Cog):
         # Try visual map first
         if VISUAL_MAP_AVAILABLE and PIL_AVAILABLE:
             try:
-                img = await generate_map_image(player['faction_id'])
-                if img:
-                    file = discord.File(img, filename="map.png")
-                    embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                    embed.description = "Click district buttons below to interact with territories."
-                    embed.set_image(url="attachment://map.png")
-                    view = MapView(player['id'], player['faction_id'], has_image=True)
-                    return await ctx.followup.send(embed=embed, file=file, view=view)
+                embed, file, key = await map_message(
+                    player['faction_id'], "Select a district below to interact with territories."
+                )
+                if embed:
+                    view = await MapView.create(player['id'], player['faction_id'], has_image=True)
+                    if file:
+                        msg = await ctx.followup.send(embed=embed, file=file, view=view)
+                    else:
+                        msg = await ctx.followup.send(embed=embed, view=view)
+                    remember_map_message(key, msg)
+                    return
             except Exception as e:
                 print(f"[TERRITORY MAP] Image generation failed: {e}")
         
@@ -86,7 +125,7 @@ class Territory(commands.Cog):
                 text_map = await create_text_map(player['faction_id'])
                 embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
                 embed.description = text_map
-                view = MapView(player['id'], player['faction_id'], has_image=False)
+                view = await MapView.create(player['id'], player['faction_id'], has_image=False)
                 return await ctx.followup.send(embed=embed, view=view)
             except Exception as e:
                 print(f"[TERRITORY MAP] Text map failed: {e}")
@@ -95,6 +134,7 @@ class Territory(commands.Cog):
         territories = await get_all_territories()
         embed = RiskEmbed(title="🗺️ RISK CITY TERRITORIES", color=NEON_BLUE)
         embed.description = "Territory overview - control the city grid\n" + LINE
+        sieges = await self._sieges()
         
         for t in territories:
             owner_name = "Unclaimed"
@@ -106,7 +146,7 @@ class Territory(commands.Cog):
             
             # Show siege status if active
             siege_indicator = ""
-            if t['key'] in self.active_sieges:
+            if t['key'] in sieges:
                 siege_indicator = " **[UNDER SIEGE]**"
             
             embed.add_field(
@@ -133,11 +173,15 @@ class Territory(commands.Cog):
             owner_name = fac["name"] if fac else "Unknown"
         
         # Check for active siege
-        if territory_key.lower() in self.active_sieges:
-            siege = self.active_sieges[territory_key.lower()]
+        siege = (await self._sieges()).get(territory_key.lower())
+        if siege:
             attacker_fac = await get_faction(siege['attacker_faction'])
             recent_activity = f"⚔️ **UNDER SIEGE** by {attacker_fac['name'] if attacker_fac else 'Unknown'}"
         
+        graph = await get_territory_graph()
+        neighbours = sorted(graph.adjacent.get(t["key"], ()))
+        t = dict(t, connected_to=" · ".join(f"`{k}`" for k in neighbours) or None)
+        
         await ctx.respond(embed=territory_card(t, owner_name, recent_activity))
 
     # ── /territory attack ────────────────────────────────────
@@ -185,6 +229,22 @@ class Territory(commands.Cog):
             )
             return
         
+        graph = await get_territory_graph()
+        if not graph.can_attack(player["faction_id"], t["key"]):
+            borders = sorted(graph.borders(player["faction_id"]))
+            await ctx.respond(
+                embed=RiskEmbed(
+                    title="🚧 Out of Reach",
+                    description=(
+                        f"**{t['name']}** doesn't border any district your faction holds.\n\n"
+                        f"**Within reach:** {', '.join(f'`{k}`' for k in borders) or 'nothing'}"
+                    ),
+                    color=NEON_YELLOW
+                ),
+                ephemeral=True
+            )
+            return
+        
         # Get faction member count for scaling
         pool = await get_pool()
         async with pool.acquire() as conn:
@@ -213,7 +273,7 @@ class Territory(commands.Cog):
             
             # Raid success based on speed and luck
             player_power = player["spd"] * 2 + player["atk"] + random.randint(1, 80)
-            territory_defense = t["defense"] + random.randint(1, 60)
+            territory_defense = t["defense"] + world_modifiers().defense_bonus(t["key"]) + random.randint(1, 60)
             
             if player_power > territory_defense:
                 # Successful raid - steal some credits based on territory income
@@ -237,6 +297,7 @@ class Territory(commands.Cog):
                         "UPDATE territories SET defense = GREATEST(0, defense - 5) WHERE key = $1",
                         territory_key.lower()
                     )
+                bump_territory_version()
             else:
                 # Failed raid
                 damage = random.randint(15, 35)
@@ -288,15 +349,11 @@ class Territory(commands.Cog):
             # Assault success based on combined stats and faction size
             faction_bonus = member_count * 15
             player_power = (player["atk"] + player["def"] + player["spd"]) + faction_bonus + random.randint(1, 100)
-            territory_defense = t["defense"] * 2 + random.randint(1, 100)
+            territory_defense = (t["defense"] + world_modifiers().defense_bonus(t["key"])) * 2 + random.randint(1, 100)
             
             if player_power > territory_defense:
                 # Victory - capture the territory
-                async with pool.acquire() as conn:
-                    await conn.execute(
-                        "UPDATE territories SET owner_faction = $1, defense = 30, last_attacked = CURRENT_TIMESTAMP WHERE key = $2",
-                        player["faction_id"], territory_key.lower()
-                    )
+                await capture_territory(territory_key.lower(), player["faction_id"], new_defense=30)
                 
                 await update_player_xp(player['id'], 800)
                 
@@ -372,38 +429,42 @@ class Territory(commands.Cog):
                 )
                 return
             
-            # Check if there's already an active siege
-            if territory_key.lower() in self.active_sieges:
-                existing_siege = self.active_sieges[territory_key.lower()]
-                if existing_siege['attacker_faction'] == player['faction_id']:
-                    await ctx.respond(
-                        embed=RiskEmbed(
-                            title="⚠️ Siege Already Active",
-                            description=f"Your faction is already besieging **{t['name']}**. Use `/territory siege_status` to check progress.",
-                            color=NEON_YELLOW
-                        ),
-                        ephemeral=True
+            key = territory_key.lower()
+            async with self._siege_lock(key):
+                # Check if there's already an active siege
+                existing_siege = (await self._sieges()).get(key)
+                siege = None
+                if not existing_siege:
+                    siege, version = await start_siege(
+                        key, player['faction_id'], t['owner_faction'],
+                        siege_hp=100,  # Siege needs to wear down defense
+                        territory_defense=t['defense'] + world_modifiers().defense_bonus(key), participant=player['id'], cost=cost
                     )
-                else:
-                    await ctx.respond(
-                        embed=RiskEmbed(
-                            title="⚠️ Territory Under Siege",
-                            description=f"**{t['name']}** is already under siege by another faction.",
-                            color=NEON_YELLOW
-                        ),
-                        ephemeral=True
-                    )
-                return
-            
-            await update_player_credits(player['id'], -cost)
-            
-            # Start the siege
-            self.active_sieges[territory_key.lower()] = {
-                'attacker_faction': player['faction_id'],
-                'start_time': datetime.utcnow(),
-                'siege_hp': 100,  # Siege needs to wear down defense
-                'territory_defense': t['defense']
-            }
+                    if siege:
+                        self.active_sieges[key] = dict(siege)
+                        self._own_siege_write(version)
+                if not siege:
+                    if existing_siege and existing_siege['attacker_faction'] == player['faction_id']:
+                        await ctx.respond(
+                            embed=RiskEmbed(
+                                title="⚠️ Siege Already Active",
+                                description=f"Your faction is already besieging **{t['name']}**. Use `/territory siege_attack` to continue it.",
+                                color=NEON_YELLOW
+                            ),
+                            ephemeral=True
+                        )
+                    else:
+                        await ctx.respond(
+                            embed=RiskEmbed(
+                                title="⚠️ Territory Under Siege",
+                                description=f"**{t['name']}** is already under siege by another faction.",
+                                color=NEON_YELLOW
+                            ),
+                            ephemeral=True
+                        )
+                    return
+                
+                await update_player_credits(player['id'], -cost)
             
             fac = await get_faction(player["faction_id"])
             embed = RiskEmbed(title="🏰 SIEGE INITIATED", color=NEON_CYAN)
@@ -433,99 +494,120 @@ class Territory(commands.Cog):
             await ctx.respond(content="You must be in a faction to participate in sieges.", ephemeral=True)
             return
         
-        if territory_key.lower() not in self.active_sieges:
-            await ctx.respond(
-                embed=RiskEmbed(
-                    title="❌ No Active Siege",
-                    description=f"There is no active siege on **{territory_key}**.",
-                    color=NEON_RED
-                ),
-                ephemeral=True
-            )
-            return
-        
-        siege = self.active_sieges[territory_key.lower()]
-        
-        if siege['attacker_faction'] != player['faction_id']:
-            await ctx.respond(
-                embed=RiskEmbed(
-                    title="❌ Not Your Siege",
-                    description="This siege is being conducted by another faction.",
-                    color=NEON_RED
-                ),
-                ephemeral=True
-            )
-            return
-        
-        cost = 500
-        if player["credits"] < cost:
-            await ctx.respond(
-                embed=RiskEmbed(
-                    title="💸 Insufficient Funds",
-                    description=f"Siege attacks cost `{cost:,} ₵` for ammunition and supplies.",
-                    color=NEON_RED
-                ),
-                ephemeral=True
-            )
-            return
-        
-        await update_player_credits(player['id'], -cost)
-        
-        # Calculate damage to siege HP
-        damage = random.randint(15, 30) + (player['atk'] // 2)
-        siege['siege_hp'] -= damage
-        
-        # Random chance of taking damage
-        if random.random() < 0.3:
-            hp_loss = random.randint(10, 20)
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE players SET hp = GREATEST(0, hp - $1) WHERE id = $2",
-                    hp_loss, player['id']
+        key = territory_key.lower()
+        async with self._siege_lock(key):
+            siege = (await self._sieges()).get(key)
+            if not siege:
+                await ctx.respond(
+                    embed=RiskEmbed(
+                        title="❌ No Active Siege",
+                        description=f"There is no active siege on **{territory_key}**.",
+                        color=NEON_RED
+                    ),
+                    ephemeral=True
                 )
-            damage_msg = f"\n• Casualties: -{hp_loss} HP"
-        else:
-            damage_msg = ""
-        
-        # Check if siege is complete
-        if siege['siege_hp'] <= 0:
-            # Siege successful - capture the territory
-            t = await get_territory(territory_key.lower())
-            pool = await get_pool()
-            async with pool.acquire() as conn:
-                await conn.execute(
-                    "UPDATE territories SET owner_faction = $1, defense = 25, last_attacked = CURRENT_TIMESTAMP WHERE key = $2",
-                    player["faction_id"], territory_key.lower()
+                return
+            
+            if siege['attacker_faction'] != player['faction_id']:
+                await ctx.respond(
+                    embed=RiskEmbed(
+                        title="❌ Not Your Siege",
+                        description="This siege is being conducted by another faction.",
+                        color=NEON_RED
+                    ),
+                    ephemeral=True
                 )
+                return
             
-            # Remove siege from active list
-            del self.active_sieges[territory_key.lower()]
+            cost = 500
+            if player["credits"] < cost:
+                await ctx.respond(
+                    embed=RiskEmbed(
+                        title="💸 Insufficient Funds",
+                        description=f"Siege attacks cost `{cost:,} ₵` for ammunition and supplies.",
+                        color=NEON_RED
+                    ),
+                    ephemeral=True
+                )
+                return
             
-            await update_player_xp(player['id'], 1200)
+            # Calculate damage to siege HP
+            damage = random.randint(15, 30) + (player['atk'] // 2)
+            hit = await record_siege_hit(siege['id'], damage, player['id'], cost)
+            if hit is None:
+                # Ended by another instance since we cached it
+                self.active_sieges.pop(key, None)
+                await ctx.respond(
+                    embed=RiskEmbed(
+                        title="❌ No Active Siege",
+                        description=f"The siege on **{territory_key}** has already ended.",
+                        color=NEON_RED
+                    ),
+                    ephemeral=True
+                )
+                return
+            siege['siege_hp'], siege['participants'] = hit
             
-            fac = await get_faction(player["faction_id"])
-            embed = RiskEmbed(title="🏆 SIEGE VICTORY!", color=NEON_GREEN)
-            embed.description = (
-                f"The siege of **{t['name']}** is complete!\n\n"
-                f"After sustained assault, the defenders have surrendered.\n"
-                f"**{fac['name'] if fac else 'Your faction'}** now controls this strategic position.\n{LINE}\n"
-                f"**Rewards:**\n"
-                f"• Territory captured\n"
-                f"• +1200 XP\n"
-                f"• Daily income: `{t['income']:,} ₵`\n"
-                f"• Defense heavily damaged (25) - needs fortification"
-            )
-        else:
-            # Siege continues
-            embed = RiskEmbed(title="🏰 SIEGE CONTINUES", color=NEON_CYAN)
-            embed.description = (
-                f"Your forces bombard **{territory_key}** defenses!\n\n"
-                f"The siege wears on...\n{LINE}\n"
-                f"**Damage Dealt:** -{damage} to siege HP\n"
-                f"**Remaining:** `{max(0, siege['siege_hp'])}/100` siege HP{damage_msg}\n\n"
-                f"Continue the assault with more `/territory siege_attack` commands!"
-            )
+            await update_player_credits(player['id'], -cost)
+            
+            # Random chance of taking damage
+            if random.random() < 0.3:
+                hp_loss = random.randint(10, 20)
+                pool = await get_pool()
+                async with pool.acquire() as conn:
+                    await conn.execute(
+                        "UPDATE players SET hp = GREATEST(0, hp - $1) WHERE id = $2",
+                        hp_loss, player['id']
+                    )
+                damage_msg = f"\n• Casualties: -{hp_loss} HP"
+            else:
+                damage_msg = ""
+            
+            # Check if siege is complete
+            if siege['siege_hp'] <= 0:
+                # Siege successful - capture the territory
+                t = await get_territory(key)
+                version = await complete_siege(siege['id'], key, player["faction_id"], new_defense=25)
+                
+                # Remove siege from active list
+                self.active_sieges.pop(key, None)
+                if version is None:
+                    await ctx.respond(
+                        embed=RiskEmbed(
+                            title="❌ No Active Siege",
+                            description=f"The siege on **{territory_key}** has already ended.",
+                            color=NEON_RED
+                        ),
+                        ephemeral=True
+                    )
+                    return
+                self._own_siege_write(version)
+                
+                await update_player_xp(player['id'], 1200)
+                
+                fac = await get_faction(player["faction_id"])
+                embed = RiskEmbed(title="🏆 SIEGE VICTORY!", color=NEON_GREEN)
+                embed.description = (
+                    f"The siege of **{t['name']}** is complete!\n\n"
+                    f"After sustained assault, the defenders have surrendered.\n"
+                    f"**{fac['name'] if fac else 'Your faction'}** now controls this strategic position.\n{LINE}\n"
+                    f"**Rewards:**\n"
+                    f"• Territory captured\n"
+                    f"• +1200 XP\n"
+                    f"• Daily income: `{t['income']:,} ₵`\n"
+                    f"• Defense heavily damaged (25) - needs fortification\n"
+                    f"• Participants: `{len(siege['participants'])}`"
+                )
+            else:
+                # Siege continues
+                embed = RiskEmbed(title="🏰 SIEGE CONTINUES", color=NEON_CYAN)
+                embed.description = (
+                    f"Your forces bombard **{territory_key}** defenses!\n\n"
+                    f"The siege wears on...\n{LINE}\n"
+                    f"**Damage Dealt:** -{damage} to siege HP\n"
+                    f"**Remaining:** `{max(0, siege['siege_hp'])}/100` siege HP{damage_msg}\n\n"
+                    f"Continue the assault with more `/territory siege_attack` commands!"
+                )
         
         await ctx.respond(embed=embed)
 
@@ -603,6 +685,7 @@ class Territory(commands.Cog):
                 "UPDATE territories SET defense = $1 WHERE key = $2",
                 new_defense, territory_key.lower()
             )
+        bump_territory_version()
         
         embed = RiskEmbed(title="🛡️ DEFENSES REINFORCED", color=NEON_GREEN)
         embed.description = (
@@ -2,190 +2,147 @@ import discord
 from discord.ext import commands
 from discord.ui import Button, View
 import asyncio
+import io
+from datetime import datetime, timedelta
 
 from utils.database import (
     get_pool,
     get_player,
     get_faction,
     update_player_credits,
-    update_player_xp
+    update_player_xp,
+    get_all_factions,
+    get_map_territories,
+    get_territory_layout,
+    get_territory_owners_at,
+    iter_territory_history,
+    territory_version,
+    bump_territory_version,
+    get_territory_graph,
+    note_territory_capture,
+    world_modifiers
 )
 from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, NEON_YELLOW
+from utils.map_render import (
+    PIL_AVAILABLE, VIEW_COLS, VIEW_ROWS,
+    compute_layout, sector_count, sector_of,
+    map_snapshot, render_map_cached, render_stats, shutdown_render_pool,
+    cached_map_url, remember_map_url, benchmark_encodings, encoding_label,
+    ENCODE_METRICS, MAP_FILENAME, render_history_cached, HISTORY_FILENAME
+)
 
-# Try to import PIL, fallback to text mode if not available
-try:
-    from PIL import Image, ImageDraw, ImageFont
-    import io
-    PIL_AVAILABLE = True
-except ImportError:
-    PIL_AVAILABLE = False
+if not PIL_AVAILABLE:
     print("[MAP] WARNING: Pillow not installed. Using text-based map.")
 
+SELECT_PAGE_SIZE = 25      # Discord's per-select option limit
+HISTORY_MAX_FRAMES = 48
+
+
+def _sector_label(sector, sectors):
+    if sectors == (1, 1):
+        return None
+    return f"SECTOR {sector[0] + 1}-{sector[1] + 1}  ({sectors[0]}x{sectors[1]})"
+
 
-# Territory positions for image generation
-TERRITORY_POSITIONS = {
-    "industrial_sector": {"x": 50, "y": 50, "w": 200, "h": 150},
-    "chrome_district": {"x": 280, "y": 50, "w": 200, "h": 150},
-    "downtown_core": {"x": 510, "y": 50, "w": 200, "h": 150},
-    "port_authority": {"x": 50, "y": 230, "w": 200, "h": 150},
-    "central_plaza": {"x": 280, "y": 230, "w": 200, "h": 150},
-    "corp_towers": {"x": 510, "y": 230, "w": 200, "h": 150},
-    "undercity": {"x": 50, "y": 410, "w": 200, "h": 150},
-    "tech_quarter": {"x": 280, "y": 410, "w": 200, "h": 150},
-    "skyline_heights": {"x": 510, "y": 410, "w": 200, "h": 150}
-}
-
-FACTION_MAP_COLORS = {
-    "omnicorp": (91, 94, 166),
-    "solarflare": (255, 107, 0),
-    "netrunners": (0, 255, 255),
-    "ironveil": (192, 192, 192),
-    "phantomcell": (155, 89, 182),
-    "neutral": (100, 100, 100)
-}
-
-
-async def generate_map_image(player_faction_id=None):
-    """Generate visual map image if PIL available"""
+async def generate_map_image(player_faction_id=None, sector=(0, 0)):
+    """Generate visual map image if PIL available (cached per territory state + viewer + sector)"""
     if not PIL_AVAILABLE:
         return None
-    
-    try:
-        width, height = 760, 610
-        img = Image.new('RGB', (width, height), color=(10, 14, 26))
-        draw = ImageDraw.Draw(img)
-        
-        # Try custom fonts, fallback to default
-        try:
-            title_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20)
-            label_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 13)
-            small_font = ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 10)
-        except:
-            title_font = label_font = small_font = ImageFont.load_default()
-        
-        # Get territories
-        pool = await get_pool()
-        async with pool.acquire() as conn:
-            territories = await conn.fetch("SELECT * FROM territories")
-        
-        # Draw grid
-        for x in range(0, width, 40):
-            draw.line([(x, 0), (x, height)], fill=(20, 30, 50), width=1)
-        for y in range(0, height, 40):
-            draw.line([(0, y), (width, y)], fill=(20, 30, 50), width=1)
-        
-        # Draw territories
-        for territory in territories:
-            pos = TERRITORY_POSITIONS.get(territory['key'])
-            if not pos:
-                continue
-            
-            x, y, w, h = pos['x'], pos['y'], pos['w'], pos['h']
-            
-            # Get color
-            if territory['owner_faction']:
-                faction = await get_faction(territory['owner_faction'])
-                color = FACTION_MAP_COLORS.get(faction['key'] if faction else 'neutral', FACTION_MAP_COLORS['neutral'])
-                is_yours = (territory['owner_faction'] == player_faction_id)
-                owner = faction['name'].upper() if faction else "NEUTRAL"
+    png = await render_map_cached(territory_version(), player_faction_id, _snapshot_loader(sector, player_faction_id), sector)
+    return io.BytesIO(png) if png else None
+
+
+def _snapshot_loader(sector, player_faction_id=None):
+    async def load():
+        rows = await get_map_territories()
+        frontier = (await get_territory_graph()).borders(player_faction_id) if player_faction_id else ()
+        return map_snapshot(rows, sector, frontier), _sector_label(sector, sector_count(compute_layout(rows)))
+    return load
+
+
+async def map_message(player_faction_id=None, description=None, sector=(0, 0)):
+    """
+    Build the map embed.  Returns (embed, file, key): file is None when the
+    render is already on Discord's CDN (the embed points at that URL), and
+    embed is None when no image can be produced.  Pass key and the sent
+    message to remember_map_message so the next request can reuse it.
+    """
+    embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
+    if description:
+        embed.description = description
+    key = (territory_version(), player_faction_id, tuple(sector))
+    url = cached_map_url(key)
+    if url:
+        embed.set_image(url=url)
+        return embed, None, key
+    png = await render_map_cached(key[0], player_faction_id, _snapshot_loader(key[2], player_faction_id), key[2]) if PIL_AVAILABLE else None
+    if not png:
+        return None, None, key
+    embed.set_image(url=f"attachment://{MAP_FILENAME}")
+    return embed, discord.File(io.BytesIO(png), filename=MAP_FILENAME), key
+
+
+def remember_map_message(key, message):
+    if message is not None and message.attachments:
+        remember_map_url(key, message.attachments[0].url)
+
+
+async def edit_to_map(interaction, view, player_faction_id, description=None, use_image=True):
+    """Swap an interaction's message back to the map (image when possible, else text)."""
+    sector = getattr(view, "sector", (0, 0))
+    if use_image:
+        embed, file, key = await map_message(player_faction_id, description, sector)
+        if embed:
+            if file:
+                msg = await interaction.edit_original_response(embed=embed, files=[file], view=view)
             else:
-                color = FACTION_MAP_COLORS['neutral']
-                is_yours = False
-                owner = "NEUTRAL"
-            
-            # Draw background
-            draw.rectangle([x+5, y+5, x+w-5, y+h-5], fill=color)
-            
-            # Draw border
-            border_col = (0, 255, 255) if is_yours else (150, 150, 150)
-            draw.rectangle([x, y, x+w, y+h], outline=border_col, width=3 if is_yours else 2)
-            
-            # Territory name
-            name = territory['name']
-            draw.text((x+w//2, y+20), name, fill=(255, 255, 255), font=label_font, anchor="mt")
-            
-            # Owner
-            draw.text((x+w//2, y+h-50), owner, fill=(200, 200, 200), font=small_font, anchor="mt")
-            
-            # Defense bar
-            def_val = territory['defense']
-            bar_w = w - 40
-            bar_h = 8
-            bar_x = x + 20
-            bar_y = y + h - 25
-            
-            draw.rectangle([bar_x, bar_y, bar_x+bar_w, bar_y+bar_h], fill=(40, 40, 40))
-            fill_w = int((def_val/100) * bar_w)
-            if fill_w > 0:
-                col = (0, 255, 100) if def_val > 70 else (255, 255, 0) if def_val > 40 else (255, 100, 100)
-                draw.rectangle([bar_x, bar_y, bar_x+fill_w, bar_y+bar_h], fill=col)
-            
-            draw.text((x+w//2, bar_y-10), f"DEF:{def_val}", fill=(180, 180, 180), font=small_font, anchor="mt")
-        
-        # Title
-        draw.text((width//2, 15), "RISK CITY - TERRITORY MAP", fill=(0, 255, 255), font=title_font, anchor="mt")
-        
-        # Legend
-        ly = height - 20
-        draw.rectangle([20, ly-4, 40, ly+4], fill=(0, 255, 255))
-        draw.text((45, ly), "Your Faction", fill=(200, 200, 200), font=small_font, anchor="lm")
-        
-        draw.rectangle([170, ly-4, 190, ly+4], fill=(150, 100, 100))
-        draw.text((195, ly), "Enemy", fill=(200, 200, 200), font=small_font, anchor="lm")
-        
-        draw.rectangle([270, ly-4, 290, ly+4], fill=(100, 100, 100))
-        draw.text((295, ly), "Neutral", fill=(200, 200, 200), font=small_font, anchor="lm")
-        
-        # Save to bytes
-        img_bytes = io.BytesIO()
-        img.save(img_bytes, format='PNG')
-        img_bytes.seek(0)
-        
-        return img_bytes
-        
-    except Exception as e:
-        print(f"[MAP] Image generation failed: {e}")
-        import traceback
-        traceback.print_exc()
-        return None
+                msg = await interaction.edit_original_response(embed=embed, attachments=[], view=view)
+            remember_map_message(key, msg)
+            return
 
+    # Fallback to text
+    text_map = await create_text_map(player_faction_id, sector)
+    embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
+    embed.description = text_map
+    await interaction.edit_original_response(embed=embed, attachments=[], view=view)
 
-async def create_text_map(player_faction_id=None):
-    """Create text-based map as fallback"""
-    pool = await get_pool()
-    async with pool.acquire() as conn:
-        territories = await conn.fetch("SELECT * FROM territories ORDER BY id")
-    
-    # Map layout
-    layout = [
-        ["industrial_sector", "chrome_district", "downtown_core"],
-        ["port_authority", "central_plaza", "corp_towers"],
-        ["undercity", "tech_quarter", "skyline_heights"]
-    ]
+
+async def create_text_map(player_faction_id=None, sector=(0, 0)):
+    """Create text-based map as fallback (one sector of the layout)"""
+    territories = await get_map_territories()
+    frontier = (await get_territory_graph()).borders(player_faction_id) if player_faction_id else ()
+    layout = compute_layout(territories)
+    by_cell = {layout[t['key']]: t for t in territories}
+    sectors = sector_count(layout)
+    sx, sy = sector
     
     map_lines = ["```"]
     map_lines.append("═" * 50)
     map_lines.append("     RISK CITY - TERRITORY CONTROL MAP")
+    label = _sector_label(sector, sectors)
+    if label:
+        map_lines.append(f"     {label}")
     map_lines.append("═" * 50)
     map_lines.append("")
     
     # Create visual grid
-    for row in layout:
+    for row in range(sy * VIEW_ROWS, (sy + 1) * VIEW_ROWS):
         row_names = []
         row_owners = []
         row_defense = []
         
-        for terr_key in row:
-            terr = next((t for t in territories if t['key'] == terr_key), None)
+        for col in range(sx * VIEW_COLS, (sx + 1) * VIEW_COLS):
+            terr = by_cell.get((col, row))
             if not terr:
                 continue
             
             # Icon based on ownership
-            if terr['owner_faction']:
-                if terr['owner_faction'] == player_faction_id:
-                    icon = "🟢"
-                else:
-                    icon = "🔴"
+            if terr['owner_faction'] == player_faction_id and player_faction_id:
+                icon = "🟢"
+            elif terr['key'] in frontier:
+                icon = "🟡"
+            elif terr['owner_faction']:
+                icon = "🔴"
             else:
                 icon = "⚪"
             
@@ -194,11 +151,7 @@ async def create_text_map(player_faction_id=None):
             row_names.append(f"{icon} {name}")
             
             # Owner
-            if terr['owner_faction']:
-                faction = await get_faction(terr['owner_faction'])
-                owner = faction['name'][:10] if faction else "Neutral"
-            else:
-                owner = "Neutral"
+            owner = terr['faction_name'][:10] if terr['faction_name'] else "Neutral"
             row_owners.append(owner.ljust(12))
             
             # Defense
@@ -206,82 +159,176 @@ async def create_text_map(player_faction_id=None):
             bar = "█" * (defense // 20) + "░" * (5 - defense // 20)
             row_defense.append(f"{bar} {defense:3d}")
         
+        if not row_names:
+            continue
         map_lines.append(" | ".join(row_names))
         map_lines.append(" | ".join(row_owners))
         map_lines.append(" | ".join(row_defense))
         map_lines.append("─" * 50)
     
     map_lines.append("")
-    map_lines.append("Legend: 🟢 Your Faction | 🔴 Enemy | ⚪ Neutral")
+    map_lines.append("Legend: 🟢 Yours | 🟡 In Reach | 🔴 Enemy | ⚪ Neutral")
     map_lines.append("```")
     
     return "\n".join(map_lines)
 
 
+async def load_history_frames(start, end, sector=(0, 0), max_frames=HISTORY_MAX_FRAMES):
+    """
+    Opening snapshot plus per-frame tile diffs for (start, end].  The range
+    is cut into max_frames buckets; events are streamed oldest first and
+    only buckets where a visible district changed become frames.
+    """
+    factions = {f['id']: f for f in await get_all_factions()}
+    owners = await get_territory_owners_at(start)
+
+    def fields(owner, defense):
+        fac = factions.get(owner)
+        return {
+            "owner_faction": owner if fac else None,
+            "faction_key":   fac['key'] if fac else None,
+            "faction_name":  fac['name'] if fac else None,
+            "defense":       defense,
+        }
+
+    rows = []
+    for r in await get_map_territories():
+        then = owners.get(r['key'])
+        rows.append(dict(r, **fields(then['owner_faction'], then['defense'])) if then else dict(r))
+    snapshot = map_snapshot(rows, sector)
+    state = {t['key']: (t['owner_faction'], t['defense']) for t in snapshot}
+
+    step = (end - start) / max_frames
+    stamp = lambda i: f"{start + step * i:%Y-%m-%d %H:%M}"
+    frames = [(stamp(0), {})]
+    changes = {}
+    bucket = 1
+    async for ev in iter_territory_history(start, end, state):
+        while ev['at'] > start + step * bucket:
+            if changes:
+                frames.append((stamp(bucket), changes))
+                changes = {}
+            bucket += 1
+        owner, defense = state[ev['territory_key']]
+        new = (ev['to_faction'], defense if ev['defense'] is None else ev['defense'])
+        if new != (owner, defense):
+            state[ev['territory_key']] = new
+            changes[ev['territory_key']] = fields(*new)
+    if changes:
+        frames.append((stamp(min(bucket, max_frames)), changes))
+    frames.append((stamp(max_frames), {}))
+    return snapshot, frames
+
+
 class MapView(View):
-    def __init__(self, player_id, player_faction_id, has_image=False):
+    """Map controls: a paginated district picker plus sector panning for large cities."""
+
+    def __init__(self, player_id, player_faction_id, has_image=False, layout_rows=()):
         super().__init__(timeout=300)
         self.player_id = player_id
         self.player_faction_id = player_faction_id
         self.has_image = has_image
+        self.sector = (0, 0)
+        self.page = 0
+
+        rows = list(layout_rows)
+        self.layout = compute_layout(rows)
+        self.sectors = sector_count(self.layout)
+        names = {r['key']: r['name'] for r in rows}
+        # Picker order follows the map: sector by sector, row-major inside each
+        order = sorted(self.layout, key=lambda k: (sector_of(self.layout[k])[::-1], self.layout[k][::-1]))
+        self.districts = [(k, names[k]) for k in order]
+        self.pages = max(1, -(-len(self.districts) // SELECT_PAGE_SIZE))
+
+        self.district_select = None
+        if self.districts:
+            self.district_select = discord.ui.Select(row=0, min_values=1, max_values=1, options=[discord.SelectOption(label="…")])
+            self.district_select.callback = self._on_select
+            self.add_item(self.district_select)
+        if self.sectors == (1, 1):
+            for item in (self.pan_left, self.pan_up, self.pan_down, self.pan_right):
+                self.remove_item(item)
+        if self.pages == 1:
+            self.remove_item(self.prev_page)
+            self.remove_item(self.next_page)
+        self._sync()
+
+    @classmethod
+    async def create(cls, player_id, player_faction_id, has_image=False):
+        return cls(player_id, player_faction_id, has_image, await get_territory_layout())
+
+    def _sync(self):
+        """Refresh select options and enable/disable navigation for the current page / sector."""
+        if self.district_select:
+            chunk = self.districts[self.page * SELECT_PAGE_SIZE:(self.page + 1) * SELECT_PAGE_SIZE]
+            self.district_select.options = [
+                discord.SelectOption(
+                    label=name[:100], value=key,
+                    description=f"Sector {sector_of(self.layout[key])[0] + 1}-{sector_of(self.layout[key])[1] + 1}"
+                    if self.sectors != (1, 1) else None
+                )
+                for key, name in chunk
+            ]
+            self.district_select.placeholder = (
+                f"📍 Select a district ({self.page + 1}/{self.pages})" if self.pages > 1 else "📍 Select a district"
+            )
+        self.prev_page.disabled = self.page == 0
+        self.next_page.disabled = self.page >= self.pages - 1
+        sx, sy = self.sector
+        self.pan_left.disabled = sx == 0
+        self.pan_right.disabled = sx >= self.sectors[0] - 1
+        self.pan_up.disabled = sy == 0
+        self.pan_down.disabled = sy >= self.sectors[1] - 1
+
+    async def _on_select(self, interaction):
+        await self.show_detail(interaction, self.district_select.values[0])
+
+    async def _pan(self, interaction, dx, dy):
+        await interaction.response.defer()
+        sx = min(max(0, self.sector[0] + dx), self.sectors[0] - 1)
+        sy = min(max(0, self.sector[1] + dy), self.sectors[1] - 1)
+        self.sector = (sx, sy)
+        # Jump the picker to the first district of the new sector
+        first = next((i for i, (k, _) in enumerate(self.districts) if sector_of(self.layout[k]) == self.sector), None)
+        if first is not None:
+            self.page = first // SELECT_PAGE_SIZE
+        self._sync()
+        await edit_to_map(interaction, self, self.player_faction_id, "Select a district to interact.", self.has_image)
+
+    @discord.ui.button(label="◀️", style=discord.ButtonStyle.secondary, row=1)
+    async def pan_left(self, button, interaction):
+        await self._pan(interaction, -1, 0)
+
+    @discord.ui.button(label="🔼", style=discord.ButtonStyle.secondary, row=1)
+    async def pan_up(self, button, interaction):
+        await self._pan(interaction, 0, -1)
+
+    @discord.ui.button(label="🔽", style=discord.ButtonStyle.secondary, row=1)
+    async def pan_down(self, button, interaction):
+        await self._pan(interaction, 0, 1)
+
+    @discord.ui.button(label="▶️", style=discord.ButtonStyle.secondary, row=1)
+    async def pan_right(self, button, interaction):
+        await self._pan(interaction, 1, 0)
+
+    @discord.ui.button(label="« Prev", style=discord.ButtonStyle.secondary, row=2)
+    async def prev_page(self, button, interaction):
+        self.page = max(0, self.page - 1)
+        self._sync()
+        await interaction.response.edit_message(view=self)
+
+    @discord.ui.button(label="Next »", style=discord.ButtonStyle.secondary, row=2)
+    async def next_page(self, button, interaction):
+        self.page = min(self.pages - 1, self.page + 1)
+        self._sync()
+        await interaction.response.edit_message(view=self)
     
-    @discord.ui.button(label="Industrial Sector", style=discord.ButtonStyle.secondary, row=0)
-    async def btn1(self, button, interaction):
-        await self.show_detail(interaction, "industrial_sector")
-    
-    @discord.ui.button(label="Chrome District", style=discord.ButtonStyle.secondary, row=0)
-    async def btn2(self, button, interaction):
-        await self.show_detail(interaction, "chrome_district")
-    
-    @discord.ui.button(label="Downtown Core", style=discord.ButtonStyle.secondary, row=0)
-    async def btn3(self, button, interaction):
-        await self.show_detail(interaction, "downtown_core")
-    
-    @discord.ui.button(label="Port Authority", style=discord.ButtonStyle.secondary, row=1)
-    async def btn4(self, button, interaction):
-        await self.show_detail(interaction, "port_authority")
-    
-    @discord.ui.button(label="Central Plaza", style=discord.ButtonStyle.secondary, row=1)
-    async def btn5(self, button, interaction):
-        await self.show_detail(interaction, "central_plaza")
-    
-    @discord.ui.button(label="Corp Towers", style=discord.ButtonStyle.secondary, row=1)
-    async def btn6(self, button, interaction):
-        await self.show_detail(interaction, "corp_towers")
-    
-    @discord.ui.button(label="Undercity", style=discord.ButtonStyle.secondary, row=2)
-    async def btn7(self, button, interaction):
-        await self.show_detail(interaction, "undercity")
-    
-    @discord.ui.button(label="Tech Quarter", style=discord.ButtonStyle.secondary, row=2)
-    async def btn8(self, button, interaction):
-        await self.show_detail(interaction, "tech_quarter")
-    
-    @discord.ui.button(label="Skyline Heights", style=discord.ButtonStyle.secondary, row=2)
-    async def btn9(self, button, interaction):
-        await self.show_detail(interaction, "skyline_heights")
-    
-    @discord.ui.button(label="🔄 Refresh", style=discord.ButtonStyle.primary, row=3)
+    @discord.ui.button(label="🔄 Refresh", style=discord.ButtonStyle.primary, row=2)
     async def refresh_btn(self, button, interaction):
         await interaction.response.defer()
-        
-        if self.has_image:
-            img = await generate_map_image(self.player_faction_id)
-            if img:
-                file = discord.File(img, filename="map.png")
-                embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                embed.description = "Click districts to interact."
-                embed.set_image(url="attachment://map.png")
-                await interaction.edit_original_response(embed=embed, files=[file], view=self)
-                return
-        
-        # Fallback to text
-        text_map = await create_text_map(self.player_faction_id)
-        embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-        embed.description = text_map
-        await interaction.edit_original_response(embed=embed, view=self)
+        await edit_to_map(interaction, self, self.player_faction_id, "Select a district to interact.", self.has_image)
     
-    @discord.ui.button(label="❌ Close", style=discord.ButtonStyle.danger, row=3)
+    @discord.ui.button(label="❌ Close", style=discord.ButtonStyle.danger, row=2)
     async def close_btn(self, button, interaction):
         await interaction.response.edit_message(view=None)
         self.stop()
@@ -294,6 +341,11 @@ class MapView(View):
         if not terr:
             return await interaction.response.send_message("Not found!", ephemeral=True)
         
+        # Returning to the map lands on the district's sector
+        if terr_key in self.layout:
+            self.sector = sector_of(self.layout[terr_key])
+            self._sync()
+        
         owner_name = "Neutral"
         owner_col = NEON_CYAN
         if terr['owner_faction']:
@@ -337,6 +389,12 @@ class ActionView(View):
         if terr['owner_faction'] == self.player_faction_id:
             return await interaction.response.send_message("You control this!", ephemeral=True)
         
+        graph = await get_territory_graph()
+        if not graph.can_attack(self.player_faction_id, self.terr_key):
+            return await interaction.response.send_message(
+                "Out of reach — you can only attack districts bordering your faction's.", ephemeral=True
+            )
+        
         if player['credits'] < 500:
             return await interaction.response.send_message("Need 500 ₵!", ephemeral=True)
         
@@ -344,13 +402,14 @@ class ActionView(View):
         
         import random
         power = player['atk'] + player['spd'] + random.randint(1, 100)
-        defense = terr['defense'] + random.randint(1, 100)
+        defense = terr['defense'] + world_modifiers().defense_bonus(self.terr_key) + random.randint(1, 100)
         
         if power > defense:
             pool = await get_pool()
             async with pool.acquire() as conn:
                 await conn.execute("UPDATE territories SET owner_faction = $1 WHERE key = $2", 
                                  self.player_faction_id, self.terr_key)
+            note_territory_capture(self.terr_key, self.player_faction_id)
             await update_player_xp(player['id'], 500)
             
             embed = RiskEmbed(title="⚔️ VICTORY!", color=NEON_GREEN)
@@ -369,19 +428,7 @@ class ActionView(View):
         await asyncio.sleep(3)
         
         # Back to map
-        if self.parent.has_image:
-            img = await generate_map_image(self.player_faction_id)
-            if img:
-                file = discord.File(img, filename="map.png")
-                map_embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                map_embed.set_image(url="attachment://map.png")
-                await interaction.edit_original_response(embed=map_embed, files=[file], view=self.parent)
-                return
-        
-        text = await create_text_map(self.player_faction_id)
-        map_embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-        map_embed.description = text
-        await interaction.edit_original_response(embed=map_embed, view=self.parent)
+        await edit_to_map(interaction, self.parent, self.player_faction_id, use_image=self.parent.has_image)
     
     @discord.ui.button(label="🛡️ Fortify", style=discord.ButtonStyle.success)
     async def fortify(self, button, interaction):
@@ -406,6 +453,7 @@ class ActionView(View):
         pool = await get_pool()
         async with pool.acquire() as conn:
             await conn.execute("UPDATE territories SET defense = $1 WHERE key = $2", new_def, self.terr_key)
+        bump_territory_version()
         
         embed = RiskEmbed(title="🛡️ FORTIFIED", color=NEON_GREEN)
         embed.description = f"Defense: {terr['defense']} → {new_def}"
@@ -414,37 +462,12 @@ class ActionView(View):
         await asyncio.sleep(2)
         
         # Back to map
-        if self.parent.has_image:
-            img = await generate_map_image(self.player_faction_id)
-            if img:
-                file = discord.File(img, filename="map.png")
-                map_embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                map_embed.set_image(url="attachment://map.png")
-                await interaction.edit_original_response(embed=map_embed, files=[file], view=self.parent)
-                return
-        
-        text = await create_text_map(self.player_faction_id)
-        map_embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-        map_embed.description = text
-        await interaction.edit_original_response(embed=map_embed, view=self.parent)
+        await edit_to_map(interaction, self.parent, self.player_faction_id, use_image=self.parent.has_image)
     
     @discord.ui.button(label="◀️ Back", style=discord.ButtonStyle.secondary)
     async def back(self, button, interaction):
         await interaction.response.defer()
-        
-        if self.parent.has_image:
-            img = await generate_map_image(self.player_faction_id)
-            if img:
-                file = discord.File(img, filename="map.png")
-                embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                embed.set_image(url="attachment://map.png")
-                await interaction.edit_original_response(embed=embed, files=[file], view=self.parent)
-                return
-        
-        text = await create_text_map(self.player_faction_id)
-        embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-        embed.description = text
-        await interaction.edit_original_response(embed=embed, view=self.parent)
+        await edit_to_map(interaction, self.parent, self.player_faction_id, use_image=self.parent.has_image)
 
 
 class TerritoryMap(commands.Cog):
@@ -454,7 +477,70 @@ class TerritoryMap(commands.Cog):
             print("[MAP] Image generation ENABLED")
         else:
             print("[MAP] Image generation DISABLED - using text mode")
+
+    def cog_unload(self):
+        shutdown_render_pool()
+
+    @commands.slash_command(name="map_stats", description="[ADMIN] Map renderer queue, timing and encoding metrics")
+    @discord.option("benchmark", description="Encode the current map with every output option", type=bool, default=False)
+    async def map_stats(self, ctx: discord.ApplicationContext, benchmark: bool):
+        # Simple admin check — only guild owner
+        if not ctx.guild or ctx.author.id != ctx.guild.owner_id:
+            return await ctx.respond("Admin only.", ephemeral=True)
+        await ctx.defer(ephemeral=True)
+        if benchmark and PIL_AVAILABLE:
+            await benchmark_encodings((await _snapshot_loader((0, 0))())[0])
+        st = render_stats()
+        embed = RiskEmbed(title="🗺️ Map Renderer", color=NEON_CYAN)
+        embed.add_field(name="Renders", value=f"`{st['renders']:,}`", inline=True)
+        embed.add_field(name="Cache hits", value=f"`{st['cache_hits']:,}`", inline=True)
+        embed.add_field(name="CDN reuses", value=f"`{st['url_reuses']:,}`", inline=True)
+        embed.add_field(name="Rejected", value=f"`{st['rejected']:,}`", inline=True)
+        embed.add_field(name="Failed", value=f"`{st['failed']:,}`", inline=True)
+        embed.add_field(name="Render (avg / max)", value=f"`{st['render_s_avg']*1000:.1f} / {st['render_s_max']*1000:.1f} ms`", inline=True)
+        embed.add_field(name="Latency (avg / max)", value=f"`{st['wait_s_avg']*1000:.1f} / {st['wait_s_max']*1000:.1f} ms`", inline=True)
+        embed.add_field(name="In flight", value=f"`{st['in_flight']}`", inline=True)
+        if ENCODE_METRICS:
+            live = encoding_label()
+            lines = [
+                f"{'▶' if label == live else '·'} `{label:<14}` `{m['bytes_sum'] / m['count'] / 1024:6.1f} KB` "
+                f"`{m['encode_s_sum'] / m['count'] * 1000:6.1f} ms`  ×{m['count']}"
+                for label, m in sorted(ENCODE_METRICS.items())
+            ]
+            embed.add_field(name="Encoding (avg size / time)", value="\n".join(lines), inline=False)
+        await ctx.followup.send(embed=embed, ephemeral=True)
     
+    @commands.slash_command(name="map_history", description="Animated timeline of territory control")
+    @discord.option("days", description="How far back to replay", type=int, min_value=1, max_value=90, default=7)
+    @discord.option("sector", description="Sector to replay, e.g. 2-1", type=str, default="1-1")
+    async def map_history(self, ctx: discord.ApplicationContext, days: int, sector: str):
+        if not PIL_AVAILABLE:
+            return await ctx.respond("Map images are unavailable on this server.", ephemeral=True)
+        try:
+            sx, sy = (int(v) - 1 for v in sector.split("-"))
+        except ValueError:
+            return await ctx.respond("Sector must look like `1-1`.", ephemeral=True)
+        if sx < 0 or sy < 0:
+            return await ctx.respond("Sector must look like `1-1`.", ephemeral=True)
+        player = await get_player(ctx.author.id)
+        faction_id = player['faction_id'] if player else None
+
+        await ctx.defer()
+        # Whole-hour ranges: repeat requests within the hour share one render
+        end = datetime.now().replace(minute=0, second=0, microsecond=0)
+        start = end - timedelta(days=days)
+        data = await render_history_cached(
+            start, end, faction_id,
+            lambda: load_history_frames(start, end, (sx, sy)), (sx, sy)
+        )
+        if not data:
+            return await ctx.followup.send("Couldn't render the timeline right now — try again shortly.")
+
+        embed = RiskEmbed(title="🕰️ TERRITORY HISTORY", color=NEON_CYAN)
+        embed.description = f"Sector `{sector}` · `{start:%Y-%m-%d %H:00}` → `{end:%Y-%m-%d %H:00}`"
+        embed.set_image(url=f"attachment://{HISTORY_FILENAME}")
+        await ctx.followup.send(embed=embed, file=discord.File(io.BytesIO(data), filename=HISTORY_FILENAME))
+
     @commands.slash_command(name="map", description="View territory map")
     async def map_command(self, ctx: discord.ApplicationContext):
         player = await get_player(ctx.author.id)
@@ -464,23 +550,21 @@ class TerritoryMap(commands.Cog):
         await ctx.defer()
         
         # Try image first
-        has_image = False
-        if PIL_AVAILABLE:
-            img = await generate_map_image(player['faction_id'])
-            if img:
-                file = discord.File(img, filename="map.png")
-                embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
-                embed.description = "Click districts to interact."
-                embed.set_image(url="attachment://map.png")
-                view = MapView(player['id'], player['faction_id'], has_image=True)
-                await ctx.followup.send(embed=embed, file=file, view=view)
-                return
+        embed, file, key = await map_message(player['faction_id'], "Select a district to interact.")
+        if embed:
+            view = await MapView.create(player['id'], player['faction_id'], has_image=True)
+            if file:
+                msg = await ctx.followup.send(embed=embed, file=file, view=view)
+            else:
+                msg = await ctx.followup.send(embed=embed, view=view)
+            remember_map_message(key, msg)
+            return
         
         # Fallback to text
         text_map = await create_text_map(player['faction_id'])
         embed = RiskEmbed(title="🗺️ RISK CITY MAP", color=NEON_CYAN)
         embed.description = text_map
-        view = MapView(player['id'], player['faction_id'], has_image=False)
+        view = await MapView.create(player['id'], player['faction_id'], has_image=False)
         await ctx.followup.send(embed=embed, view=view)
 
 
@@ -0,0 +1,303 @@
+# cogs/tournament.py
+# Single-elimination PvP tournaments seeded by ELO.  Each round's duels are
+# fought in a process pool off the event loop and persisted in one transaction.
+
+import asyncio
+import json
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import discord
+from discord.ext import commands
+
+from utils.database import (
+    get_player, get_combat_loadouts,
+    create_tournament, get_tournament, get_active_tournaments, join_tournament,
+    get_tournament_entrants, start_tournament, record_tournament_round, world_modifiers
+)
+from utils.combat import COMBAT_STANCES, ENGINE_VERSION, compute_effective_stats, new_seed, duel_snapshot
+from utils.tournament import (
+    TOURNAMENT_SIZES, seed_bracket, round_pairs, round_name, resolve_batch
+)
+from utils.styles import RiskEmbed, NEON_CYAN, NEON_RED, NEON_GREEN, NEON_YELLOW, NEON_MAGENTA, LINE, THIN_LINE
+
+logger = logging.getLogger('riskpunk')
+
+ROUND_DELAY = 5            # Seconds between round announcements
+TOURNAMENT_WORKERS = max(1, min(4, (os.cpu_count() or 1)))
+
+_executor = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=TOURNAMENT_WORKERS)
+    return _executor
+
+
+async def _resolve_round(batch: list) -> list:
+    """Split a round across the worker pool; results come back in slot order."""
+    if not batch:
+        return []
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    chunks = [batch[i::TOURNAMENT_WORKERS] for i in range(TOURNAMENT_WORKERS)]
+    parts = await asyncio.gather(*(
+        loop.run_in_executor(executor, resolve_batch, chunk) for chunk in chunks if chunk
+    ))
+    return sorted((r for part in parts for r in part), key=lambda r: r["slot"])
+
+
+class TournamentCog(commands.Cog, name="Tournament"):
+    """ELO-seeded single-elimination PvP brackets."""
+
+    def __init__(self, bot):
+        self.bot = bot
+        self._running = set()      # tournament ids with a live runner task
+
+    def cog_unload(self):
+        global _executor
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+    @commands.Cog.listener()
+    async def on_ready(self):
+        """Pick brackets that were mid-flight when the bot went down back up."""
+        for t in await get_active_tournaments():
+            if t["status"] == "running" and t["id"] not in self._running:
+                self._running.add(t["id"])
+                self.bot.loop.create_task(self._run_tournament(t["id"]))
+
+    tournament_grp = discord.SlashCommandGroup("tournament", "ELO-seeded PvP brackets.")
+
+    # ── /tournament create ───────────────────────────────────
+    @tournament_grp.command(name="create", description="Open a new PvP tournament for sign-ups.")
+    @discord.option("name", description="Tournament name")
+    @discord.option("max_players", description="Bracket size", type=int, choices=TOURNAMENT_SIZES, default=16)
+    @discord.option("entry_fee", description="Credits per entrant — winner takes the pot", type=int, min_value=0, default=0)
+    async def tournament_create(self, ctx: discord.ApplicationContext, name: str, max_players: int, entry_fee: int):
+        player = await get_player(ctx.author.id)
+        if not player:
+            await ctx.respond(content="Not registered. Run `/register`.", ephemeral=True)
+            return
+        t = await create_tournament(
+            ctx.guild_id, ctx.channel_id, name[:64], player["id"], max_players, entry_fee
+        )
+        embed = RiskEmbed(title=f"🏟️ TOURNAMENT OPEN — {t['name']}", color=NEON_MAGENTA)
+        embed.description = (
+            f"{LINE}\n"
+            f"**Bracket:** `{max_players}` runners  ┆  **Entry:** `{entry_fee:,} ₵`\n"
+            f"**Seeding:** PvP ELO\n"
+            f"{LINE}\n"
+            f"`/tournament join {t['id']}`  to enter  ┆  `/tournament start {t['id']}`  to begin"
+        )
+        await ctx.respond(embed=embed)
+
+    # ── /tournament join ─────────────────────────────────────
+    @tournament_grp.command(name="join", description="Enter an open tournament.")
+    @discord.option("tournament_id", description="Tournament ID", type=int)
+    @discord.option("stance", description="Combat stance for every match", choices=list(COMBAT_STANCES.keys()), default="balanced")
+    async def tournament_join(self, ctx: discord.ApplicationContext, tournament_id: int, stance: str):
+        player = await get_player(ctx.author.id)
+        if not player:
+            await ctx.respond(content="Not registered. Run `/register`.", ephemeral=True)
+            return
+        t = await get_tournament(tournament_id)
+        if not t:
+            await ctx.respond(embed=RiskEmbed(title="❌ Tournament Not Found", color=NEON_RED), ephemeral=True)
+            return
+        # Capacity check, entrant row and fee are one transaction
+        status = await join_tournament(tournament_id, player["id"], stance)
+        if status == "broke":
+            await ctx.respond(
+                embed=RiskEmbed(title="💸 Insufficient Credits", description=f"Entry fee: `{float(t['entry_fee']):,.0f} ₵`", color=NEON_RED),
+                ephemeral=True
+            )
+            return
+        if status != "ok":
+            msg = {
+                "closed":    "Sign-ups for this tournament are closed.",
+                "full":      "This bracket is full.",
+                "duplicate": "You're already entered.",
+            }[status]
+            await ctx.respond(content=msg, ephemeral=True)
+            return
+        embed = RiskEmbed(title="🏟️ Entered", color=NEON_GREEN)
+        embed.description = (
+            f"**{player['name']}** joins **{t['name']}** "
+            f"{COMBAT_STANCES[stance]['emoji']} `{stance}`"
+        )
+        await ctx.respond(embed=embed)
+
+    # ── /tournament list ─────────────────────────────────────
+    @tournament_grp.command(name="list", description="Show open and running tournaments.")
+    async def tournament_list(self, ctx: discord.ApplicationContext):
+        tournaments = await get_active_tournaments(ctx.guild_id)
+        if not tournaments:
+            embed = RiskEmbed(
+                title="🏟️ No Tournaments",
+                description="`The arena is empty.`\n\n**Start one with** `/tournament create`",
+                color=NEON_CYAN
+            )
+            await ctx.respond(embed=embed)
+            return
+        embed = RiskEmbed(title="🏟️ TOURNAMENTS", color=NEON_MAGENTA)
+        for t in tournaments[:25]:
+            embed.add_field(
+                name=f"#{t['id']} — {t['name']}",
+                value=(
+                    f"**Status:** `{t['status'].upper()}`  ┆  **Entrants:** `{t['entrants']}/{t['max_players']}`\n"
+                    f"**Pot:** `{float(t['entry_fee']) * t['entrants']:,.0f} ₵`"
+                ),
+                inline=False
+            )
+        await ctx.respond(embed=embed)
+
+    # ── /tournament start ────────────────────────────────────
+    @tournament_grp.command(name="start", description="Seed the bracket and run the tournament (creator or server owner).")
+    @discord.option("tournament_id", description="Tournament ID", type=int)
+    async def tournament_start(self, ctx: discord.ApplicationContext, tournament_id: int):
+        player = await get_player(ctx.author.id)
+        t = await get_tournament(tournament_id)
+        if not t or not player:
+            await ctx.respond(embed=RiskEmbed(title="❌ Tournament Not Found", color=NEON_RED), ephemeral=True)
+            return
+        is_owner = ctx.guild and ctx.author.id == ctx.guild.owner_id
+        if player["id"] != t["creator_id"] and not is_owner:
+            await ctx.respond(content="Only the organiser can start this tournament.", ephemeral=True)
+            return
+        if t["status"] != "open":
+            await ctx.respond(content="This tournament has already started.", ephemeral=True)
+            return
+        entrants = await get_tournament_entrants(tournament_id)
+        if len(entrants) < 2:
+            await ctx.respond(content="Need at least 2 entrants.", ephemeral=True)
+            return
+        await ctx.defer()
+
+        # Snapshot every entrant's effective stats once — the whole bracket
+        # is fought (and replayable) with the loadouts they started with.
+        # Anyone without a loadout is dropped and refunded by start_tournament.
+        loadouts = await get_combat_loadouts([e["player_id"] for e in entrants])
+        entrants = [e for e in entrants if e["player_id"] in loadouts]
+        world = world_modifiers().combat_effects()
+        seeds = []
+        for n, e in enumerate(entrants, start=1):
+            lo = loadouts[e["player_id"]]
+            stats = compute_effective_stats(lo["player"], lo["implants"], lo["skills"], lo["equipped"], e["stance"], world)
+            seeds.append((e["player_id"], n, e["current_elo"], stats))
+        bracket = seed_bracket([e["player_id"] for e in entrants])
+        status = await start_tournament(tournament_id, seeds, bracket)
+        if status != "ok":
+            await ctx.followup.send(content={
+                "closed": "This tournament has already started.",
+                "short":  f"Only {len(seeds)} entrant(s) have a combat loadout; need at least 2. Sign-ups stay open.",
+            }[status])
+            return
+
+        embed = RiskEmbed(title=f"🏟️ {t['name']} — BRACKET SEEDED", color=NEON_YELLOW)
+        lines = [f"`#{n:>3}` **{e['name']}** — ELO `{e['current_elo']}`" for n, e in enumerate(entrants[:16], start=1)]
+        if len(entrants) > 16:
+            lines.append(f"`… and {len(entrants) - 16} more`")
+        embed.description = f"`{len(entrants)} runners  ┆  {len(bracket)}-slot bracket`\n{LINE}\n" + "\n".join(lines)
+        await ctx.followup.send(embed=embed)
+
+        self._running.add(tournament_id)
+        self.bot.loop.create_task(self._run_tournament(tournament_id))
+
+    # ── Bracket runner ───────────────────────────────────────
+    async def _run_tournament(self, tournament_id: int):
+        try:
+            t = await get_tournament(tournament_id)
+            entrants = {e["player_id"]: e for e in await get_tournament_entrants(tournament_id)}
+            stats = {pid: json.loads(e["stats"]) for pid, e in entrants.items()}
+            bracket = list(t["bracket"])
+            round_no = t["current_round"]
+
+            while len(bracket) > 1:
+                pairs = round_pairs(bracket)
+                fights = [(slot, a, b, new_seed()) for slot, a, b in pairs if a and b]
+                results = await _resolve_round([(slot, seed, stats[a], stats[b]) for slot, a, b, seed in fights])
+
+                next_bracket = [a or b for _, a, b in pairs]
+                fight_rows = []
+                for (slot, a, b, seed), r in zip(fights, results):
+                    advance = a if r["advance"] == 1 else b
+                    winner = {1: a, 2: b}.get(r["winner"])
+                    next_bracket[slot] = advance
+                    ea, eb = entrants[a], entrants[b]
+                    snapshot = duel_snapshot(ea["name"], stats[a], ea["stance"], eb["name"], stats[b], eb["stance"])
+                    fight_rows.append((slot, a, b, winner, advance, r["rounds"], seed, snapshot))
+                byes = [(slot, a or b) for slot, a, b in pairs if not (a and b) and (a or b)]
+
+                champion = next_bracket[0] if len(next_bracket) == 1 else None
+                new_elo = await record_tournament_round(
+                    tournament_id, round_no, fight_rows, byes, next_bracket, ENGINE_VERSION, champion
+                )
+                await self._post_round(t, round_name(len(bracket)), fight_rows, byes, new_elo, entrants)
+
+                bracket = next_bracket
+                round_no += 1
+                if champion is None:
+                    await asyncio.sleep(ROUND_DELAY)
+
+            await self._crown(t, entrants[bracket[0]], len(entrants))
+        except Exception as e:
+            logger.error(f"Tournament {tournament_id} runner failed: {e}")
+        finally:
+            self._running.discard(tournament_id)
+
+    async def _post_round(self, t, title: str, fights: list, byes: list, new_elo: dict, entrants: dict):
+        channel = self.bot.get_channel(t["channel_id"])
+        if not channel:
+            return
+        lines = []
+        for slot, a, b, winner, advance, rounds, _, _ in fights:
+            loser = b if advance == a else a
+            note = " *(draw — tiebreak)*" if winner is None else ""
+            lines.append(
+                f"**{entrants[advance]['name']}** `{new_elo[advance]}` def. "
+                f"{entrants[loser]['name']} `{new_elo[loser]}` — `{rounds}` rnds{note}"
+            )
+        lines += [f"**{entrants[pid]['name']}** advances on a bye" for _, pid in byes]
+
+        embed = RiskEmbed(title=f"🏟️ {t['name']} — {title.upper()}", color=NEON_CYAN)
+        embed.description = f"`{len(fights)} matches resolved`\n{LINE}"
+        # Pack result lines into as many ≤1024-char fields as the embed allows
+        chunk, used, fields = [], 0, 0
+        for i, line in enumerate(lines):
+            if sum(len(l) + 1 for l in chunk) + len(line) > 1000:
+                embed.add_field(name="​", value="\n".join(chunk), inline=False)
+                used += sum(len(l) + 1 for l in chunk)
+                fields += 1
+                chunk = []
+                if fields >= 4 or used > 4000:
+                    chunk = [f"`… and {len(lines) - i} more results — /pvp replay any match`"]
+                    break
+            chunk.append(line)
+        if chunk:
+            embed.add_field(name="​", value="\n".join(chunk), inline=False)
+        await channel.send(embed=embed)
+
+    async def _crown(self, t, champion, entrant_count: int):
+        # The pot was paid with the final round (record_tournament_round)
+        pot = float(t["entry_fee"]) * entrant_count
+        channel = self.bot.get_channel(t["channel_id"])
+        if not channel:
+            return
+        embed = RiskEmbed(title=f"🏆 {t['name']} — CHAMPION", color=NEON_YELLOW)
+        embed.description = (
+            f"{LINE}\n"
+            f"<@{champion['discord_id']}> **{champion['name']}** takes the bracket!\n"
+            f"{THIN_LINE}\n"
+            f"💰 Pot: `{pot:,.0f} ₵`  ┆  Field: `{entrant_count}` runners\n"
+            f"{LINE}"
+        )
+        await channel.send(embed=embed)
+
+
+def setup(bot):
+    bot.add_cog(TournamentCog(bot))
@@ -3,7 +3,7 @@ import discord
 from discord.ext import commands
 from utils.database import (
     get_player, create_trade, get_open_trades, fulfill_trade, cancel_trade,
-    add_item, remove_item, get_inventory, update_player_credits
+    add_item, remove_item, get_inventory, update_player_credits, world_modifiers
 )
 from utils.game_data import ITEM_CATALOG
 from utils.styles import RiskEmbed, NEON_CYAN, NEON_GREEN, NEON_RED, THIN_LINE
@@ -140,10 +140,13 @@ class TradingCog(commands.Cog, name="Trading"):
     async def shop(self, ctx: discord.ApplicationContext):
         embed = RiskEmbed(title="🏪 City Shop", color=NEON_GREEN)
         embed.description = "`Standard procurement.  No questions.`\n"
+        price_mult = world_modifiers().price_mult()
+        if price_mult != 1.0:
+            embed.description += f"⚠️ `Prices ×{price_mult:g} — city event in effect.`\n"
         for name, data in ITEM_CATALOG.items():
             embed.add_field(
                 name=name,
-                value=f"💰 `{data['base_price']:,} ₵`\n" +
+                value=f"💰 `{int(data['base_price'] * price_mult):,} ₵`\n" +
                       (f"⚔️ ATK +{data.get('atk_bonus',0)}" if data.get("atk_bonus") else "") +
                       (f"🛡️ DEF +{data.get('def_bonus',0)}" if data.get("def_bonus") else "") +
                       (f"💨 SPD +{data.get('spd_bonus',0)}" if data.get("spd_bonus") else "") +
@@ -172,7 +175,7 @@ class TradingCog(commands.Cog, name="Trading"):
             await ctx.respond(embed=RiskEmbed(title="❌ Item Not Found", color=NEON_RED), ephemeral=True)
             return
         item = ITEM_CATALOG[found_name]
-        total_cost = item["base_price"] * quantity
+        total_cost = int(item["base_price"] * world_modifiers().price_mult()) * quantity
         if player["credits"] < total_cost:
             await ctx.respond(embed=RiskEmbed(title="💸 Can't Afford", description=f"Total: `{total_cost:,} ₵`", color=NEON_RED), ephemeral=True)
             return
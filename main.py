@@ -93,6 +93,8 @@ class RiskpunkBot(commands.Bot):
         try:
             await self._seed_factions()
             await self._seed_territories()
+            await self._seed_territory_links()
+            await self._seed_company_types()
             logger.info("  ✅ Data seeded")
         except Exception as e:
             logger.error(f"  ⚠️  Seeding error: {e}")
@@ -108,7 +110,8 @@ class RiskpunkBot(commands.Bot):
             "cogs.territory",
             "cogs.events",
             "cogs.skills",
-            "cogs.pvp",
+            "cogs.pvp_enhanced",
+            "cogs.tournament",
             "cogs.story",
             "cogs.leaderboard",
             "cogs.companies",
@@ -178,8 +181,51 @@ class RiskpunkBot(commands.Bot):
             else:
                 logger.info(f"    {count} territories exist")
     
+    async def _seed_territory_links(self):
+        from utils.database import get_pool
+        from utils.game_data import TERRITORY_LINKS_SEED
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            count = await conn.fetchval("SELECT COUNT(*) FROM territory_links")
+            if count == 0:
+                await conn.executemany(
+                    """INSERT INTO territory_links (territory_a, territory_b)
+                       SELECT $1, $2 WHERE EXISTS (SELECT 1 FROM territories WHERE key = $1)
+                                       AND EXISTS (SELECT 1 FROM territories WHERE key = $2)
+                       ON CONFLICT DO NOTHING""",
+                    [tuple(sorted(link)) for link in TERRITORY_LINKS_SEED]
+                )
+                logger.info(f"    Seeded {len(TERRITORY_LINKS_SEED)} territory links")
+            else:
+                logger.info(f"    {count} territory links exist")
+    
+    async def _seed_company_types(self):
+        from utils.database import get_pool
+        from cogs.companies import COMPANY_TYPES
+        # Always re-synced: COMPANY_TYPES is the source of truth for the table
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            await conn.execute(
+                """INSERT INTO company_types (key, name, tier, cost, income_per_min, risk)
+                   SELECT * FROM unnest($1::text[], $2::text[], $3::text[], $4::bigint[], $5::int[], $6::float8[])
+                   ON CONFLICT (key) DO UPDATE
+                   SET name = EXCLUDED.name, tier = EXCLUDED.tier, cost = EXCLUDED.cost,
+                       income_per_min = EXCLUDED.income_per_min, risk = EXCLUDED.risk""",
+                list(COMPANY_TYPES), [t['name'] for t in COMPANY_TYPES.values()],
+                [t['tier'] for t in COMPANY_TYPES.values()], [t['cost'] for t in COMPANY_TYPES.values()],
+                [t['income_per_min'] for t in COMPANY_TYPES.values()], [t['risk'] for t in COMPANY_TYPES.values()]
+            )
+        logger.info(f"    Synced {len(COMPANY_TYPES)} company types")
+    
     async def close(self):
         logger.info("Shutting down...")
+        try:
+            from utils.announce import outbox
+            await outbox.stop()
+            from utils.leader import leader
+            await leader.stop()
+        except:
+            pass
         try:
             from utils.database import close_pool
             await close_pool()
@@ -205,11 +251,12 @@ async def help_cmd(ctx: discord.ApplicationContext):
         "💼 Companies": "/company list  start  status  collect  invest  close",
         "💱 Trading": "/trade board  sell  buy  cancel  /shop  /shopbuy",
         "🚨 Heists": "/heist targets  create  join  execute  list",
-        "🗺️  Territory": "/territory map  info  attack  fortify  /map",
+        "🗺️  Territory": "/territory map  info  attack  fortify  /map  /map_history",
         "🧬 Skills": "/skills tree  my  learn  upgrade",
-        "⚔️  PvP": "/pvp <@opponent>",
+        "⚔️  PvP": "/pvp duel  queue  leave  rank  replay",
+        "🏟️ Tournaments": "/tournament create  join  list  start",
         "📖 Story": "/story play  status  restart",
-        "🏆 Leaderboard": "/leaderboard credits  level  rep",
+        "🏆 Leaderboard": "/leaderboard credits  level  rep  networth",
     }
     
     for title, cmds in sections.items():
@@ -221,7 +268,7 @@ async def help_cmd(ctx: discord.ApplicationContext):
             "```\n"
             "• Daily territory income distribution\n"
             "• Random city events every 30 mins\n"
-            "• Daily faction war battles\n"
+            "• Faction war battles every 10 mins\n"
             "```"
         ),
         inline=False
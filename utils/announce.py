@@ -0,0 +1,240 @@
+# utils/announce.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Announcements go through the outbox table: game logic calls broadcast(),
+# which resolves one channel per guild and queues the message for each in a
+# single INSERT, then returns — it never waits on Discord.
+#
+# Each guild gets its configured channel (guild_settings.announce_channel_id)
+# or, failing that, its #city-events channel or the first one the bot can
+# write to.
+#
+# The leader replica runs the OutboxWorker.  It leases due rows, coalesces
+# everything queued for one channel into as few embeds as Discord allows, and
+# sends channels concurrently: at most ANNOUNCE_CONCURRENCY in flight, paced
+# to ANNOUNCE_RATE per second for the global per-bot limit.  That limit is
+# per token, which is why only one replica sends.  The HTTP client already
+# handles per-route buckets and 429s.  Delivered rows are deleted; failed
+# ones are retried with exponential backoff, except for channels that are
+# gone or forbid the bot.
+# ─────────────────────────────────────────────────────────────────────────────
+import asyncio
+import json
+import logging
+import time
+
+import discord
+
+from utils.database import get_announce_channels, enqueue_messages, claim_outbox, finish_outbox
+from utils.leader import leader
+
+logger = logging.getLogger('riskpunk')
+
+ANNOUNCE_CONCURRENCY = 16
+ANNOUNCE_RATE = 40                   # sends/second, under the global 50/s
+FALLBACK_CHANNEL_NAME = "city-events"
+
+OUTBOX_POLL_SECONDS = 5
+OUTBOX_BATCH = 500
+OUTBOX_LEASE_SECONDS = 300
+OUTBOX_SEND_TIMEOUT = 30
+OUTBOX_MAX_ATTEMPTS = 8
+OUTBOX_RETRY_SECONDS = 15            # doubled per attempt
+OUTBOX_RETRY_MAX_SECONDS = 1800
+
+EMBED_FIELD_LIMIT = 25
+EMBED_CHAR_LIMIT = 5500              # Discord allows 6000 per message
+
+_fallback = {}                       # guild_id -> auto-picked channel id
+
+
+class _Pacer:
+    """Hands out send slots no closer together than 1/rate seconds."""
+
+    def __init__(self, rate: float):
+        self.interval = 1 / rate
+        self._next = 0.0
+
+    async def wait(self):
+        now = time.monotonic()
+        slot = max(now, self._next)
+        self._next = slot + self.interval
+        if slot > now:
+            await asyncio.sleep(slot - now)
+
+
+_pacer = _Pacer(ANNOUNCE_RATE)
+
+
+def resolve_channel(guild: discord.Guild, configured: dict):
+    """The guild's announcement channel, or None if the bot can't post anywhere."""
+    for channel_id in (configured.get(guild.id), _fallback.get(guild.id)):
+        channel = guild.get_channel(channel_id) if channel_id else None
+        if channel is not None and channel.permissions_for(guild.me).send_messages:
+            return channel
+    writable = [c for c in guild.text_channels if c.permissions_for(guild.me).send_messages]
+    if not writable:
+        return None
+    channel = discord.utils.get(writable, name=FALLBACK_CHANNEL_NAME) or writable[0]
+    _fallback[guild.id] = channel.id
+    return channel
+
+
+async def broadcast(bot, content: str = None, embed: discord.Embed = None) -> int:
+    """Queue a message for every guild's announcement channel; returns how many were queued."""
+    configured = await get_announce_channels()
+    channel_ids = [c.id for c in (resolve_channel(g, configured) for g in bot.guilds) if c is not None]
+    payload = {"content": content, "embed": embed.to_dict() if embed else None}
+    queued = await enqueue_messages(channel_ids, payload)
+    outbox.notify()
+    return queued
+
+
+# ── Coalescing ──────────────────────────────────────────────────────────────
+def _embed_size(embed: dict) -> int:
+    return (len(embed.get("title") or "") + len(embed.get("description") or "")
+            + sum(len(f["name"]) + len(f["value"]) for f in embed.get("fields", [])))
+
+
+def coalesce(rows) -> list:
+    """
+    Merge (id, payload) rows queued for one channel into as few messages as
+    possible.  Returns [(send kwargs, ids)] in queue order.
+
+    Embeds with one title share it and pool their fields; mixed titles
+    become one "CITY UPDATES" embed with a field per message.  Embeds are
+    split at EMBED_FIELD_LIMIT fields / EMBED_CHAR_LIMIT characters, and
+    plain-text content is sent on its own.
+    """
+    messages = []
+    embeds = [(i, p["embed"]) for i, p in rows if p.get("embed")]
+    for i, p in rows:
+        if p.get("content"):
+            messages.append(({"content": p["content"]}, {i}))
+    if not embeds:
+        return messages
+
+    titles = {e.get("title") for _, e in embeds}
+    shared = len(titles) == 1
+    first = embeds[0][1]
+    base = {k: v for k, v in first.items() if k in ("title", "color", "footer", "type")}
+    if not shared:
+        base["title"] = "📢 CITY UPDATES"
+
+    fields = []
+    for i, e in embeds:
+        head = e.get("description") if shared else (e.get("description") or "\u200b")
+        if head:
+            name = "\u200b" if shared else e.get("title") or "\u200b"
+            fields.append((i, {"name": name[:256], "value": head[:1024], "inline": False}))
+        fields.extend((i, f) for f in e.get("fields", []))
+
+    # A lone embed that fits is sent untouched (keeps its description etc.)
+    if len(embeds) == 1 and len(first.get("fields", [])) <= EMBED_FIELD_LIMIT \
+            and _embed_size(first) <= EMBED_CHAR_LIMIT:
+        return [({"embed": first}, {embeds[0][0]})] + messages
+
+    chunks, current, ids = [], dict(base, fields=[]), set()
+    for i, f in fields:
+        if current["fields"] and (len(current["fields"]) >= EMBED_FIELD_LIMIT
+                                  or _embed_size(current) + len(f["name"]) + len(f["value"]) > EMBED_CHAR_LIMIT):
+            chunks.append(({"embed": current}, ids))
+            current, ids = dict(base, fields=[]), set()
+        current["fields"].append(f)
+        ids.add(i)
+    chunks.append(({"embed": current}, ids))
+    return chunks + messages
+
+
+# ── Sender ──────────────────────────────────────────────────────────────────
+class OutboxWorker:
+    """Drains the outbox on the leader replica."""
+
+    def __init__(self):
+        self.bot = None
+        self._task = None
+        self._wake = asyncio.Event()
+
+    def start(self, bot):
+        self.bot = bot
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    def notify(self):
+        """Something was queued — drain now instead of at the next poll."""
+        self._wake.set()
+
+    async def _run(self):
+        while True:
+            try:
+                if leader.is_leader:
+                    while await self.drain() >= OUTBOX_BATCH:
+                        pass
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Outbox drain failed: {e}")
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=OUTBOX_POLL_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+
+    async def drain(self) -> int:
+        """Deliver one batch of due messages; returns how many rows were leased."""
+        rows = await claim_outbox(OUTBOX_BATCH, OUTBOX_LEASE_SECONDS, OUTBOX_MAX_ATTEMPTS)
+        by_channel = {}
+        for r in rows:
+            by_channel.setdefault(r['channel_id'], []).append(r)
+        semaphore = asyncio.Semaphore(ANNOUNCE_CONCURRENCY)
+        sent, failures = [], []
+
+        async def deliver(channel_id, batch):
+            attempts = max(r['attempts'] for r in batch)
+            messages = coalesce([(r['id'], json.loads(r['payload'])) for r in batch])
+            pending = {r['id'] for r in batch}
+            channel = self.bot.get_channel(channel_id)
+            if channel is None:
+                failures.extend((i, "channel not found", None) for i in pending)
+                return
+            async with semaphore:
+                for n, (message, ids) in enumerate(messages):
+                    kwargs = dict(message)
+                    if "embed" in kwargs:
+                        kwargs["embed"] = discord.Embed.from_dict(kwargs["embed"])
+                    try:
+                        await _pacer.wait()
+                        await asyncio.wait_for(channel.send(**kwargs), timeout=OUTBOX_SEND_TIMEOUT)
+                    except (discord.HTTPException, asyncio.TimeoutError, OSError) as e:
+                        unsent = set().union(*(m_ids for _, m_ids in messages[n:]))
+                        retry = None
+                        if isinstance(e, (discord.Forbidden, discord.NotFound)):
+                            if _fallback.get(channel.guild.id) == channel_id:
+                                _fallback.pop(channel.guild.id)   # Re-pick on the next broadcast
+                        else:
+                            retry = min(OUTBOX_RETRY_SECONDS * 2 ** (attempts - 1), OUTBOX_RETRY_MAX_SECONDS)
+                        failures.extend((i, str(e) or type(e).__name__, retry) for i in unsent)
+                        pending -= unsent
+                        break
+                sent.extend(pending)
+
+        await asyncio.gather(*(deliver(c, b) for c, b in by_channel.items()))
+        if rows:
+            await finish_outbox(sent, failures)
+            if failures:
+                logger.warning(f"Outbox: {len(sent)} delivered, {len(failures)} failed")
+            attempts = {r['id']: r['attempts'] for r in rows}
+            abandoned = [f for f in failures if f[2] is None or attempts[f[0]] >= OUTBOX_MAX_ATTEMPTS]
+            if abandoned:
+                logger.warning(
+                    f"Outbox: abandoned {len(abandoned)} message(s) "
+                    f"(e.g. #{abandoned[0][0]}: {abandoned[0][1]}); outbox_purge drops them"
+                )
+        return len(rows)
+
+
+outbox = OutboxWorker()
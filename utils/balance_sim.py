@@ -0,0 +1,383 @@
+# utils/balance_sim.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Offline balance simulator.  Enumerates implant / skill / equipment / stance
+# builds, collapses them into unique effective-stat profiles and duels every
+# profile against every other one across all cores.
+#
+#   python -m utils.balance_sim --duels 20 --max-profiles 400
+#
+# Nothing here touches Discord or the DB.
+# ─────────────────────────────────────────────────────────────────────────────
+import argparse
+import itertools
+import json
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from utils.combat import COMBAT_STANCES, SKILL_BONUS_KEYS, compute_effective_stats, simulate_duel
+from utils.game_data import (
+    IMPLANTS, IMPLANT_SLOTS, SKILL_TREE, SKILL_BRANCHES,
+    ITEM_CATALOG, EQUIPMENT_SLOTS
+)
+
+# Fresh runner straight out of /register (players table defaults)
+BASE_PLAYER = {"atk": 10, "def": 5, "spd": 8, "max_hp": 100, "hp": 100}
+
+STAT_KEYS = ("atk", "def", "spd", "max_hp")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# BUILD ENUMERATION
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _skill_chain(branch: str) -> list:
+    """Skill keys of a branch ordered root → leaf."""
+    nodes = {k: v for k, v in SKILL_TREE.items() if v["branch"] == branch}
+    chain = []
+    parent = None
+    while True:
+        nxt = next((k for k, v in nodes.items() if v["parent"] == parent), None)
+        if nxt is None:
+            return chain
+        chain.append(nxt)
+        parent = nxt
+
+
+def _implant_options() -> list:
+    """Every implant loadout: one implant (or none) per slot."""
+    per_slot = [[None] + [k for k, v in IMPLANTS.items() if v["slot"] == slot] for slot in IMPLANT_SLOTS]
+    return [tuple(k for k in combo if k) for combo in itertools.product(*per_slot)]
+
+
+def _skill_options(levels) -> list:
+    """Every skill loadout: per branch, a learned prefix of the chain at a uniform level."""
+    per_branch = []
+    for branch in SKILL_BRANCHES:
+        chain = _skill_chain(branch)
+        opts = [()]
+        for depth in range(1, len(chain) + 1):
+            for lvl in levels:
+                opts.append(tuple((key, lvl) for key in chain[:depth]))
+        per_branch.append(opts)
+    return [tuple(itertools.chain.from_iterable(combo)) for combo in itertools.product(*per_branch)]
+
+
+def _equipment_options() -> list:
+    """Every gear loadout: one item (or none) per equipment slot."""
+    per_slot = [[None] + [k for k, v in ITEM_CATALOG.items() if v.get("slot") == slot] for slot in EQUIPMENT_SLOTS]
+    return [tuple(k for k in combo if k) for combo in itertools.product(*per_slot)]
+
+
+def _implant_delta(keys):
+    delta = dict.fromkeys(STAT_KEYS, 0)
+    for k in keys:
+        for stat, val in IMPLANTS[k].get("bonuses", {}).items():
+            if stat in delta:
+                delta[stat] += val
+    return delta, sum(IMPLANTS[k]["cost"] for k in keys)
+
+
+def _skill_delta(skills):
+    delta = dict.fromkeys(STAT_KEYS, 0)
+    cost = 0
+    for key, lvl in skills:
+        data = SKILL_TREE[key]
+        # Only skills compute_effective_stats applies may tell loadouts apart
+        if key in SKILL_BONUS_KEYS:
+            for stat, val in data.get("bonus", {}).items():
+                if stat in delta:
+                    delta[stat] += val * lvl
+        # learn cost + upgrade costs (base × current level)
+        cost += data["cost"] * (1 + sum(range(1, lvl)))
+    return delta, cost
+
+
+def _equipment_delta(items):
+    delta = dict.fromkeys(STAT_KEYS, 0)
+    for name in items:
+        data = ITEM_CATALOG[name]
+        delta["atk"] += data.get("atk_bonus", 0)
+        delta["def"] += data.get("def_bonus", 0)
+        delta["spd"] += data.get("spd_bonus", 0)
+    return delta, sum(ITEM_CATALOG[n]["base_price"] for n in items)
+
+
+def _dedupe(options, delta_fn):
+    """
+    Collapse loadouts with identical stat deltas, keeping the cheapest.
+    Returns {delta: (loadout, cost, number of loadouts collapsed)}.
+    """
+    best = {}
+    for opt in options:
+        delta, cost = delta_fn(opt)
+        key = tuple(delta[s] for s in STAT_KEYS)
+        if key not in best:
+            best[key] = (opt, cost, 1)
+        else:
+            count = best[key][2] + 1
+            best[key] = (opt, cost, count) if cost < best[key][1] else best[key][:2] + (count,)
+    return best
+
+
+def enumerate_profiles(skill_levels=(1, 5)):
+    """
+    Build the full implant × skill × equipment × stance space and collapse it
+    into unique effective-stat profiles.
+
+    Components are deduplicated by stat delta before being combined, so the
+    space is never materialised build-by-build.  Each profile keeps the
+    cheapest build that produces it plus the number of builds it stands for
+    ("builds"; they sum to total_builds).
+
+    Returns (profiles, total_builds).
+    """
+    implants = _dedupe(_implant_options(), _implant_delta)
+    skills = _dedupe(_skill_options(skill_levels), _skill_delta)
+    gear = _dedupe(_equipment_options(), _equipment_delta)
+    total_builds = (len(_implant_options()) * len(_skill_options(skill_levels))
+                    * len(_equipment_options()) * len(COMBAT_STANCES))
+
+    # Combine pairwise, deduping after each step (deltas are additive)
+    combined = {(0, 0, 0, 0): ((), 0, 1)}
+    for part in (implants, skills, gear):
+        nxt = {}
+        for key_a, (opts_a, cost_a, count_a) in combined.items():
+            for key_b, (opt_b, cost_b, count_b) in part.items():
+                key = tuple(a + b for a, b in zip(key_a, key_b))
+                cost = cost_a + cost_b
+                count = count_a * count_b + (nxt[key][2] if key in nxt else 0)
+                if key not in nxt or cost < nxt[key][1]:
+                    nxt[key] = (opts_a + (opt_b,), cost, count)
+                else:
+                    nxt[key] = nxt[key][:2] + (count,)
+        combined = nxt
+
+    profiles = {}
+    for (imp_keys, skill_rows, items), cost, count in combined.values():
+        for stance in COMBAT_STANCES:
+            stats = compute_effective_stats(
+                BASE_PLAYER,
+                [{"implant_key": k} for k in imp_keys],
+                [{"skill_key": k, "level": lvl} for k, lvl in skill_rows],
+                [{"item_name": n} for n in items],
+                stance,
+            )
+            key = (stats["atk"], stats["def"], stats["spd"], stats["max_hp"])
+            builds = count + (profiles[key]["builds"] if key in profiles else 0)
+            if key not in profiles or cost < profiles[key]["cost"]:
+                profiles[key] = {
+                    "stats":    stats,
+                    "cost":     cost,
+                    "stance":   stance,
+                    "implants": list(imp_keys),
+                    "skills":   [f"{k}:{lvl}" for k, lvl in skill_rows],
+                    "gear":     list(items),
+                    "builds":   builds,
+                }
+            else:
+                profiles[key]["builds"] = builds
+    return list(profiles.values()), total_builds
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# MATCHUP MATRIX (process pool)
+# ═══════════════════════════════════════════════════════════════════════════
+
+_worker_stats = None
+
+
+def _init_worker(stats):
+    global _worker_stats
+    _worker_stats = stats
+
+
+def _run_rows(rows, duels, seed):
+    """Duel each row profile against every higher-indexed profile."""
+    rng = random.Random(seed)
+    stats = _worker_stats
+    n = len(stats)
+    out = []
+    for i in rows:
+        s1 = stats[i]
+        wins_i = []
+        wins_j = []
+        for j in range(i + 1, n):
+            s2 = stats[j]
+            w1 = w2 = 0
+            for _ in range(duels):
+                winner = simulate_duel(s1, s2, rng)["winner"]
+                if winner == 1:
+                    w1 += 1
+                elif winner == 2:
+                    w2 += 1
+            wins_i.append(w1)
+            wins_j.append(w2)
+        out.append((i, wins_i, wins_j))
+    return out
+
+
+def run_matrix(profiles, duels=20, workers=None, seed=0):
+    """Return wins[i][j] — duels profile i won against profile j."""
+    n = len(profiles)
+    stats = [p["stats"] for p in profiles]
+    workers = workers or os.cpu_count() or 1
+    # Interleave rows so every task gets a similar number of pairs
+    n_tasks = max(1, workers * 8)
+    tasks = [list(range(k, n, n_tasks)) for k in range(min(n_tasks, n))]
+
+    wins = [[0] * n for _ in range(n)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(stats,)) as pool:
+        futures = [pool.submit(_run_rows, rows, duels, seed + k) for k, rows in enumerate(tasks)]
+        for fut in futures:
+            for i, wins_i, wins_j in fut.result():
+                for off, (w1, w2) in enumerate(zip(wins_i, wins_j)):
+                    j = i + 1 + off
+                    wins[i][j] = w1
+                    wins[j][i] = w2
+    return wins
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# REPORTING
+# ═══════════════════════════════════════════════════════════════════════════
+
+def _describe(p) -> str:
+    s = p["stats"]
+    parts = [
+        f"{COMBAT_STANCES[p['stance']]['name']}",
+        f"ATK {s['atk']} DEF {s['def']} SPD {s['spd']} HP {s['max_hp']}",
+    ]
+    if p["implants"]:
+        parts.append("imp=" + ",".join(p["implants"]))
+    if p["skills"]:
+        parts.append("sk=" + ",".join(p["skills"]))
+    if p["gear"]:
+        parts.append("gear=" + ",".join(p["gear"]))
+    return "  ".join(parts)
+
+
+def build_report(profiles, wins, duels):
+    n = len(profiles)
+    per_opponent = duels * max(1, n - 1)
+    for i, p in enumerate(profiles):
+        p["win_rate"] = sum(wins[i]) / per_opponent
+
+    ranked = sorted(range(n), key=lambda i: profiles[i]["win_rate"], reverse=True)
+
+    # Pareto front: no cheaper (or equal cost) build has a higher win rate
+    pareto = []
+    best_rate = -1.0
+    for i in sorted(range(n), key=lambda i: (profiles[i]["cost"], -profiles[i]["win_rate"])):
+        if profiles[i]["win_rate"] > best_rate:
+            pareto.append(i)
+            best_rate = profiles[i]["win_rate"]
+
+    # Stance vs stance
+    stance_keys = list(COMBAT_STANCES)
+    stance_tab = {a: {b: [0, 0] for b in stance_keys} for a in stance_keys}
+    for i in range(n):
+        a = profiles[i]["stance"]
+        for j in range(n):
+            if i == j:
+                continue
+            cell = stance_tab[a][profiles[j]["stance"]]
+            cell[0] += wins[i][j]
+            cell[1] += duels
+
+    # Marginal win rate per component
+    components = {}
+    for p in profiles:
+        for tag in ([f"implant:{k}" for k in p["implants"]]
+                    + [f"skill:{s.split(':')[0]}" for s in p["skills"]]
+                    + [f"gear:{g}" for g in p["gear"]]):
+            components.setdefault(tag, []).append(p["win_rate"])
+
+    return {
+        "ranked":     ranked,
+        "pareto":     pareto,
+        "stances":    {a: {b: (c[0] / c[1] if c[1] else 0.0) for b, c in row.items()} for a, row in stance_tab.items()},
+        "components": {k: sum(v) / len(v) for k, v in components.items()},
+    }
+
+
+def print_report(profiles, report, top):
+    line = "━" * 78
+    print(line)
+    print(f"TOP {top} BUILDS BY WIN RATE")
+    print(line)
+    for rank, i in enumerate(report["ranked"][:top], 1):
+        p = profiles[i]
+        print(f"#{rank:<3} {p['win_rate']*100:5.1f}%  {p['cost']:>8,} ₵  {_describe(p)}")
+
+    print(line)
+    print("DOMINANT BUILDS (Pareto front: best win rate for the money)")
+    print(line)
+    for i in report["pareto"]:
+        p = profiles[i]
+        print(f"      {p['win_rate']*100:5.1f}%  {p['cost']:>8,} ₵  {_describe(p)}")
+
+    print(line)
+    print("STANCE WIN-RATE TABLE (row vs column)")
+    print(line)
+    keys = list(report["stances"])
+    print(" " * 12 + "".join(f"{k[:10]:>12}" for k in keys))
+    for a in keys:
+        print(f"{a[:10]:<12}" + "".join(f"{report['stances'][a][b]*100:11.1f}%" for b in keys))
+
+    print(line)
+    print("COMPONENT WIN RATES (mean over profiles using the component)")
+    print(line)
+    for tag, rate in sorted(report["components"].items(), key=lambda kv: kv[1], reverse=True):
+        print(f"  {tag:<32} {rate*100:5.1f}%")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Riskpunk offline PvP balance simulator")
+    parser.add_argument("--duels", type=int, default=20, help="duels per matchup")
+    parser.add_argument("--max-profiles", type=int, default=400, help="sample this many unique profiles (0 = all)")
+    parser.add_argument("--skill-levels", default="1,5", help="skill levels to enumerate, comma separated")
+    parser.add_argument("--workers", type=int, default=0, help="worker processes (default: all cores)")
+    parser.add_argument("--seed", type=int, default=1337)
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--json", dest="json_path", help="write full results to this file")
+    args = parser.parse_args(argv)
+
+    levels = tuple(int(x) for x in args.skill_levels.split(",") if x.strip())
+
+    t0 = time.perf_counter()
+    profiles, total_builds = enumerate_profiles(levels)
+    unique = len(profiles)
+    if args.max_profiles and unique > args.max_profiles:
+        profiles = random.Random(args.seed).sample(profiles, args.max_profiles)
+    t_enum = time.perf_counter() - t0
+
+    n = len(profiles)
+    total_duels = n * (n - 1) // 2 * args.duels
+    print(f"Builds enumerated: {total_builds:,}  →  unique profiles: {unique:,}  →  simulated: {n:,}")
+    print(f"Running {total_duels:,} duels on {args.workers or os.cpu_count()} worker(s)...")
+
+    t1 = time.perf_counter()
+    wins = run_matrix(profiles, args.duels, args.workers or None, args.seed)
+    t_sim = time.perf_counter() - t1
+
+    report = build_report(profiles, wins, args.duels)
+    print_report(profiles, report, args.top)
+    print("━" * 78)
+    print(f"Enumeration {t_enum:.2f}s  ┆  Simulation {t_sim:.2f}s  ┆  {total_duels / max(t_sim, 1e-9):,.0f} duels/s")
+
+    if args.json_path:
+        with open(args.json_path, "w") as fh:
+            json.dump({
+                "duels_per_matchup": args.duels,
+                "profiles":          profiles,
+                "wins":              wins,
+                "stances":           report["stances"],
+                "components":        report["components"],
+                "pareto":            report["pareto"],
+            }, fh)
+
+
+if __name__ == "__main__":
+    main()
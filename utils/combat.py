@@ -0,0 +1,197 @@
+# utils/combat.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Shared duel engine.  Pure Python — no discord / DB imports — so the same
+# code runs inside slash commands and inside worker processes (balance
+# simulator, tournaments).
+# ─────────────────────────────────────────────────────────────────────────────
+import random
+
+from utils.game_data import IMPLANTS, ITEM_CATALOG, SKILL_TREE
+
+MAX_ROUNDS = 50
+
+# Bump whenever simulate_duel / compute_effective_stats change behaviour.
+# pvp_log rows store the version they were fought under; a replay is only
+# guaranteed to match when the versions agree.
+ENGINE_VERSION = 1
+
+# Combat stances
+COMBAT_STANCES = {
+    "aggressive": {
+        "name": "Aggressive",
+        "desc": "High damage, low defense",
+        "atk_mult": 1.3,
+        "def_mult": 0.7,
+        "emoji": "⚔️"
+    },
+    "defensive": {
+        "name": "Defensive",
+        "desc": "Low damage, high defense",
+        "atk_mult": 0.7,
+        "def_mult": 1.3,
+        "emoji": "🛡️"
+    },
+    "balanced": {
+        "name": "Balanced",
+        "desc": "Normal damage and defense",
+        "atk_mult": 1.0,
+        "def_mult": 1.0,
+        "emoji": "⚖️"
+    },
+    "tactical": {
+        "name": "Tactical",
+        "desc": "Bonus to speed, normal damage/def",
+        "atk_mult": 1.0,
+        "def_mult": 1.0,
+        "spd_mult": 1.2,
+        "emoji": "🎯"
+    }
+}
+
+# Skills whose SKILL_TREE bonus applies in combat
+SKILL_BONUS_KEYS = ["combat_basics", "dual_strike", "killswitch",
+                    "shadow_step", "ghost_protocol", "phantom_strike", "god_mode"]
+
+
+def compute_effective_stats(player, implants, skills, equipped_items, stance="balanced", world=None):
+    """
+    Return dict with effective atk, def, spd, max_hp after all bonuses + stance.
+
+    `world` is the live world-modifier effects (ActiveModifiers.combat_effects):
+    implant_mult scales individual implants, atk/def/spd_mult scale the totals.
+    """
+    world = world or {}
+    implant_mult = world.get("implant_mult", {})
+    stats = {
+        "atk":    player["atk"],
+        "def":    player["def"],
+        "spd":    player["spd"],
+        "max_hp": player["max_hp"],
+        "hp":     player["hp"],
+    }
+
+    # Apply implant bonuses
+    for imp in implants:
+        data = IMPLANTS.get(imp["implant_key"], {})
+        mult = implant_mult.get(imp["implant_key"], 1)
+        for stat, val in data.get("bonuses", {}).items():
+            if stat in stats:
+                stats[stat] += val if mult == 1 else int(val * mult)
+
+    # Apply skill bonuses
+    for s in skills:
+        if s["skill_key"] in SKILL_BONUS_KEYS:
+            tree_data = SKILL_TREE.get(s["skill_key"], {})
+            for stat, val in tree_data.get("bonus", {}).items():
+                if stat in stats:
+                    stats[stat] += val * s["level"]
+
+    # Apply equipment bonuses
+    for eq_item in equipped_items:
+        item_data = ITEM_CATALOG.get(eq_item["item_name"], {})
+        if 'atk_bonus' in item_data:
+            stats["atk"] += item_data['atk_bonus']
+        if 'def_bonus' in item_data:
+            stats["def"] += item_data['def_bonus']
+        if 'spd_bonus' in item_data:
+            stats["spd"] += item_data['spd_bonus']
+
+    # Apply world modifiers
+    for stat in ("atk", "def", "spd"):
+        if f"{stat}_mult" in world:
+            stats[stat] = int(stats[stat] * world[f"{stat}_mult"])
+
+    # Apply stance modifiers
+    stance_data = COMBAT_STANCES.get(stance, COMBAT_STANCES["balanced"])
+    stats["atk"] = int(stats["atk"] * stance_data["atk_mult"])
+    stats["def"] = int(stats["def"] * stance_data["def_mult"])
+    stats["spd"] = int(stats["spd"] * stance_data.get("spd_mult", 1.0))
+
+    # Clamp hp
+    stats["hp"] = min(stats["hp"], stats["max_hp"])
+    return stats
+
+
+def new_seed() -> int:
+    """Fresh per-match RNG seed (fits a signed BIGINT)."""
+    return random.SystemRandom().getrandbits(63)
+
+
+def simulate_duel(s1, s2, rng=None, names=None):
+    """
+    Run a turn-based duel between two effective-stat dicts.
+
+    rng:   random.Random instance (defaults to the module-level RNG).
+    names: (p1_name, p2_name) — when given, a round-by-round log is built.
+
+    Returns dict: winner (1, 2 or None for a draw), rounds, hp1, hp2, log.
+    """
+    rng = rng or random
+    randint = rng.randint
+    hp1 = s1["hp"]
+    hp2 = s2["hp"]
+    atk1, def1 = s1["atk"], s1["def"]
+    atk2, def2 = s2["atk"], s2["def"]
+    rounds = 0
+    log_lines = [] if names else None
+
+    # Determine who goes first
+    if s1["spd"] > s2["spd"]:
+        order = (1, 2)
+    elif s2["spd"] > s1["spd"]:
+        order = (2, 1)
+    else:
+        order = rng.choice([(1, 2), (2, 1)])
+
+    while hp1 > 0 and hp2 > 0 and rounds < MAX_ROUNDS:
+        rounds += 1
+        for attacker_id in order:
+            if hp1 <= 0 or hp2 <= 0:
+                break
+            if attacker_id == 1:
+                raw_dmg = atk1 + randint(0, max(1, atk1 // 2))
+                actual_dmg = max(1, raw_dmg - def2 + randint(-3, 3))
+                hp2 -= actual_dmg
+                if log_lines is not None:
+                    log_lines.append(f"Rnd {rounds}: {names[0]} → {actual_dmg} dmg  [{names[1]} HP: {max(0, hp2)}]")
+            else:
+                raw_dmg = atk2 + randint(0, max(1, atk2 // 2))
+                actual_dmg = max(1, raw_dmg - def1 + randint(-3, 3))
+                hp1 -= actual_dmg
+                if log_lines is not None:
+                    log_lines.append(f"Rnd {rounds}: {names[1]} → {actual_dmg} dmg  [{names[0]} HP: {max(0, hp1)}]")
+
+    if hp1 > 0 and hp2 <= 0:
+        winner = 1
+    elif hp2 > 0 and hp1 <= 0:
+        winner = 2
+    else:
+        winner = None
+
+    return {
+        "winner": winner,
+        "rounds": rounds,
+        "hp1":    hp1,
+        "hp2":    hp2,
+        "log":    log_lines or [],
+    }
+
+
+def duel_snapshot(p1_name, s1, p1_stance, p2_name, s2, p2_stance, world=None) -> dict:
+    """
+    Everything (besides the seed) needed to replay a duel bit-for-bit.  The
+    stats already include any world modifiers; `world` is kept for display.
+    """
+    snapshot = {
+        "p1": {"name": p1_name, "stance": p1_stance, "stats": s1},
+        "p2": {"name": p2_name, "stance": p2_stance, "stats": s2},
+    }
+    if world:
+        snapshot["world"] = world
+    return snapshot
+
+
+def replay_duel(snapshot: dict, seed: int):
+    """Re-run a logged duel from its stat snapshot and seed."""
+    p1, p2 = snapshot["p1"], snapshot["p2"]
+    return simulate_duel(p1["stats"], p2["stats"], random.Random(seed), names=(p1["name"], p2["name"]))
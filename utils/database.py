@@ -1,9 +1,17 @@
 # utils/database.py
 # PostgreSQL/Neon Database Layer - ENHANCED VERSION with Companies & Guild Settings
+import asyncio
 import asyncpg
+import json
 import os
+import time
 from typing import Optional
 
+from utils.elo import ELO_START, ELO_K_FACTOR, elo_delta, match_score, recompute_ratings
+from utils.game_data import ITEM_CATALOG, IMPLANTS
+from utils.modifiers import ActiveModifiers
+from utils.territory_graph import TerritoryGraph
+
 # Database connection from environment variable
 DATABASE_URL = os.getenv("DATABASE_URL", "")
 
@@ -61,6 +69,12 @@ async def init_db():
             )
         """)
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_players_discord_id ON players(discord_id)")
+        # Value of held assets (inventory, implants, companies), kept current
+        # by the helpers that change them and reconciled nightly.  Net worth
+        # is credits + asset_value; the expression index makes the net-worth
+        # leaderboard a top-N index scan.
+        await conn.execute("ALTER TABLE players ADD COLUMN IF NOT EXISTS asset_value NUMERIC(15, 2) NOT NULL DEFAULT 0")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_players_net_worth ON players ((credits + asset_value) DESC)")
 
         # ── Implants ─────────────────────────────────────────
         await conn.execute("""
@@ -115,6 +129,20 @@ async def init_db():
                 connected_to    TEXT
             )
         """)
+        # Map layout cell; NULL = auto-packed by utils.map_render.compute_layout
+        await conn.execute("ALTER TABLE territories ADD COLUMN IF NOT EXISTS grid_x INTEGER")
+        await conn.execute("ALTER TABLE territories ADD COLUMN IF NOT EXISTS grid_y INTEGER")
+
+        # ── Territory Links ─────────────────────────────────
+        # Undirected adjacency, stored once per pair (territory_a < territory_b)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS territory_links (
+                territory_a     TEXT    NOT NULL REFERENCES territories(key) ON DELETE CASCADE,
+                territory_b     TEXT    NOT NULL REFERENCES territories(key) ON DELETE CASCADE,
+                PRIMARY KEY (territory_a, territory_b),
+                CHECK (territory_a < territory_b)
+            )
+        """)
 
         # ── Siege History - NEW ──────────────────────────────
         await conn.execute("""
@@ -130,6 +158,13 @@ async def init_db():
                 participants        TEXT[]
             )
         """)
+        # Live siege state, so open sieges survive restarts
+        await conn.execute("ALTER TABLE siege_history ADD COLUMN IF NOT EXISTS siege_hp INTEGER NOT NULL DEFAULT 100")
+        await conn.execute("ALTER TABLE siege_history ADD COLUMN IF NOT EXISTS territory_defense INTEGER")
+        # At most one open siege per territory
+        await conn.execute(
+            "CREATE UNIQUE INDEX IF NOT EXISTS idx_siege_history_open ON siege_history(territory_key) WHERE ended_at IS NULL"
+        )
 
         # ── Combat Log - NEW ─────────────────────────────────
         await conn.execute("""
@@ -146,9 +181,118 @@ async def init_db():
                 timestamp       TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # The acting player's faction at the time, so captures stay attributed
+        # to it after the player switches faction
+        await conn.execute("ALTER TABLE combat_log ADD COLUMN IF NOT EXISTS faction_id INTEGER")
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_combat_log_player ON combat_log(player_id)")
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_combat_log_timestamp ON combat_log(timestamp)")
 
+        # ── Territory Captures ──────────────────────────────
+        # Every owner change, whichever code path made it, so the map
+        # history can be replayed.  Written by the trigger below.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS territory_captures (
+                id              SERIAL PRIMARY KEY,
+                territory_key   TEXT    NOT NULL,
+                from_faction    INTEGER,
+                to_faction      INTEGER,
+                defense         INTEGER,
+                captured_at     TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_territory_captures_at ON territory_captures(captured_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_territory_captures_key ON territory_captures(territory_key, captured_at)")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_siege_history_ended ON siege_history(ended_at)")
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION log_territory_capture() RETURNS trigger AS $$
+            BEGIN
+                INSERT INTO territory_captures (territory_key, from_faction, to_faction, defense)
+                VALUES (NEW.key, OLD.owner_faction, NEW.owner_faction, NEW.defense);
+                RETURN NEW;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_territory_capture ON territories")
+        await conn.execute("""
+            CREATE TRIGGER trg_territory_capture
+            AFTER UPDATE OF owner_faction ON territories
+            FOR EACH ROW WHEN (OLD.owner_faction IS DISTINCT FROM NEW.owner_faction)
+            EXECUTE FUNCTION log_territory_capture()
+        """)
+        # Ownership changes in one time-ordered stream.  territory_captures
+        # records every change once the trigger exists; siege_history and
+        # combat_log only fill in the time before its first row, where they
+        # are the sole record (counting them after would repeat captures).
+        # Captures logged without a faction are skipped: their owner is
+        # unknown.  from_known is false where the previous owner wasn't recorded.
+        await conn.execute("""
+            CREATE OR REPLACE VIEW territory_ownership_events AS
+                SELECT captured_at AS at, territory_key, from_faction, to_faction, defense, TRUE AS from_known
+                  FROM territory_captures
+                UNION ALL
+                SELECT ended_at, territory_key, defender_faction, attacker_faction, NULL, TRUE
+                  FROM siege_history
+                 WHERE result = 'captured' AND ended_at IS NOT NULL
+                   AND ended_at < (SELECT COALESCE(MIN(captured_at), 'infinity') FROM territory_captures)
+                UNION ALL
+                SELECT timestamp, territory_key, NULL, faction_id, NULL, FALSE
+                  FROM combat_log
+                 WHERE result = 'captured' AND faction_id IS NOT NULL
+                   AND timestamp < (SELECT COALESCE(MIN(captured_at), 'infinity') FROM territory_captures)
+        """)
+
+        # ── Cross-replica change counters ───────────────────
+        # Bumped by triggers in the writing transaction, so a
+        # replica that sees a new value also sees the rows behind it.  Each
+        # replica polls them (sync_territory_state) to drop its territory
+        # graph, map renders and siege cache when another one wrote.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS sync_versions (
+                name     TEXT PRIMARY KEY,
+                version  BIGINT NOT NULL DEFAULT 0
+            )
+        """)
+        await conn.execute(
+            "INSERT INTO sync_versions (name) VALUES ('territories'), ('sieges') ON CONFLICT DO NOTHING"
+        )
+        await conn.execute("""
+            CREATE OR REPLACE FUNCTION bump_sync_version() RETURNS trigger AS $$
+            BEGIN
+                UPDATE sync_versions SET version = version + 1 WHERE name = TG_ARGV[0];
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_territories_version ON territories")
+        await conn.execute("""
+            CREATE TRIGGER trg_territories_version
+            AFTER INSERT OR DELETE OR UPDATE OF owner_faction, defense ON territories
+            FOR EACH STATEMENT EXECUTE FUNCTION bump_sync_version('territories')
+        """)
+        # Sieges only count opening and closing: hits update siege_history on
+        # every attack and must neither contend on the counter row nor make
+        # replicas reload their open sieges.
+        await conn.execute("DROP TRIGGER IF EXISTS trg_sieges_version ON siege_history")
+        await conn.execute("""
+            CREATE TRIGGER trg_sieges_version
+            AFTER INSERT ON siege_history
+            FOR EACH ROW EXECUTE FUNCTION bump_sync_version('sieges')
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_sieges_version_close ON siege_history")
+        await conn.execute("""
+            CREATE TRIGGER trg_sieges_version_close
+            AFTER UPDATE OF ended_at ON siege_history
+            FOR EACH ROW WHEN (OLD.ended_at IS NULL AND NEW.ended_at IS NOT NULL)
+            EXECUTE FUNCTION bump_sync_version('sieges')
+        """)
+        await conn.execute("DROP TRIGGER IF EXISTS trg_sieges_version_delete ON siege_history")
+        await conn.execute("""
+            CREATE TRIGGER trg_sieges_version_delete
+            AFTER DELETE ON siege_history
+            FOR EACH ROW WHEN (OLD.ended_at IS NULL)
+            EXECUTE FUNCTION bump_sync_version('sieges')
+        """)
+
         # ── Active Trades ───────────────────────────────────
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS trades (
@@ -237,6 +381,8 @@ async def init_db():
                 resolved    INTEGER NOT NULL DEFAULT 0
             )
         """)
+        await conn.execute("ALTER TABLE event_log ADD COLUMN IF NOT EXISTS affected JSONB")
+        await conn.execute("ALTER TABLE event_log ADD COLUMN IF NOT EXISTS duration DOUBLE PRECISION")
 
         # ── PvP Match Log ────────────────────────────────────
         await conn.execute("""
@@ -250,6 +396,11 @@ async def init_db():
                 fought_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP
             )
         """)
+        # Seed-based replays: the log is regenerated from seed + stat snapshot
+        await conn.execute("ALTER TABLE pvp_log ADD COLUMN IF NOT EXISTS seed BIGINT")
+        await conn.execute("ALTER TABLE pvp_log ADD COLUMN IF NOT EXISTS engine_version INTEGER")
+        await conn.execute("ALTER TABLE pvp_log ADD COLUMN IF NOT EXISTS snapshot JSONB")
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_pvp_log_fought_at ON pvp_log(fought_at, id)")
 
         # ── PvP Rankings ────────────────────────────────────
         await conn.execute("""
@@ -264,6 +415,52 @@ async def init_db():
         """)
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_pvp_stats_elo ON pvp_stats(elo DESC)")
 
+        # ── Tournaments ─────────────────────────────────────
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tournaments (
+                id              SERIAL PRIMARY KEY,
+                guild_id        BIGINT,
+                channel_id      BIGINT,
+                name            TEXT    NOT NULL,
+                creator_id      INTEGER NOT NULL REFERENCES players(id),
+                max_players     INTEGER NOT NULL DEFAULT 16,
+                entry_fee       NUMERIC(15, 2) NOT NULL DEFAULT 0,
+                status          TEXT    NOT NULL DEFAULT 'open',
+                current_round   INTEGER NOT NULL DEFAULT 0,
+                bracket         INTEGER[],
+                winner_id       INTEGER REFERENCES players(id),
+                created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                finished_at     TIMESTAMP
+            )
+        """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_tournaments_status ON tournaments(status)")
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tournament_entrants (
+                tournament_id    INTEGER NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+                player_id        INTEGER NOT NULL REFERENCES players(id) ON DELETE CASCADE,
+                stance           TEXT    NOT NULL DEFAULT 'balanced',
+                seed             INTEGER,
+                elo              INTEGER,
+                stats            JSONB,
+                eliminated_round INTEGER,
+                joined_at        TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (tournament_id, player_id)
+            )
+        """)
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS tournament_matches (
+                id              SERIAL PRIMARY KEY,
+                tournament_id   INTEGER NOT NULL REFERENCES tournaments(id) ON DELETE CASCADE,
+                round           INTEGER NOT NULL,
+                slot            INTEGER NOT NULL,
+                p1_id           INTEGER REFERENCES players(id),
+                p2_id           INTEGER REFERENCES players(id),
+                winner_id       INTEGER REFERENCES players(id),
+                match_id        INTEGER REFERENCES pvp_log(id),
+                UNIQUE(tournament_id, round, slot)
+            )
+        """)
+
         # ── Companies ────────────────────────────────────────
         await conn.execute("""
             CREATE TABLE IF NOT EXISTS companies (
@@ -279,6 +476,45 @@ async def init_db():
             )
         """)
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_companies_owner ON companies(owner_id)")
+
+        # Mirror of COMPANY_TYPES (cogs/companies), re-synced at startup, so
+        # earnings can be computed in SQL against the database clock.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS company_types (
+                key             TEXT PRIMARY KEY,
+                name            TEXT    NOT NULL,
+                tier            TEXT    NOT NULL,
+                cost            BIGINT  NOT NULL,
+                income_per_min  INTEGER NOT NULL,
+                risk            DOUBLE PRECISION NOT NULL
+            )
+        """)
+        # Per company: pending = elapsed minutes + stockpiled minutes, each
+        # floored, at income_per_min; salvage is what /company close refunds.
+        await conn.execute("""
+            CREATE OR REPLACE VIEW company_earnings AS
+            SELECT c.id, c.owner_id, c.company_type, c.name, c.last_collect,
+                   c.stockpiled_minutes, c.total_earned, c.total_invested, c.created_at,
+                   t.income_per_min,
+                   t.income_per_min * 60 AS hourly_rate,
+                   (FLOOR(GREATEST(EXTRACT(EPOCH FROM now()::timestamp - c.last_collect), 0) / 60 * t.income_per_min)
+                    + FLOOR(c.stockpiled_minutes * t.income_per_min))::bigint AS pending_earnings,
+                   t.cost + c.total_invested AS invested_value,
+                   FLOOR((t.cost + c.total_invested) * 0.6)::bigint AS salvage_value
+            FROM companies c
+            JOIN company_types t ON t.key = c.company_type
+        """)
+        await conn.execute("""
+            CREATE OR REPLACE VIEW company_portfolios AS
+            SELECT owner_id,
+                   COUNT(*)                                     AS companies,
+                   SUM(hourly_rate)::bigint                     AS hourly_rate,
+                   SUM(pending_earnings)::bigint                AS pending_earnings,
+                   SUM(invested_value)                          AS invested_value,
+                   SUM(salvage_value + pending_earnings)::bigint AS liquidation_value
+            FROM company_earnings
+            GROUP BY owner_id
+        """)
         
         # ── Guild Settings ───────────────────────────────────
         await conn.execute("""
@@ -291,6 +527,59 @@ async def init_db():
             )
         """)
         await conn.execute("CREATE INDEX IF NOT EXISTS idx_guild_settings_guild_id ON guild_settings(guild_id)")
+        await conn.execute("ALTER TABLE guild_settings ADD COLUMN IF NOT EXISTS announce_channel_id BIGINT")
+
+        # ── Scheduled Jobs ───────────────────────────────────
+        # One row per periodic job.  next_run_at advances on a fixed grid, so
+        # restarts neither reset nor skip the period; claimed_until is the lease
+        # that keeps two instances from running the same job.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS scheduled_jobs (
+                name                TEXT PRIMARY KEY,
+                interval_seconds    INTEGER NOT NULL,
+                coalesce_runs       BOOLEAN NOT NULL DEFAULT TRUE,
+                next_run_at         TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                last_run_at         TIMESTAMP,
+                last_duration       DOUBLE PRECISION,
+                last_error          TEXT,
+                run_count           BIGINT NOT NULL DEFAULT 0,
+                claimed_until       TIMESTAMP
+            )
+        """)
+
+        # ── World Modifiers ──────────────────────────────────
+        # Timed event effects (price surges, blackouts...).  Rows are never
+        # updated; a modifier simply stops applying once expires_at passes.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS world_modifiers (
+                id          SERIAL PRIMARY KEY,
+                subsystem   TEXT NOT NULL,
+                source      TEXT,
+                effects     JSONB NOT NULL,
+                starts_at   TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                expires_at  TIMESTAMP NOT NULL
+            )
+        """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_world_modifiers_expires ON world_modifiers(expires_at)")
+
+        # ── Outbox ───────────────────────────────────────────
+        # Announcements waiting for Discord.  Game logic only inserts; the
+        # sender worker leases due rows, deletes them once delivered and
+        # pushes next_attempt_at back on failure.  Rows that can't be
+        # delivered stay until the daily outbox_purge job drops them.
+        await conn.execute("""
+            CREATE TABLE IF NOT EXISTS outbox (
+                id              BIGSERIAL PRIMARY KEY,
+                channel_id      BIGINT NOT NULL,
+                payload         JSONB NOT NULL,
+                created_at      TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                attempts        INTEGER NOT NULL DEFAULT 0,
+                next_attempt_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+                claimed_until   TIMESTAMP,
+                last_error      TEXT
+            )
+        """)
+        await conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(next_attempt_at, id)")
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -466,6 +755,107 @@ async def resolve_war(war_id: int, winner_faction_id: int):
         )
 
 
+async def load_war_tick():
+    """
+    Everything a war tick needs, in three queries however many wars run:
+    (wars, {faction_id: record(name, aggression, members, stats)},
+     [record(key, name, owner_faction, defense)] held by a warring faction).
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        wars = await conn.fetch(
+            "SELECT id, faction_a, faction_b FROM faction_wars WHERE ended_at IS NULL ORDER BY id"
+        )
+        if not wars:
+            return [], {}, []
+        ids = list({w['faction_a'] for w in wars} | {w['faction_b'] for w in wars})
+        factions = await conn.fetch(
+            """SELECT f.id, f.name, f.aggression,
+                      COUNT(p.id) AS members,
+                      COALESCE(SUM(p.atk + p.def + p.spd), 0) AS stats
+               FROM factions f LEFT JOIN players p ON p.faction_id = f.id
+               WHERE f.id = ANY($1::int[])
+               GROUP BY f.id""",
+            ids
+        )
+        territories = await conn.fetch(
+            "SELECT key, name, owner_faction, defense FROM territories WHERE owner_faction = ANY($1::int[])",
+            ids
+        )
+    return wars, {f['id']: f for f in factions}, territories
+
+
+async def apply_war_tick(transfers, endings, credits: float = 0):
+    """
+    Commit one tick atomically.  transfers: [(key, from, to)] — skipped if
+    the district changed hands meanwhile.  endings: [(war_id, winner, loser)]
+    — only closed if the loser really holds nothing now; each winner's
+    members are paid `credits`.  Returns (applied transfers, closed endings).
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            moved = await conn.fetch(
+                """UPDATE territories t
+                   SET owner_faction = u.to_faction, last_attacked = CURRENT_TIMESTAMP
+                   FROM unnest($1::text[], $2::int[], $3::int[]) AS u(key, from_faction, to_faction)
+                   WHERE t.key = u.key AND t.owner_faction = u.from_faction
+                   RETURNING t.key""",
+                [t[0] for t in transfers], [t[1] for t in transfers], [t[2] for t in transfers]
+            )
+            closed = await conn.fetch(
+                """UPDATE faction_wars w
+                   SET ended_at = CURRENT_TIMESTAMP, winner = u.winner
+                   FROM unnest($1::int[], $2::int[], $3::int[]) AS u(war_id, winner, loser)
+                   WHERE w.id = u.war_id AND w.ended_at IS NULL
+                     AND NOT EXISTS (SELECT 1 FROM territories WHERE owner_faction = u.loser)
+                   RETURNING w.id""",
+                [e[0] for e in endings], [e[1] for e in endings], [e[2] for e in endings]
+            )
+            closed_ids = {r['id'] for r in closed}
+            if credits and closed_ids:
+                await conn.execute(
+                    """UPDATE players p SET credits = p.credits + $1 * w.wins
+                       FROM (SELECT winner, COUNT(*) AS wins FROM unnest($2::int[]) AS winner GROUP BY winner) w
+                       WHERE p.faction_id = w.winner""",
+                    credits, [e[1] for e in endings if e[0] in closed_ids]
+                )
+    moved_keys = {r['key'] for r in moved}
+    applied = [t for t in transfers if t[0] in moved_keys]
+    for key, _, to_faction in applied:
+        note_territory_capture(key, to_faction)
+    return applied, [e for e in endings if e[0] in closed_ids]
+
+
+async def distribute_territory_income():
+    """
+    Pay one day of territory income in a single statement: each faction's
+    districts' income, split equally between its members.  Either everyone
+    is paid or no one is.  Returns one record per paid faction
+    (name, territories, total, members), highest income first.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """WITH income AS (
+                   SELECT owner_faction AS faction_id, SUM(income) AS total,
+                          string_agg(name, ', ' ORDER BY name) AS territories
+                   FROM territories WHERE owner_faction IS NOT NULL
+                   GROUP BY owner_faction
+               ), shares AS (
+                   SELECT i.faction_id, f.name, i.territories, i.total, COUNT(p.id) AS members
+                   FROM income i
+                   JOIN factions f ON f.id = i.faction_id
+                   JOIN players p ON p.faction_id = i.faction_id
+                   GROUP BY i.faction_id, f.name, i.territories, i.total
+               ), paid AS (
+                   UPDATE players p SET credits = p.credits + s.total / s.members
+                   FROM shares s WHERE p.faction_id = s.faction_id
+               )
+               SELECT name, territories, total, members FROM shares ORDER BY total DESC"""
+        )
+
+
 async def claim_territory(territory_key: str, faction_id: int):
     """Claim/capture a territory for a faction (simplified version)"""
     await capture_territory(territory_key, faction_id, new_defense=50)
@@ -475,6 +865,115 @@ async def claim_territory(territory_key: str, faction_id: int):
 # TERRITORY HELPERS - ENHANCED
 # ═══════════════════════════════════════════════════════════════════════════
 
+# Bumped on every write that changes what the map shows (owner / defense).
+# Map render caches key on it, so it only has to be monotonic per process.
+# Writes by other replicas arrive through sync_territory_state.
+_territory_version = 0
+
+# Last sync_versions values seen.  Polled at most TERRITORY_SYNC_SECONDS
+# apart, so another replica's capture or siege shows up here within that.
+TERRITORY_SYNC_SECONDS = 5
+
+_territory_synced_at = 0.0
+_territory_db_version = None
+_siege_db_version = None
+_territory_sync_task = None
+
+
+async def sync_territory_state(force: bool = False):
+    """
+    Read the cross-replica change counters (when stale, or always with
+    force).  A territories change drops the adjacency graph and bumps the
+    map version; siege_version() reports the sieges counter.
+    """
+    global _territory_synced_at, _territory_db_version, _siege_db_version, _territory_graph
+    if not force and time.time() - _territory_synced_at < TERRITORY_SYNC_SECONDS:
+        return
+    _territory_synced_at = time.time()
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch("SELECT name, version FROM sync_versions")
+    versions = {r['name']: r['version'] for r in rows}
+    if versions.get('territories') != _territory_db_version:
+        _territory_db_version = versions.get('territories')
+        _territory_graph = None
+        bump_territory_version()
+    _siege_db_version = versions.get('sieges')
+
+
+async def _background_territory_sync():
+    try:
+        await sync_territory_state()
+    except Exception as e:
+        print(f"[TERRITORY] Sync failed: {e}")
+
+
+def territory_version() -> int:
+    """The map version; schedules a background sync when it is stale."""
+    global _territory_sync_task
+    if time.time() - _territory_synced_at >= TERRITORY_SYNC_SECONDS and \
+            (_territory_sync_task is None or _territory_sync_task.done()):
+        try:
+            _territory_sync_task = asyncio.ensure_future(_background_territory_sync())
+        except RuntimeError:
+            pass   # No running loop; the next call retries
+    return _territory_version
+
+
+async def siege_version():
+    """The sieges change counter, synced when stale; a new value means reload open sieges."""
+    await sync_territory_state()
+    return _siege_db_version
+
+
+async def _own_siege_version(conn):
+    """
+    Read the sieges counter inside the transaction that just opened or
+    closed a siege.  If it moved by exactly one the change was ours, so
+    the cached counter follows it instead of forcing a reload here.
+    """
+    global _siege_db_version
+    version = await conn.fetchval("SELECT version FROM sync_versions WHERE name = 'sieges'")
+    if _siege_db_version is not None and version == _siege_db_version + 1:
+        _siege_db_version = version
+    return version
+
+
+def bump_territory_version():
+    global _territory_version
+    _territory_version += 1
+
+
+# Adjacency graph with per-faction frontiers, loaded on first use.  Every
+# owner change made by this process must go through note_territory_capture
+# (capture_territory does it) so the frontiers stay current without a query;
+# changes from other replicas make sync_territory_state drop it for a reload.
+_territory_graph: Optional[TerritoryGraph] = None
+
+
+async def get_territory_graph() -> TerritoryGraph:
+    global _territory_graph
+    await sync_territory_state()
+    if _territory_graph is None:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            territories = await conn.fetch("SELECT key, owner_faction FROM territories")
+            links = await conn.fetch("SELECT territory_a, territory_b FROM territory_links")
+        _territory_graph = TerritoryGraph(
+            [t['key'] for t in territories],
+            [(l['territory_a'], l['territory_b']) for l in links],
+            {t['key']: t['owner_faction'] for t in territories}
+        )
+    return _territory_graph
+
+
+def note_territory_capture(territory_key: str, faction_id):
+    """Record an owner change already written to the DB: frontiers and map version."""
+    if _territory_graph is not None:
+        _territory_graph.set_owner(territory_key.lower(), faction_id)
+    bump_territory_version()
+
+
 async def get_all_territories():
     pool = await get_pool()
     async with pool.acquire() as conn:
@@ -494,6 +993,25 @@ async def get_faction_territories(faction_id: int):
         return await conn.fetch("SELECT * FROM territories WHERE owner_faction = $1", faction_id)
 
 
+async def get_map_territories():
+    """Territories with their owner's faction key/name in one query (map rendering)."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """SELECT t.*, f.key AS faction_key, f.name AS faction_name
+               FROM territories t
+               LEFT JOIN factions f ON f.id = t.owner_faction
+               ORDER BY t.id"""
+        )
+
+
+async def get_territory_layout():
+    """Just what the map layout and district picker need, in id order."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("SELECT key, name, grid_x, grid_y FROM territories ORDER BY id")
+
+
 async def capture_territory(territory_key: str, faction_id: int, new_defense: int = 30):
     """Capture a territory and set new defense value"""
     pool = await get_pool()
@@ -504,6 +1022,7 @@ async def capture_territory(territory_key: str, faction_id: int, new_defense: in
                WHERE key = $3""",
             faction_id, new_defense, territory_key.lower()
         )
+    note_territory_capture(territory_key, faction_id)
 
 
 async def fortify_territory(territory_key: str, defense_increase: int):
@@ -514,6 +1033,7 @@ async def fortify_territory(territory_key: str, defense_increase: int):
             "UPDATE territories SET defense = LEAST(100, defense + $1) WHERE key = $2",
             defense_increase, territory_key.lower()
         )
+    bump_territory_version()
 
 
 async def weaken_territory(territory_key: str, defense_decrease: int):
@@ -524,6 +1044,7 @@ async def weaken_territory(territory_key: str, defense_decrease: int):
             "UPDATE territories SET defense = GREATEST(0, defense - $1) WHERE key = $2",
             defense_decrease, territory_key.lower()
         )
+    bump_territory_version()
 
 
 async def update_territory_garrison(territory_key: str, garrison_size: int):
@@ -548,8 +1069,8 @@ async def log_combat(player_id: int, action_type: str, territory_key: str, resul
     async with pool.acquire() as conn:
         await conn.execute(
             """INSERT INTO combat_log 
-               (player_id, action_type, territory_key, result, credits_spent, credits_gained, xp_gained, hp_lost)
-               VALUES ($1, $2, $3, $4, $5, $6, $7, $8)""",
+               (player_id, action_type, territory_key, result, credits_spent, credits_gained, xp_gained, hp_lost, faction_id)
+               VALUES ($1, $2, $3, $4, $5, $6, $7, $8, (SELECT faction_id FROM players WHERE id = $1))""",
             player_id, action_type, territory_key, result, credits_spent, credits_gained, xp_gained, hp_lost
         )
 
@@ -574,35 +1095,148 @@ async def get_territory_combat_history(territory_key: str, limit: int = 10):
         )
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# TERRITORY HISTORY
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def get_territory_owners_at(at):
+    """
+    {territory key: record(owner_faction, defense)} as of `at`: the last
+    ownership event up to then, else the previous owner named by the first
+    event after it, else today's owner.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """SELECT t.key,
+                      CASE WHEN b.found THEN b.to_faction
+                           WHEN a.found THEN a.from_faction
+                           ELSE t.owner_faction END AS owner_faction,
+                      COALESCE(b.defense, t.defense) AS defense
+               FROM territories t
+               LEFT JOIN LATERAL (
+                   SELECT TRUE AS found, e.to_faction, e.defense FROM territory_ownership_events e
+                   WHERE e.territory_key = t.key AND e.at <= $1
+                   ORDER BY e.at DESC LIMIT 1
+               ) b ON TRUE
+               LEFT JOIN LATERAL (
+                   SELECT TRUE AS found, e.from_faction FROM territory_ownership_events e
+                   WHERE e.territory_key = t.key AND e.at > $1 AND e.from_known
+                   ORDER BY e.at LIMIT 1
+               ) a ON TRUE""",
+            at
+        )
+    return {r['key']: r for r in rows}
+
+
+async def iter_territory_history(start, end, territory_keys, prefetch: int = 500):
+    """
+    Ownership events for `territory_keys` in (start, end], oldest first,
+    read through a server-side cursor so long ranges never sit in memory.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            async for row in conn.cursor(
+                """SELECT at, territory_key, to_faction, defense FROM territory_ownership_events
+                   WHERE at > $1 AND at <= $2 AND territory_key = ANY($3::text[])
+                   ORDER BY at""",
+                start, end, list(territory_keys), prefetch=prefetch
+            ):
+                yield row
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # SIEGE HELPERS - NEW
 # ═══════════════════════════════════════════════════════════════════════════
 
-async def start_siege(territory_key: str, attacker_faction: int, defender_faction: int):
-    """Record the start of a siege"""
+async def start_siege(territory_key: str, attacker_faction: int, defender_faction: int,
+                      siege_hp: int = 100, territory_defense: int = None,
+                      participant: int = None, cost: float = 0):
+    """
+    Record the start of a siege.  Returns (siege row, sieges counter after
+    the insert), or (None, None) if the territory is already under siege.
+    """
     pool = await get_pool()
     async with pool.acquire() as conn:
-        return await conn.fetchrow(
-            """INSERT INTO siege_history 
-               (territory_key, attacker_faction, defender_faction, started_at)
-               VALUES ($1, $2, $3, CURRENT_TIMESTAMP)
-               RETURNING *""",
-            territory_key, attacker_faction, defender_faction
+        async with conn.transaction():
+            siege = await conn.fetchrow(
+                """INSERT INTO siege_history 
+                   (territory_key, attacker_faction, defender_faction, started_at,
+                    siege_hp, territory_defense, participants, total_cost)
+                   VALUES ($1, $2, $3, CURRENT_TIMESTAMP, $4, $5,
+                           CASE WHEN $6::text IS NULL THEN '{}'::text[] ELSE ARRAY[$6::text] END, $7)
+                   ON CONFLICT (territory_key) WHERE ended_at IS NULL DO NOTHING
+                   RETURNING *""",
+                territory_key, attacker_faction, defender_faction, siege_hp, territory_defense,
+                None if participant is None else str(participant), cost
+            )
+            if siege is None:
+                return None, None
+            return siege, await _own_siege_version(conn)
+
+
+async def record_siege_hit(siege_id: int, damage: int, participant: int, cost: float = 0):
+    """
+    Apply one siege attack.  Returns (siege_hp, participants) after the hit,
+    or None if the siege has already ended.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """UPDATE siege_history
+               SET siege_hp = siege_hp - $2,
+                   total_cost = COALESCE(total_cost, 0) + $4,
+                   participants = CASE WHEN $3 = ANY(COALESCE(participants, '{}'))
+                                       THEN participants
+                                       ELSE array_append(COALESCE(participants, '{}'), $3) END
+               WHERE id = $1 AND ended_at IS NULL
+               RETURNING siege_hp, participants""",
+            siege_id, damage, str(participant), cost
         )
+    return (row['siege_hp'], list(row['participants'])) if row else None
 
 
-async def end_siege(siege_id: int, result: str, total_cost: float):
-    """Record the end of a siege"""
+async def end_siege(siege_id: int, result: str, total_cost: float = None):
+    """Record the end of a siege (total_cost defaults to what was accumulated)"""
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute(
             """UPDATE siege_history 
-               SET ended_at = CURRENT_TIMESTAMP, result = $1, total_cost = $2
+               SET ended_at = CURRENT_TIMESTAMP, result = $1, total_cost = COALESCE($2, total_cost)
                WHERE id = $3""",
             result, total_cost, siege_id
         )
 
 
+async def complete_siege(siege_id: int, territory_key: str, faction_id: int, new_defense: int = 25):
+    """
+    Close a siege as captured and hand its territory over in one
+    transaction, so the territory can't change hands while the siege row
+    stays open.  Returns the sieges counter after the close, or None
+    (nothing written) if the siege had already ended.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            ended = await conn.fetchval(
+                """UPDATE siege_history SET ended_at = CURRENT_TIMESTAMP, result = 'captured'
+                   WHERE id = $1 AND ended_at IS NULL RETURNING id""",
+                siege_id
+            )
+            if ended is None:
+                return None
+            version = await _own_siege_version(conn)
+            await conn.execute(
+                """UPDATE territories 
+                   SET owner_faction = $1, defense = $2, last_attacked = CURRENT_TIMESTAMP 
+                   WHERE key = $3""",
+                faction_id, new_defense, territory_key.lower()
+            )
+    note_territory_capture(territory_key, faction_id)
+    return version
+
+
 async def get_active_sieges():
     """Get all currently active sieges"""
     pool = await get_pool()
@@ -638,21 +1272,29 @@ async def get_player_implants(player_id: int):
 async def install_implant(player_id: int, implant_key: str, slot: str):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            """INSERT INTO implants (player_id, implant_key, slot)
-               VALUES ($1, $2, $3)
-               ON CONFLICT(player_id, slot) DO UPDATE SET implant_key = $2""",
-            player_id, implant_key, slot
-        )
+        async with conn.transaction():
+            old = await conn.fetchval(
+                "SELECT implant_key FROM implants WHERE player_id = $1 AND slot = $2 FOR UPDATE",
+                player_id, slot
+            )
+            await conn.execute(
+                """INSERT INTO implants (player_id, implant_key, slot)
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT(player_id, slot) DO UPDATE SET implant_key = $2""",
+                player_id, implant_key, slot
+            )
+            await _add_asset_value(conn, player_id, implant_value(implant_key) - implant_value(old))
 
 
 async def remove_implant(player_id: int, slot: str):
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            "DELETE FROM implants WHERE player_id = $1 AND slot = $2",
-            player_id, slot
-        )
+        async with conn.transaction():
+            old = await conn.fetchval(
+                "DELETE FROM implants WHERE player_id = $1 AND slot = $2 RETURNING implant_key",
+                player_id, slot
+            )
+            await _add_asset_value(conn, player_id, -implant_value(old))
 
 
 # ═══════════════════════════════════════════════════════════════════════════
@@ -717,11 +1359,14 @@ async def add_item(player_id: int, item_name: str, qty: int = 1):
     pool = await get_pool()
     async with pool.acquire() as conn:
         await conn.execute(
-            """INSERT INTO inventory (player_id, item_name, quantity)
-               VALUES ($1, $2, $3)
-               ON CONFLICT(player_id, item_name) DO UPDATE 
-               SET quantity = inventory.quantity + $3""",
-            player_id, item_name, qty
+            """WITH added AS (
+                   INSERT INTO inventory (player_id, item_name, quantity)
+                   VALUES ($1, $2, $3)
+                   ON CONFLICT(player_id, item_name) DO UPDATE 
+                   SET quantity = inventory.quantity + $3
+               )
+               UPDATE players SET asset_value = asset_value + $4 WHERE id = $1""",
+            player_id, item_name, qty, item_value(item_name) * qty
         )
 
 
@@ -735,16 +1380,18 @@ async def remove_item(player_id: int, item_name: str, qty: int = 1) -> bool:
         )
         if not row or row['quantity'] < qty:
             return False
-        if row['quantity'] == qty:
-            await conn.execute(
-                "DELETE FROM inventory WHERE player_id = $1 AND item_name = $2",
-                player_id, item_name
-            )
-        else:
-            await conn.execute(
-                "UPDATE inventory SET quantity = quantity - $1 WHERE player_id = $2 AND item_name = $3",
-                qty, player_id, item_name
-            )
+        async with conn.transaction():
+            if row['quantity'] == qty:
+                await conn.execute(
+                    "DELETE FROM inventory WHERE player_id = $1 AND item_name = $2",
+                    player_id, item_name
+                )
+            else:
+                await conn.execute(
+                    "UPDATE inventory SET quantity = quantity - $1 WHERE player_id = $2 AND item_name = $3",
+                    qty, player_id, item_name
+                )
+            await _add_asset_value(conn, player_id, -item_value(item_name) * qty)
         return True
 
 
@@ -901,14 +1548,352 @@ async def set_story_progress(player_id: int, chapter: int, node: str, choice: st
 # ═══════════════════════════════════════════════════════════════════════════
 
 async def get_leaderboard(sort_by: str = "credits", limit: int = 10):
-    col = sort_by if sort_by in ("credits", "level", "rep") else "credits"
+    # "networth" orders by the exact expression idx_players_net_worth indexes
+    col = {"credits": "credits", "level": "level", "rep": "rep",
+           "networth": "(credits + asset_value)"}.get(sort_by, "credits")
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            f"SELECT *, credits + asset_value AS net_worth FROM players ORDER BY {col} DESC LIMIT $1", limit
+        )
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# NET WORTH
+# ═══════════════════════════════════════════════════════════════════════════
+
+def item_value(item_name: str) -> int:
+    return ITEM_CATALOG.get(item_name, {}).get("base_price", 0)
+
+
+def implant_value(implant_key) -> int:
+    return IMPLANTS.get(implant_key, {}).get("cost", 0) if implant_key else 0
+
+
+async def _add_asset_value(conn, player_id: int, delta):
+    if delta:
+        await conn.execute("UPDATE players SET asset_value = asset_value + $1 WHERE id = $2", delta, player_id)
+
+
+async def reconcile_net_worth() -> int:
+    """
+    Recompute every player's asset_value from inventory, implants and
+    companies in one statement; returns how many had drifted.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        status = await conn.execute(
+            """WITH items AS (
+                   SELECT * FROM unnest($1::text[], $2::numeric[]) AS i(name, price)
+               ), implant_costs AS (
+                   SELECT * FROM unnest($3::text[], $4::numeric[]) AS m(key, cost)
+               ), assets AS (
+                   SELECT player_id, SUM(value) AS value FROM (
+                       SELECT inv.player_id, inv.quantity * i.price AS value
+                       FROM inventory inv JOIN items i ON i.name = inv.item_name
+                       UNION ALL
+                       SELECT im.player_id, m.cost
+                       FROM implants im JOIN implant_costs m ON m.key = im.implant_key
+                       UNION ALL
+                       SELECT e.owner_id, e.invested_value
+                       FROM company_earnings e
+                   ) a
+                   GROUP BY player_id
+               ), truth AS (
+                   SELECT p.id, COALESCE(a.value, 0) AS value
+                   FROM players p LEFT JOIN assets a ON a.player_id = p.id
+               )
+               UPDATE players p SET asset_value = t.value
+               FROM truth t
+               WHERE p.id = t.id AND p.asset_value <> t.value""",
+            list(ITEM_CATALOG), [d.get("base_price", 0) for d in ITEM_CATALOG.values()],
+            list(IMPLANTS), [d.get("cost", 0) for d in IMPLANTS.values()]
+        )
+    return _rowcount(status)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# SCHEDULED JOBS
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def register_jobs(jobs: dict):
+    """
+    Upsert {name: (interval_seconds, coalesce)}.  New jobs are due now;
+    existing ones keep their schedule.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """INSERT INTO scheduled_jobs (name, interval_seconds, coalesce_runs)
+               SELECT * FROM unnest($1::text[], $2::int[], $3::bool[])
+               ON CONFLICT (name) DO UPDATE
+               SET interval_seconds = EXCLUDED.interval_seconds, coalesce_runs = EXCLUDED.coalesce_runs""",
+            list(jobs), [j[0] for j in jobs.values()], [j[1] for j in jobs.values()]
+        )
+
+
+async def claim_due_jobs(names: list, lease_seconds: int):
+    """
+    Atomically lease every due, unclaimed job in `names`.  due_runs counts
+    the periods elapsed since next_run_at (1 when on time).
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """UPDATE scheduled_jobs
+               SET claimed_until = CURRENT_TIMESTAMP + $2 * INTERVAL '1 second'
+               WHERE name = ANY($1::text[])
+                 AND next_run_at <= CURRENT_TIMESTAMP
+                 AND (claimed_until IS NULL OR claimed_until < CURRENT_TIMESTAMP)
+               RETURNING name, next_run_at, interval_seconds, coalesce_runs,
+                         FLOOR(EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - next_run_at)) / interval_seconds)::int + 1 AS due_runs""",
+            names, lease_seconds
+        )
+
+
+async def finish_job(name: str, runs: int, duration: float, error: str = None, retry_seconds: int = 60):
+    """
+    Release a claimed job.  On success next_run_at moves to the first grid
+    point after now; on failure it advances only past the `runs` that
+    completed and the job is retried after retry_seconds.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute(
+            """UPDATE scheduled_jobs
+               SET next_run_at = CASE WHEN $4::text IS NULL
+                       THEN next_run_at + interval_seconds * INTERVAL '1 second'
+                            * (FLOOR(EXTRACT(EPOCH FROM (CURRENT_TIMESTAMP - next_run_at)) / interval_seconds) + 1)
+                       ELSE next_run_at + $2 * interval_seconds * INTERVAL '1 second' END,
+                   claimed_until = CASE WHEN $4::text IS NULL THEN NULL
+                                        ELSE CURRENT_TIMESTAMP + $5 * INTERVAL '1 second' END,
+                   last_run_at = CURRENT_TIMESTAMP,
+                   last_duration = $3,
+                   last_error = $4,
+                   run_count = run_count + $2
+               WHERE name = $1""",
+            name, runs, duration, error, retry_seconds
+        )
+
+
+async def release_job(name: str):
+    """Give up a claim without running the job."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        await conn.execute("UPDATE scheduled_jobs SET claimed_until = NULL WHERE name = $1", name)
+
+
+async def get_scheduled_jobs():
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch("SELECT * FROM scheduled_jobs ORDER BY name")
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# OUTBOX
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def enqueue_messages(channel_ids: list, payload: dict) -> int:
+    """Queue the same message (channel.send kwargs, embeds as dicts) for every channel."""
+    if not channel_ids:
+        return 0
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        status = await conn.execute(
+            "INSERT INTO outbox (channel_id, payload) SELECT unnest($1::bigint[]), $2::jsonb",
+            channel_ids, json.dumps(payload)
+        )
+    return _rowcount(status)
+
+
+async def claim_outbox(limit: int, lease_seconds: int, max_attempts: int):
+    """Lease up to `limit` due messages, oldest first, counting the attempt."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """UPDATE outbox o
+               SET claimed_until = CURRENT_TIMESTAMP + $2 * INTERVAL '1 second', attempts = o.attempts + 1
+               FROM (SELECT id FROM outbox
+                     WHERE next_attempt_at <= CURRENT_TIMESTAMP AND attempts < $3
+                       AND (claimed_until IS NULL OR claimed_until < CURRENT_TIMESTAMP)
+                     ORDER BY id
+                     LIMIT $1
+                     FOR UPDATE SKIP LOCKED) due
+               WHERE o.id = due.id
+               RETURNING o.id, o.channel_id, o.payload, o.attempts""",
+            limit, lease_seconds, max_attempts
+        )
+
+
+async def finish_outbox(sent_ids: list, failures: list):
+    """
+    Delete delivered messages; failures are [(id, error, retry_seconds)],
+    with retry_seconds None for messages that can never be delivered.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            if sent_ids:
+                await conn.execute("DELETE FROM outbox WHERE id = ANY($1::bigint[])", sent_ids)
+            if failures:
+                await conn.execute(
+                    """UPDATE outbox o
+                       SET claimed_until = NULL, last_error = f.error,
+                           next_attempt_at = CASE WHEN f.retry IS NULL THEN 'infinity'::timestamp
+                                                  ELSE CURRENT_TIMESTAMP + f.retry * INTERVAL '1 second' END
+                       FROM unnest($1::bigint[], $2::text[], $3::int[]) AS f(id, error, retry)
+                       WHERE o.id = f.id""",
+                    [f[0] for f in failures], [f[1] for f in failures], [f[2] for f in failures]
+                )
+
+
+async def purge_outbox(max_attempts: int):
+    """
+    Delete messages that will never be sent: parked after a permanent
+    failure, or out of attempts.  Returns (channel_id, last_error, messages)
+    rows for what was dropped.
+    """
     pool = await get_pool()
     async with pool.acquire() as conn:
         return await conn.fetch(
-            f"SELECT * FROM players ORDER BY {col} DESC LIMIT $1", limit
+            """WITH gone AS (
+                   DELETE FROM outbox
+                   WHERE (next_attempt_at = 'infinity'::timestamp OR attempts >= $1)
+                     AND (claimed_until IS NULL OR claimed_until < CURRENT_TIMESTAMP)
+                   RETURNING channel_id, last_error
+               )
+               SELECT channel_id, last_error, COUNT(*) AS messages
+               FROM gone GROUP BY channel_id, last_error ORDER BY messages DESC""",
+            max_attempts
         )
 
 
+# ═══════════════════════════════════════════════════════════════════════════
+# GUILD SETTINGS
+# ═══════════════════════════════════════════════════════════════════════════
+
+# guild_id -> {company_limit, announce_channel_id} for every configured guild.
+# Commands and every broadcast read it, so it is loaded lazily in one query
+# and kept in memory.  Writes from this process replace their guild's entry
+# in place; a reload every GUILD_SETTINGS_CACHE_SECONDS picks up changes made
+# by other replicas.
+GUILD_SETTINGS_CACHE_SECONDS = 300
+
+_guild_settings: Optional[dict] = None
+_guild_settings_loaded_at = 0.0
+
+
+async def _guild_settings_cache() -> dict:
+    global _guild_settings, _guild_settings_loaded_at
+    if _guild_settings is None or time.time() - _guild_settings_loaded_at >= GUILD_SETTINGS_CACHE_SECONDS:
+        pool = await get_pool()
+        async with pool.acquire() as conn:
+            rows = await conn.fetch("SELECT guild_id, company_limit, announce_channel_id FROM guild_settings")
+        _guild_settings = {r['guild_id']: dict(r) for r in rows}
+        _guild_settings_loaded_at = time.time()
+    return _guild_settings
+
+
+def _cache_guild_settings(row):
+    if _guild_settings is not None:
+        _guild_settings[row['guild_id']] = dict(row)
+
+
+async def get_guild_settings(guild_id: int) -> Optional[dict]:
+    """This guild's settings row, or None if it never configured anything."""
+    return (await _guild_settings_cache()).get(guild_id)
+
+
+async def get_announce_channels() -> dict:
+    """guild_id -> announcement channel id, for guilds that set one."""
+    return {g: s['announce_channel_id'] for g, s in (await _guild_settings_cache()).items()
+            if s['announce_channel_id']}
+
+
+async def update_company_limit(guild_id: int, limit: int):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """INSERT INTO guild_settings (guild_id, company_limit) VALUES ($1, $2)
+               ON CONFLICT (guild_id) DO UPDATE
+               SET company_limit = $2, updated_at = CURRENT_TIMESTAMP
+               RETURNING guild_id, company_limit, announce_channel_id""",
+            guild_id, limit
+        )
+    _cache_guild_settings(row)
+
+
+async def set_announce_channel(guild_id: int, channel_id: Optional[int]):
+    """Route this guild's announcements to channel_id (None = pick automatically)."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        row = await conn.fetchrow(
+            """INSERT INTO guild_settings (guild_id, announce_channel_id) VALUES ($1, $2)
+               ON CONFLICT (guild_id) DO UPDATE
+               SET announce_channel_id = $2, updated_at = CURRENT_TIMESTAMP
+               RETURNING guild_id, company_limit, announce_channel_id""",
+            guild_id, channel_id
+        )
+    _cache_guild_settings(row)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# WORLD MODIFIERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+# Live index of the world_modifiers table.  Modifiers written by this process
+# (apply_event) land in it immediately; other replicas' are picked up by a
+# background sync at most MODIFIER_SYNC_SECONDS apart, so reading a modifier
+# never waits on a query.
+MODIFIER_SYNC_SECONDS = 30
+
+_world_modifiers = ActiveModifiers()
+_modifiers_synced_at = 0.0
+_modifiers_sync_task = None
+
+
+async def sync_world_modifiers():
+    """
+    Pull every live modifier (from any replica) not already loaded.  Ids
+    from different replicas can commit out of order, so this goes by
+    expires_at rather than "ids above the last one seen".
+    """
+    global _modifiers_synced_at
+    _modifiers_synced_at = time.time()
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """SELECT id, subsystem, source, effects,
+                      EXTRACT(EPOCH FROM expires_at - CURRENT_TIMESTAMP)::float8 AS remaining
+               FROM world_modifiers
+               WHERE expires_at > CURRENT_TIMESTAMP AND id <> ALL($1::int[])
+               ORDER BY id""",
+            _world_modifiers.ids()
+        )
+    now = time.time()
+    for r in rows:
+        _world_modifiers.add(r['id'], r['subsystem'], json.loads(r['effects']), now + r['remaining'], r['source'])
+
+
+async def _background_modifier_sync():
+    try:
+        await sync_world_modifiers()
+    except Exception as e:
+        print(f"[MODIFIERS] Sync failed: {e}")
+
+
+def world_modifiers() -> ActiveModifiers:
+    """The live modifier index; schedules a background sync when it is stale."""
+    global _modifiers_sync_task
+    if time.time() - _modifiers_synced_at >= MODIFIER_SYNC_SECONDS and \
+            (_modifiers_sync_task is None or _modifiers_sync_task.done()):
+        try:
+            _modifiers_sync_task = asyncio.ensure_future(_background_modifier_sync())
+        except RuntimeError:
+            pass   # No running loop (import-time use); the next call retries
+    return _world_modifiers
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # EVENT LOG
 # ═══════════════════════════════════════════════════════════════════════════
@@ -919,14 +1904,433 @@ async def log_event(event_key: str):
         await conn.execute("INSERT INTO event_log (event_key) VALUES ($1)", event_key)
 
 
+def _rowcount(status: str) -> int:
+    """Rows touched, from a command tag such as 'UPDATE 42'."""
+    return int(status.split()[-1])
+
+
+async def apply_event(event: dict, modifier: dict = None, dry_run: bool = False) -> dict:
+    """
+    Apply a RANDOM_EVENTS entry in one transaction: one UPDATE for the
+    credit/rep change, one for the HP change, the timed modifier (already
+    resolved — see modifiers.resolve_modifier) and the event_log row with the
+    affected counts and apply duration.  A dry run executes the same
+    statements and rolls back, so its counts are exact.
+
+    Returns {"players", "hurt", "modifier_id", "duration", "dry_run"}.
+    """
+    started = time.perf_counter()
+    result = {"players": 0, "hurt": 0, "modifier_id": None, "duration": 0.0, "dry_run": dry_run}
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        tr = conn.transaction()
+        await tr.start()
+        try:
+            credit_mod, rep_mod = event.get("credit_mod", 0), event.get("rep_mod", 0)
+            if credit_mod or rep_mod:
+                result["players"] = _rowcount(await conn.execute(
+                    "UPDATE players SET credits = GREATEST(0, credits + $1), rep = rep + $2",
+                    credit_mod, rep_mod
+                ))
+            if event.get("hp_mod"):
+                result["hurt"] = _rowcount(await conn.execute(
+                    """UPDATE players p SET hp = LEAST(p.max_hp, GREATEST(0, p.hp + $1))
+                       WHERE NOT EXISTS (
+                           SELECT 1 FROM inventory i
+                           WHERE i.player_id = p.id AND i.item_name = $2 AND i.quantity > 0
+                       )""",
+                    event["hp_mod"], event.get("hp_immune")
+                ))
+            if modifier:
+                result["modifier_id"] = await conn.fetchval(
+                    """INSERT INTO world_modifiers (subsystem, source, effects, expires_at)
+                       VALUES ($1, $2, $3::jsonb, CURRENT_TIMESTAMP + make_interval(mins => $4))
+                       RETURNING id""",
+                    modifier["subsystem"], event["key"], json.dumps(modifier["effects"]), modifier["minutes"]
+                )
+            result["duration"] = time.perf_counter() - started
+            if not dry_run:
+                await conn.execute(
+                    "INSERT INTO event_log (event_key, affected, duration) VALUES ($1, $2::jsonb, $3)",
+                    event["key"], json.dumps({"players": result["players"], "hurt": result["hurt"]}),
+                    result["duration"]
+                )
+        except Exception:
+            await tr.rollback()
+            raise
+        if dry_run:
+            await tr.rollback()
+        else:
+            await tr.commit()
+    if modifier and not dry_run:
+        _world_modifiers.add(result["modifier_id"], modifier["subsystem"], modifier["effects"],
+                             time.time() + modifier["minutes"] * 60, event["key"])
+    return result
+
+
 # ═══════════════════════════════════════════════════════════════════════════
 # PVP LOG
 # ═══════════════════════════════════════════════════════════════════════════
 
-async def log_pvp(p1_id: int, p2_id: int, winner_id: int, rounds: int, log_text: str):
+async def log_pvp(p1_id: int, p2_id: int, winner_id: int, rounds: int,
+                  seed: int, snapshot: dict, engine_version: int):
+    """Record a duel by seed + effective stat snapshot; returns the match id."""
     pool = await get_pool()
     async with pool.acquire() as conn:
-        await conn.execute(
-            "INSERT INTO pvp_log (p1_id, p2_id, winner_id, rounds, log_text) VALUES ($1, $2, $3, $4, $5)",
-            p1_id, p2_id, winner_id, rounds, log_text
-        )
\ No newline at end of file
+        return await conn.fetchval(
+            """INSERT INTO pvp_log (p1_id, p2_id, winner_id, rounds, seed, snapshot, engine_version)
+               VALUES ($1, $2, $3, $4, $5, $6::jsonb, $7)
+               RETURNING id""",
+            p1_id, p2_id, winner_id, rounds, seed, json.dumps(snapshot), engine_version
+        )
+
+
+async def get_pvp_match(match_id: int):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchrow("SELECT * FROM pvp_log WHERE id = $1", match_id)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PVP RATINGS
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def record_pvp_result(p1_id: int, p2_id: int, winner_id, k_factor: float = ELO_K_FACTOR):
+    """
+    Apply an expected-score ELO update to both players in one statement.
+
+    Ratings are read and the delta applied relative to the row being updated,
+    so concurrent results for the same player never overwrite each other.
+    Returns {player_id: new_elo}.
+    """
+    score = match_score(p1_id, winner_id)
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        rows = await conn.fetch(
+            """WITH cur AS (
+                   SELECT COALESCE((SELECT elo FROM pvp_stats WHERE player_id = $1), $4) AS ra,
+                          COALESCE((SELECT elo FROM pvp_stats WHERE player_id = $2), $4) AS rb
+               ), d AS (
+                   SELECT ROUND($5::float8 * ($3::float8 - 1.0 / (1.0 + POWER(10.0, (rb - ra) / 400.0))))::int AS delta
+                   FROM cur
+               )
+               INSERT INTO pvp_stats (player_id, wins, losses, elo)
+               SELECT $1, ($3::float8 = 1)::int, ($3::float8 = 0)::int, $4 + delta FROM d
+               UNION ALL
+               SELECT $2, ($3::float8 = 0)::int, ($3::float8 = 1)::int, $4 - delta FROM d
+               ON CONFLICT (player_id) DO UPDATE SET
+                   wins   = pvp_stats.wins + EXCLUDED.wins,
+                   losses = pvp_stats.losses + EXCLUDED.losses,
+                   elo    = GREATEST(0, pvp_stats.elo + (EXCLUDED.elo - $4))
+               RETURNING player_id, elo""",
+            p1_id, p2_id, score, ELO_START, k_factor
+        )
+        return {r['player_id']: r['elo'] for r in rows}
+
+
+async def recompute_pvp_ratings(k_factor: float = ELO_K_FACTOR) -> dict:
+    """
+    Rebuild pvp_stats from pvp_log in chronological order.
+
+    One read of the log, ratings replayed in memory, one bulk upsert — all in
+    a single transaction.  Returns {"matches": n, "players": n}.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            matches = await conn.fetch(
+                "SELECT p1_id, p2_id, winner_id FROM pvp_log ORDER BY fought_at, id"
+            )
+            table = recompute_ratings(
+                ((m['p1_id'], m['p2_id'], m['winner_id']) for m in matches),
+                k_factor
+            )
+            ids = list(table.keys())
+            await conn.execute(
+                """INSERT INTO pvp_stats (player_id, wins, losses, elo)
+                   SELECT * FROM unnest($1::int[], $2::int[], $3::int[], $4::int[])
+                   ON CONFLICT (player_id) DO UPDATE SET
+                       wins = EXCLUDED.wins, losses = EXCLUDED.losses, elo = EXCLUDED.elo""",
+                ids,
+                [table[i][0] for i in ids],
+                [table[i][1] for i in ids],
+                [table[i][2] for i in ids]
+            )
+            # Players with stats but no logged matches go back to the start rating
+            await conn.execute(
+                "UPDATE pvp_stats SET wins = 0, losses = 0, elo = $1 WHERE NOT (player_id = ANY($2::int[]))",
+                ELO_START, ids
+            )
+    return {"matches": len(matches), "players": len(ids)}
+
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# PVP MATCHMAKING
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def get_pvp_elo(player_id: int) -> int:
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        elo = await conn.fetchval("SELECT elo FROM pvp_stats WHERE player_id = $1", player_id)
+        return ELO_START if elo is None else elo
+
+
+async def get_combat_loadouts(player_ids: list) -> dict:
+    """
+    Load player rows, implants, skills and equipped items for a batch of
+    players on one connection — four queries regardless of batch size.
+
+    Returns {player_id: {"player", "implants", "skills", "equipped"}}.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        players  = await conn.fetch("SELECT * FROM players WHERE id = ANY($1::int[])", player_ids)
+        implants = await conn.fetch("SELECT * FROM implants WHERE player_id = ANY($1::int[])", player_ids)
+        skills   = await conn.fetch("SELECT * FROM skills WHERE player_id = ANY($1::int[])", player_ids)
+        equipped = await conn.fetch("SELECT * FROM equipped_items WHERE player_id = ANY($1::int[])", player_ids)
+    loadouts = {p['id']: {"player": p, "implants": [], "skills": [], "equipped": []} for p in players}
+    for field, rows in (("implants", implants), ("skills", skills), ("equipped", equipped)):
+        for r in rows:
+            if r['player_id'] in loadouts:
+                loadouts[r['player_id']][field].append(r)
+    return loadouts
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# TOURNAMENT HELPERS
+# ═══════════════════════════════════════════════════════════════════════════
+
+async def create_tournament(guild_id: int, channel_id: int, name: str, creator_id: int,
+                            max_players: int, entry_fee: float):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchrow(
+            """INSERT INTO tournaments (guild_id, channel_id, name, creator_id, max_players, entry_fee)
+               VALUES ($1, $2, $3, $4, $5, $6) RETURNING *""",
+            guild_id, channel_id, name, creator_id, max_players, entry_fee
+        )
+
+
+async def get_tournament(tournament_id: int):
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetchrow("SELECT * FROM tournaments WHERE id = $1", tournament_id)
+
+
+async def get_active_tournaments(guild_id: int = None):
+    """Open and running tournaments (all guilds when guild_id is None)."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """SELECT t.*, (SELECT COUNT(*) FROM tournament_entrants e WHERE e.tournament_id = t.id) AS entrants
+               FROM tournaments t
+               WHERE t.status IN ('open', 'running') AND ($1::bigint IS NULL OR t.guild_id = $1)
+               ORDER BY t.id""",
+            guild_id
+        )
+
+
+async def join_tournament(tournament_id: int, player_id: int, stance: str) -> str:
+    """
+    Register a player and charge the entry fee.  Returns 'ok', 'closed',
+    'full', 'duplicate' or 'broke'.  The tournament row is locked so the
+    capacity and duplicate checks can't race; the fee is only taken
+    together with the entrant row.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            t = await conn.fetchrow(
+                "SELECT status, max_players, entry_fee FROM tournaments WHERE id = $1 FOR UPDATE", tournament_id
+            )
+            if not t or t['status'] != 'open':
+                return 'closed'
+            entrants = await conn.fetchrow(
+                """SELECT COUNT(*) AS count, bool_or(player_id = $2) AS entered
+                   FROM tournament_entrants WHERE tournament_id = $1""",
+                tournament_id, player_id
+            )
+            if entrants['entered']:
+                return 'duplicate'
+            if entrants['count'] >= t['max_players']:
+                return 'full'
+            inserted = await conn.fetchval(
+                """WITH paid AS (
+                       UPDATE players SET credits = credits - $4
+                       WHERE id = $2 AND credits >= $4
+                       RETURNING id
+                   )
+                   INSERT INTO tournament_entrants (tournament_id, player_id, stance)
+                   SELECT $1, id, $3 FROM paid
+                   RETURNING player_id""",
+                tournament_id, player_id, stance, t['entry_fee']
+            )
+            return 'ok' if inserted else 'broke'
+
+
+async def get_tournament_entrants(tournament_id: int):
+    """Entrants with name, discord_id and current ELO, best rating first."""
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        return await conn.fetch(
+            """SELECT e.*, p.name, p.discord_id, COALESCE(ps.elo, $2) AS current_elo
+               FROM tournament_entrants e
+               JOIN players p ON p.id = e.player_id
+               LEFT JOIN pvp_stats ps ON ps.player_id = e.player_id
+               WHERE e.tournament_id = $1
+               ORDER BY current_elo DESC, e.joined_at""",
+            tournament_id, ELO_START
+        )
+
+
+async def start_tournament(tournament_id: int, seeds: list, bracket: list) -> str:
+    """
+    Lock in seeding and move an open tournament to round 1.
+    seeds: [(player_id, seed, elo, stats_dict)].  Entrants missing from seeds
+    are removed and refunded, so the pot counts only the seeded field.
+    Returns 'ok', 'closed' if it was no longer open, or 'short' (nothing
+    changed, still open) when fewer than 2 entrants could be seeded — a
+    bracket of one would never record a champion.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            status = await conn.fetchval(
+                "SELECT status FROM tournaments WHERE id = $1 FOR UPDATE", tournament_id
+            )
+            if status != 'open':
+                return 'closed'
+            if len(seeds) < 2:
+                return 'short'
+            await conn.execute(
+                "UPDATE tournaments SET status = 'running', current_round = 1, bracket = $2 WHERE id = $1",
+                tournament_id, bracket
+            )
+            await conn.execute(
+                """UPDATE tournament_entrants e SET seed = u.seed, elo = u.elo, stats = u.stats::jsonb
+                   FROM unnest($2::int[], $3::int[], $4::int[], $5::text[]) AS u(player_id, seed, elo, stats)
+                   WHERE e.tournament_id = $1 AND e.player_id = u.player_id""",
+                tournament_id,
+                [s[0] for s in seeds], [s[1] for s in seeds], [s[2] for s in seeds],
+                [json.dumps(s[3]) for s in seeds]
+            )
+            await conn.execute(
+                """WITH dropped AS (
+                       DELETE FROM tournament_entrants
+                       WHERE tournament_id = $1 AND player_id <> ALL($2::int[])
+                       RETURNING player_id
+                   )
+                   UPDATE players p SET credits = p.credits + t.entry_fee
+                   FROM dropped d, tournaments t
+                   WHERE p.id = d.player_id AND t.id = $1 AND t.entry_fee > 0""",
+                tournament_id, [s[0] for s in seeds]
+            )
+            return 'ok'
+
+
+async def record_tournament_round(tournament_id: int, round_no: int, fights: list, byes: list,
+                                  next_bracket: list, engine_version: int, champion_id: int = None,
+                                  k_factor: float = ELO_K_FACTOR) -> dict:
+    """
+    Persist a whole bracket round in one transaction.
+
+    fights: [(slot, p1_id, p2_id, winner_id, advance_id, rounds, seed, snapshot)]
+    byes:   [(slot, player_id)]
+
+    Every fight becomes a replayable pvp_log row and a rated result.  Nobody
+    fights twice in a round, so all ELO deltas are computed against the
+    ratings at the start of the round and written with one bulk upsert —
+    the same numbers a sequential replay (recompute_pvp_ratings) produces.
+    The final round (champion_id set) also pays the champion the pot, so a
+    tournament is never completed without paying out.
+    Returns {player_id: new_elo}.
+    """
+    pool = await get_pool()
+    async with pool.acquire() as conn:
+        async with conn.transaction():
+            new_elo = {}
+            match_ids = []
+            if fights:
+                # Pre-allocate ids so pvp_log order follows bracket order
+                match_ids = [r['id'] for r in await conn.fetch(
+                    "SELECT nextval(pg_get_serial_sequence('pvp_log', 'id')) AS id FROM generate_series(1, $1)",
+                    len(fights)
+                )]
+                await conn.execute(
+                    """INSERT INTO pvp_log (id, p1_id, p2_id, winner_id, rounds, seed, engine_version, snapshot)
+                       SELECT u.id, u.p1, u.p2, u.w, u.r, u.seed, $7, u.snap::jsonb
+                       FROM unnest($1::int[], $2::int[], $3::int[], $4::int[], $5::int[], $6::bigint[], $8::text[])
+                            AS u(id, p1, p2, w, r, seed, snap)""",
+                    match_ids,
+                    [f[1] for f in fights], [f[2] for f in fights], [f[3] for f in fights],
+                    [f[5] for f in fights], [f[6] for f in fights],
+                    engine_version, [json.dumps(f[7]) for f in fights]
+                )
+
+                ids = [pid for f in fights for pid in (f[1], f[2])]
+                rows = await conn.fetch(
+                    "SELECT player_id, wins, losses, elo FROM pvp_stats WHERE player_id = ANY($1::int[]) FOR UPDATE",
+                    ids
+                )
+                table = {r['player_id']: [r['wins'], r['losses'], r['elo']] for r in rows}
+                for pid in ids:
+                    table.setdefault(pid, [0, 0, ELO_START])
+                for f in fights:
+                    a, b = table[f[1]], table[f[2]]
+                    score = match_score(f[1], f[3])
+                    delta = elo_delta(a[2], b[2], score, k_factor)
+                    new_elo[f[1]] = max(0, a[2] + delta)
+                    new_elo[f[2]] = max(0, b[2] - delta)
+                    if score == 1.0:
+                        a[0] += 1
+                        b[1] += 1
+                    elif score == 0.0:
+                        a[1] += 1
+                        b[0] += 1
+                for pid, elo in new_elo.items():
+                    table[pid][2] = elo
+                await conn.execute(
+                    """INSERT INTO pvp_stats (player_id, wins, losses, elo)
+                       SELECT * FROM unnest($1::int[], $2::int[], $3::int[], $4::int[])
+                       ON CONFLICT (player_id) DO UPDATE SET
+                           wins = EXCLUDED.wins, losses = EXCLUDED.losses, elo = EXCLUDED.elo""",
+                    ids, [table[i][0] for i in ids], [table[i][1] for i in ids], [table[i][2] for i in ids]
+                )
+
+            rows = [(f[0], f[1], f[2], f[4], mid) for f, mid in zip(fights, match_ids)]
+            rows += [(slot, pid, None, pid, None) for slot, pid in byes]
+            await conn.execute(
+                """INSERT INTO tournament_matches (tournament_id, round, slot, p1_id, p2_id, winner_id, match_id)
+                   SELECT $1, $2, * FROM unnest($3::int[], $4::int[], $5::int[], $6::int[], $7::int[])""",
+                tournament_id, round_no,
+                [r[0] for r in rows], [r[1] for r in rows], [r[2] for r in rows],
+                [r[3] for r in rows], [r[4] for r in rows]
+            )
+            losers = [f[2] if f[4] == f[1] else f[1] for f in fights]
+            await conn.execute(
+                """UPDATE tournament_entrants SET eliminated_round = $2
+                   WHERE tournament_id = $1 AND player_id = ANY($3::int[])""",
+                tournament_id, round_no, losers
+            )
+            if champion_id is None:
+                await conn.execute(
+                    "UPDATE tournaments SET current_round = $2, bracket = $3 WHERE id = $1",
+                    tournament_id, round_no + 1, next_bracket
+                )
+            else:
+                await conn.execute(
+                    """UPDATE tournaments SET status = 'completed', bracket = $2, winner_id = $3,
+                           finished_at = CURRENT_TIMESTAMP
+                       WHERE id = $1""",
+                    tournament_id, next_bracket, champion_id
+                )
+                await conn.execute(
+                    """UPDATE players SET credits = credits + t.entry_fee * (
+                           SELECT COUNT(*) FROM tournament_entrants WHERE tournament_id = $1
+                       )
+                       FROM tournaments t
+                       WHERE t.id = $1 AND players.id = $2 AND t.entry_fee > 0""",
+                    tournament_id, champion_id
+                )
+            return new_elo
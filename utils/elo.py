@@ -0,0 +1,51 @@
+# utils/elo.py
+# Expected-score ELO shared by live duels and the batch recompute job.
+# Both paths round the delta per match the same way, so a recompute over
+# pvp_log with an unchanged K reproduces the live ratings.
+
+ELO_START = 1000     # pvp_stats.elo column default
+ELO_K_FACTOR = 32
+
+
+def expected_score(rating_a: float, rating_b: float) -> float:
+    """Probability-like expected score of A against B."""
+    return 1.0 / (1.0 + 10 ** ((rating_b - rating_a) / 400.0))
+
+
+def elo_delta(rating_a: float, rating_b: float, score_a: float, k_factor: float = ELO_K_FACTOR) -> int:
+    """Rating change for A (B receives the negation).  score_a: 1 win, 0.5 draw, 0 loss."""
+    return round(k_factor * (score_a - expected_score(rating_a, rating_b)))
+
+
+def match_score(p1_id: int, winner_id) -> float:
+    """Score of p1 for a pvp_log row."""
+    if winner_id is None:
+        return 0.5
+    return 1.0 if winner_id == p1_id else 0.0
+
+
+def recompute_ratings(matches, k_factor: float = ELO_K_FACTOR, start: int = ELO_START) -> dict:
+    """
+    Replay (p1_id, p2_id, winner_id) rows in chronological order.
+
+    Returns {player_id: [wins, losses, elo]}.
+    """
+    table = {}
+    for p1_id, p2_id, winner_id in matches:
+        a = table.get(p1_id)
+        if a is None:
+            a = table[p1_id] = [0, 0, start]
+        b = table.get(p2_id)
+        if b is None:
+            b = table[p2_id] = [0, 0, start]
+        score = match_score(p1_id, winner_id)
+        delta = elo_delta(a[2], b[2], score, k_factor)
+        a[2] = max(0, a[2] + delta)
+        b[2] = max(0, b[2] - delta)
+        if score == 1.0:
+            a[0] += 1
+            b[1] += 1
+        elif score == 0.0:
+            a[1] += 1
+            b[0] += 1
+    return table
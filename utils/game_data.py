@@ -146,6 +146,26 @@ TERRITORIES_SEED = [
     {"key": "skyline_heights",   "name": "Skyline Heights",   "description": "Luxury apartments in the clouds. The elite look down on everyone else.", "income": 800, "defense": 80},
 ]
 
+# Street connections between districts (undirected) — the seeded 3×3 grid
+# plus the tunnels out of the Undercity.  Factions may only attack districts
+# bordering ones they already hold.
+TERRITORY_LINKS_SEED = [
+    ("industrial_sector", "chrome_district"),
+    ("chrome_district",   "downtown_core"),
+    ("port_authority",    "central_plaza"),
+    ("central_plaza",     "corp_towers"),
+    ("undercity",         "tech_quarter"),
+    ("tech_quarter",      "skyline_heights"),
+    ("industrial_sector", "port_authority"),
+    ("port_authority",    "undercity"),
+    ("chrome_district",   "central_plaza"),
+    ("central_plaza",     "tech_quarter"),
+    ("downtown_core",     "corp_towers"),
+    ("corp_towers",       "skyline_heights"),
+    ("undercity",         "industrial_sector"),
+    ("undercity",         "downtown_core"),
+]
+
 # ── SKILL TREES ──────────────────────────────────────────────────────────────
 # Three branches.  Each node has a parent (None = root), cost in credits,
 # and the stat bonus unlocked at level 1 (cumulative on upgrade).
@@ -405,8 +425,11 @@ STORY_NODES = {
 }
 
 # ── RANDOM EVENTS ────────────────────────────────────────────────────────────
-# Picked randomly every 30 min by the events cog.  effect is purely flavour;
-# actual mechanical changes are applied in the cog after the embed posts.
+# Picked randomly every 30 min by the scheduler.  effect is purely flavour;
+# the mechanics are applied by database.apply_event: credit_mod / rep_mod /
+# hp_mod hit every player (hp_mod spares holders of the hp_immune item), and
+# modifier is a timed world modifier (utils/modifiers) — an implant_mult of
+# None is rolled per implant (×0 or ×2) when the event fires.
 RANDOM_EVENTS = [
     {
         "key":         "corp_raid",
@@ -415,6 +438,7 @@ RANDOM_EVENTS = [
         "effect":      "All trade prices inflated ×1.4 for 1 hour.",
         "credit_mod":  0,
         "rep_mod":     -10,
+        "modifier":    {"subsystem": "trade", "effects": {"price_mult": 1.4}, "minutes": 60},
     },
     {
         "key":         "blackout",
@@ -423,6 +447,7 @@ RANDOM_EVENTS = [
         "effect":      "PvP accuracy reduced by 20% for 1 hour.",
         "credit_mod":  0,
         "rep_mod":     0,
+        "modifier":    {"subsystem": "combat", "effects": {"atk_mult": 0.8}, "minutes": 60},
     },
     {
         "key":         "data_leak",
@@ -437,9 +462,10 @@ RANDOM_EVENTS = [
         "key":         "gang_war",
         "title":       "STREET GANG WAR",
         "description": "Two mid-tier gangs lock down Void Street.  Nobody gets in or out.",
-        "effect":      "Void Street territory defense +20 for 2 hours.",
+        "effect":      "Undercity (Void Street) defense +20 for 2 hours.",
         "credit_mod":  0,
         "rep_mod":     0,
+        "modifier":    {"subsystem": "territory", "effects": {"defense_bonus": {"undercity": 20}}, "minutes": 120},
     },
     {
         "key":         "orbital_debris",
@@ -457,6 +483,8 @@ RANDOM_EVENTS = [
         "effect":      "All players lose 15 HP unless they own a MedKit.",
         "credit_mod":  0,
         "rep_mod":     0,
+        "hp_mod":      -15,
+        "hp_immune":   "MedKit",
     },
     {
         "key":         "arms_drop",
@@ -473,6 +501,7 @@ RANDOM_EVENTS = [
         "effect":      "Implant bonuses randomly doubled or zeroed for 1 hour.",
         "credit_mod":  0,
         "rep_mod":     0,
+        "modifier":    {"subsystem": "implants", "effects": {"implant_mult": None}, "minutes": 60},
     },
     {
         "key":         "tax_crackdown",
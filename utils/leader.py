@@ -0,0 +1,90 @@
+# utils/leader.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Leader election between bot replicas over a Postgres session advisory lock.
+#
+# Every replica polls pg_try_advisory_lock on its own dedicated connection
+# (not the pool — the lock belongs to the session).  The winner renews its
+# lease with a heartbeat every LEADER_RENEW_SECONDS; the session is opened
+# with idle_session_timeout = LEADER_LEASE_SECONDS, so a leader that hangs or
+# loses the network is disconnected by the server and its lock released.  A
+# leader that misses a heartbeat steps down at once, before anyone else can
+# take over.  A replica whose process dies drops the lock with its socket.
+# ─────────────────────────────────────────────────────────────────────────────
+import asyncio
+import logging
+
+import asyncpg
+
+from utils.database import DATABASE_URL
+
+logger = logging.getLogger('riskpunk')
+
+LEADER_LOCK_KEY = 0x5249534B       # "RISK"
+LEADER_RENEW_SECONDS = 5
+LEADER_LEASE_SECONDS = 15
+
+
+class LeaderElection:
+    """Holds (or keeps trying for) the cluster-wide leader lock."""
+
+    def __init__(self, key: int = LEADER_LOCK_KEY):
+        self.key = key
+        self.is_leader = False
+        self._conn = None
+        self._task = None
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self._drop(unlock=True)
+
+    async def _connect(self):
+        conn = await asyncpg.connect(DATABASE_URL, server_settings={"application_name": "riskpunk-leader"})
+        try:
+            await conn.execute(f"SET idle_session_timeout = '{LEADER_LEASE_SECONDS}s'")
+        except asyncpg.PostgresError:
+            # Pre-14 servers: fall back to TCP teardown only
+            logger.warning("Leader lease: idle_session_timeout unsupported, relying on disconnect")
+        return conn
+
+    async def _drop(self, unlock=False):
+        if self.is_leader:
+            logger.warning("Leader lock released — this replica is now a follower")
+        self.is_leader = False
+        conn, self._conn = self._conn, None
+        if conn is not None:
+            try:
+                if unlock:
+                    await conn.execute("SELECT pg_advisory_unlock_all()")
+                await conn.close(timeout=2)
+            except Exception:
+                conn.terminate()
+
+    async def _run(self):
+        while True:
+            try:
+                if self._conn is None:
+                    self._conn = await self._connect()
+                if self.is_leader:
+                    await asyncio.wait_for(self._conn.fetchval("SELECT 1"), timeout=LEADER_RENEW_SECONDS)
+                else:
+                    self.is_leader = await asyncio.wait_for(
+                        self._conn.fetchval("SELECT pg_try_advisory_lock($1)", self.key),
+                        timeout=LEADER_RENEW_SECONDS
+                    )
+                    if self.is_leader:
+                        logger.info("Leader lock acquired — this replica runs scheduled jobs")
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Leader heartbeat failed: {e}")
+                await self._drop()
+            await asyncio.sleep(LEADER_RENEW_SECONDS)
+
+
+leader = LeaderElection()
@@ -0,0 +1,643 @@
+# utils/map_render.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Territory map renderer.  render_map_png works on a plain-data snapshot
+# (tuples / dicts, no asyncpg records) so it can run in a worker process;
+# render_map wraps it in a bounded process pool and records render timings;
+# render_map_cached keys finished images on (territory version, viewer faction);
+# render_history_cached animates ownership changes over a time range.
+# ─────────────────────────────────────────────────────────────────────────────
+import asyncio
+import io
+import logging
+import math
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from urllib.parse import urlparse, parse_qs
+
+# Try to import PIL, fallback to text mode if not available
+try:
+    from PIL import Image, ImageDraw, ImageFont
+    PIL_AVAILABLE = True
+except ImportError:
+    PIL_AVAILABLE = False
+
+logger = logging.getLogger('riskpunk')
+
+
+# ── Layout ──────────────────────────────────────────────────────────────────
+# Districts sit on a grid of cells.  A territory with grid_x/grid_y set in the
+# DB keeps that cell; the rest are packed (in id order) into the free cells,
+# one sector after another.  The image shows one sector —
+# a VIEW_COLS × VIEW_ROWS window of cells — at a time, so render cost depends
+# on the tiles in view, not on the size of the city.
+CELL_W, CELL_H = 200, 150
+CELL_PITCH_X, CELL_PITCH_Y = 230, 180
+GRID_ORIGIN_X, GRID_ORIGIN_Y = 50, 50
+VIEW_COLS, VIEW_ROWS = 3, 3
+
+FACTION_MAP_COLORS = {
+    "omnicorp": (91, 94, 166),
+    "solarflare": (255, 107, 0),
+    "netrunners": (0, 255, 255),
+    "ironveil": (192, 192, 192),
+    "phantomcell": (155, 89, 182),
+    "neutral": (100, 100, 100)
+}
+
+MAP_WIDTH, MAP_HEIGHT = 760, 610
+
+# Output encoding.  The map is ~20 flat colours plus anti-aliased text, so a
+# 64-colour palette PNG is less than half the size of the RGB one and cheaper
+# to deflate.  Set MAP_PNG_PALETTE=0 to keep RGB.
+MAP_IMAGE_FORMAT = os.getenv("MAP_IMAGE_FORMAT", "png").lower()        # png | webp
+MAP_PNG_PALETTE = int(os.getenv("MAP_PNG_PALETTE", "64"))
+MAP_PNG_COMPRESS_LEVEL = int(os.getenv("MAP_PNG_COMPRESS_LEVEL", "6"))
+MAP_FILENAME = "map.webp" if MAP_IMAGE_FORMAT == "webp" else "map.png"
+
+# Named options compared by compare_encodings
+ENCODINGS = {
+    "png-rgb-l6":    {"fmt": "png", "palette": 0, "compress_level": 6},
+    "png-rgb-l1":    {"fmt": "png", "palette": 0, "compress_level": 1},
+    "png-p64-l6":    {"fmt": "png", "palette": 64, "compress_level": 6},
+    "png-p64-l9":    {"fmt": "png", "palette": 64, "compress_level": 9},
+    "png-p256-l6":   {"fmt": "png", "palette": 256, "compress_level": 6},
+    "webp-lossless": {"fmt": "webp", "lossless": True},
+    "webp-q80":      {"fmt": "webp", "lossless": False, "quality": 80},
+}
+
+RENDER_WORKERS = 2
+RENDER_MAX_QUEUE = 8       # Renders queued or running before new requests are refused
+
+
+def compute_layout(rows) -> dict:
+    """
+    {territory key: (col, row)} for rows ordered by id.  Explicit grid_x /
+    grid_y win; everything else is packed one full sector at a time (row-major
+    inside the sector), with sectors tiled in a roughly square block, so the
+    first VIEW_COLS x VIEW_ROWS districts always land in sector 0-0.
+    """
+    layout = {}
+    taken = set()
+    pending = []
+    for r in rows:
+        gx, gy = r["grid_x"], r["grid_y"]
+        if gx is not None and gy is not None and (gx, gy) not in taken:
+            layout[r["key"]] = (gx, gy)
+            taken.add((gx, gy))
+        else:
+            pending.append(r["key"])
+    per_sector = VIEW_COLS * VIEW_ROWS
+    across = max(1, math.ceil(math.sqrt(math.ceil((len(layout) + len(pending)) / per_sector))))
+
+    def cell_at(i):
+        s, w = divmod(i, per_sector)
+        sx, sy = s % across, s // across
+        return sx * VIEW_COLS + w % VIEW_COLS, sy * VIEW_ROWS + w // VIEW_COLS
+
+    i = 0
+    for key in pending:
+        while cell_at(i) in taken:
+            i += 1
+        layout[key] = cell_at(i)
+        i += 1
+    return layout
+
+
+def sector_count(layout: dict) -> tuple:
+    """Number of sectors (viewports) across and down."""
+    if not layout:
+        return 1, 1
+    cols = max(c for c, _ in layout.values()) + 1
+    rows = max(r for _, r in layout.values()) + 1
+    return math.ceil(cols / VIEW_COLS), math.ceil(rows / VIEW_ROWS)
+
+
+def sector_of(cell: tuple) -> tuple:
+    return cell[0] // VIEW_COLS, cell[1] // VIEW_ROWS
+
+
+def map_snapshot(rows, sector: tuple = (0, 0), frontier=()) -> tuple:
+    """
+    Freeze the territories visible in one sector into picklable plain data
+    with their on-image pixel origin.
+
+    rows: territories (ordered by id) joined with their owning faction's key
+    and name (owner_faction, faction_key, faction_name), plus grid_x/grid_y.
+    frontier: keys the viewer's faction can attack; outlined on the map.
+    """
+    layout = compute_layout(rows)
+    sx, sy = sector
+    snapshot = []
+    for r in rows:
+        col, row = layout[r["key"]]
+        if sector_of((col, row)) != (sx, sy):
+            continue
+        snapshot.append({
+            "key":           r["key"],
+            "name":          r["name"],
+            "defense":       r["defense"],
+            "owner_faction": r["owner_faction"],
+            "faction_key":   r["faction_key"],
+            "faction_name":  r["faction_name"],
+            "x":             GRID_ORIGIN_X + (col - sx * VIEW_COLS) * CELL_PITCH_X,
+            "y":             GRID_ORIGIN_Y + (row - sy * VIEW_ROWS) * CELL_PITCH_Y,
+            "frontier":      r["key"] in frontier,
+        })
+    return tuple(snapshot)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# COMPOSITING
+# ═══════════════════════════════════════════════════════════════════════════
+# Everything static — fonts, background grid, title, legend — is built once
+# per process.  Each territory is drawn as its own tile (a crop of the base
+# layer, so the grid shows through the border) and cached by the handful of
+# fields it depends on; a render is then base copy + tile pastes + encode.
+
+def _load_fonts():
+    # Try custom fonts, fallback to default
+    try:
+        return (
+            ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans-Bold.ttf", 20),
+            ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 13),
+            ImageFont.truetype("/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf", 10),
+        )
+    except Exception:
+        default = ImageFont.load_default()
+        return default, default, default
+
+
+if PIL_AVAILABLE:
+    TITLE_FONT, LABEL_FONT, SMALL_FONT = _load_fonts()
+
+TILE_CACHE_SIZE = 512
+
+_base_layer = None
+_tile_cache = {}           # tile key -> Image, insertion-ordered for FIFO eviction
+
+
+def base_layer():
+    """Background grid, title and legend — identical for every render."""
+    global _base_layer
+    if _base_layer is not None:
+        return _base_layer
+    width, height = MAP_WIDTH, MAP_HEIGHT
+    img = Image.new('RGB', (width, height), color=(10, 14, 26))
+    draw = ImageDraw.Draw(img)
+
+    # Draw grid
+    for x in range(0, width, 40):
+        draw.line([(x, 0), (x, height)], fill=(20, 30, 50), width=1)
+    for y in range(0, height, 40):
+        draw.line([(0, y), (width, y)], fill=(20, 30, 50), width=1)
+
+    # Title
+    draw.text((width//2, 15), "RISK CITY - TERRITORY MAP", fill=(0, 255, 255), font=TITLE_FONT, anchor="mt")
+
+    # Legend
+    ly = height - 20
+    draw.rectangle([20, ly-4, 40, ly+4], fill=(0, 255, 255))
+    draw.text((45, ly), "Your Faction", fill=(200, 200, 200), font=SMALL_FONT, anchor="lm")
+
+    draw.rectangle([170, ly-4, 190, ly+4], fill=(150, 100, 100))
+    draw.text((195, ly), "Enemy", fill=(200, 200, 200), font=SMALL_FONT, anchor="lm")
+
+    draw.rectangle([270, ly-4, 290, ly+4], fill=(100, 100, 100))
+    draw.text((295, ly), "Neutral", fill=(200, 200, 200), font=SMALL_FONT, anchor="lm")
+
+    draw.rectangle([370, ly-4, 390, ly+4], outline=(255, 200, 0), width=2)
+    draw.text((395, ly), "In Reach", fill=(200, 200, 200), font=SMALL_FONT, anchor="lm")
+
+    _base_layer = img
+    return img
+
+
+def _tile_key(territory, player_faction_id) -> tuple:
+    is_yours = bool(territory['owner_faction']) and territory['owner_faction'] == player_faction_id
+    return (
+        territory['x'], territory['y'], territory['name'], territory['defense'],
+        territory['owner_faction'] and territory['faction_key'],
+        territory['owner_faction'] and territory['faction_name'],
+        territory.get('frontier', False),
+        is_yours,
+    )
+
+
+def _draw_tile(territory, is_yours: bool):
+    """Render one territory onto a crop of the base layer."""
+    x, y, w, h = territory['x'], territory['y'], CELL_W, CELL_H
+    tile = base_layer().crop((x, y, x + w + 1, y + h + 1))
+    draw = ImageDraw.Draw(tile)
+
+    # Get color
+    if territory['owner_faction']:
+        color = FACTION_MAP_COLORS.get(territory['faction_key'] or 'neutral', FACTION_MAP_COLORS['neutral'])
+        owner = territory['faction_name'].upper() if territory['faction_name'] else "NEUTRAL"
+    else:
+        color = FACTION_MAP_COLORS['neutral']
+        owner = "NEUTRAL"
+
+    # Draw background
+    draw.rectangle([5, 5, w-5, h-5], fill=color)
+
+    # Draw border
+    if is_yours:
+        border_col, border_w = (0, 255, 255), 3
+    elif territory.get('frontier'):
+        border_col, border_w = (255, 200, 0), 3
+    else:
+        border_col, border_w = (150, 150, 150), 2
+    draw.rectangle([0, 0, w, h], outline=border_col, width=border_w)
+
+    # Territory name
+    draw.text((w//2, 20), territory['name'], fill=(255, 255, 255), font=LABEL_FONT, anchor="mt")
+
+    # Owner
+    draw.text((w//2, h-50), owner, fill=(200, 200, 200), font=SMALL_FONT, anchor="mt")
+
+    # Defense bar
+    def_val = territory['defense']
+    bar_w = w - 40
+    bar_h = 8
+    bar_x = 20
+    bar_y = h - 25
+
+    draw.rectangle([bar_x, bar_y, bar_x+bar_w, bar_y+bar_h], fill=(40, 40, 40))
+    fill_w = int((def_val/100) * bar_w)
+    if fill_w > 0:
+        col = (0, 255, 100) if def_val > 70 else (255, 255, 0) if def_val > 40 else (255, 100, 100)
+        draw.rectangle([bar_x, bar_y, bar_x+fill_w, bar_y+bar_h], fill=col)
+
+    draw.text((w//2, bar_y-10), f"DEF:{def_val}", fill=(180, 180, 180), font=SMALL_FONT, anchor="mt")
+    return tile
+
+
+def _tile(territory, player_faction_id):
+    key = _tile_key(territory, player_faction_id)
+    tile = _tile_cache.get(key)
+    if tile is None:
+        tile = _draw_tile(territory, key[-1])
+        if len(_tile_cache) >= TILE_CACHE_SIZE:
+            del _tile_cache[next(iter(_tile_cache))]
+        _tile_cache[key] = tile
+    return tile
+
+
+def _draw_label(img, label):
+    ImageDraw.Draw(img).text((MAP_WIDTH - 20, MAP_HEIGHT - 20), label, fill=(0, 255, 255), font=SMALL_FONT, anchor="rm")
+
+
+def compose_map(territories, player_faction_id=None, label=None):
+    """Paste cached territory tiles onto the base layer; only changed tiles are drawn."""
+    img = base_layer().copy()
+    for territory in territories:
+        img.paste(_tile(territory, player_faction_id), (territory['x'], territory['y']))
+    if label:
+        _draw_label(img, label)
+    return img
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# ENCODING
+# ═══════════════════════════════════════════════════════════════════════════
+
+def encoding_label(fmt: str = MAP_IMAGE_FORMAT, palette: int = MAP_PNG_PALETTE,
+                   compress_level: int = MAP_PNG_COMPRESS_LEVEL, **opts) -> str:
+    if fmt == "webp":
+        return "webp-lossless" if opts.get("lossless", True) else f"webp-q{opts.get('quality', 80)}"
+    return f"png-{'p' + str(palette) if palette else 'rgb'}-l{compress_level}"
+
+
+def encode_map(img, fmt: str = MAP_IMAGE_FORMAT, palette: int = MAP_PNG_PALETTE,
+               compress_level: int = MAP_PNG_COMPRESS_LEVEL, lossless: bool = True,
+               quality: int = 80) -> bytes:
+    """Encode a composed map.  PNG optionally palette-quantized; WebP lossless or lossy."""
+    out = io.BytesIO()
+    if fmt == "webp":
+        img.save(out, format='WEBP', lossless=lossless, quality=quality)
+    else:
+        if palette:
+            img = img.quantize(colors=palette, method=Image.Quantize.FASTOCTREE)
+        img.save(out, format='PNG', compress_level=compress_level)
+    return out.getvalue()
+
+
+def render_map_png(territories, player_faction_id=None, label=None) -> tuple:
+    """
+    Compose and encode the map for one viewer with the configured encoding.
+    Returns (image_bytes, render_seconds, encode_seconds).
+    """
+    started = time.perf_counter()
+    img = compose_map(territories, player_faction_id, label)
+    composed = time.perf_counter()
+    data = encode_map(img)
+    done = time.perf_counter()
+    return data, done - started, done - composed
+
+
+def compare_encodings(territories, player_faction_id=None) -> list:
+    """Encode one composed map with every ENCODINGS option: [(label, bytes, encode_seconds)]."""
+    img = compose_map(territories, player_faction_id)
+    results = []
+    for label, opts in ENCODINGS.items():
+        started = time.perf_counter()
+        data = encode_map(img, **opts)
+        results.append((label, len(data), time.perf_counter() - started))
+    return results
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# RENDER POOL
+# ═══════════════════════════════════════════════════════════════════════════
+
+_executor = None
+_in_flight = 0
+
+# (territory_version, viewer_faction_id, sector) -> image bytes.  Only the
+# newest territory version is kept: one entry per faction (+ neutral) per
+# sector viewed, capped FIFO for very large cities.
+MAP_CACHE_SIZE = 256
+_png_cache = {}
+_pending = {}              # same key -> in-progress render task, shared by identical requests
+
+# Render metrics — render_s is time spent drawing + encoding in the worker,
+# wait_s is the caller's end-to-end latency including queueing.
+RENDER_METRICS = {
+    "renders":      0,
+    "cache_hits":   0,
+    "url_reuses":   0,
+    "rejected":     0,
+    "failed":       0,
+    "render_s_sum": 0.0,
+    "render_s_max": 0.0,
+    "wait_s_sum":   0.0,
+    "wait_s_max":   0.0,
+}
+
+# Per-encoding output size and encode time: label -> {count, bytes_sum, encode_s_sum}
+ENCODE_METRICS = {}
+
+
+def _record_encode(label: str, size: int, encode_s: float):
+    m = ENCODE_METRICS.setdefault(label, {"count": 0, "bytes_sum": 0, "encode_s_sum": 0.0})
+    m["count"] += 1
+    m["bytes_sum"] += size
+    m["encode_s_sum"] += encode_s
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # Each worker builds the static base layer as it starts
+        _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS, initializer=base_layer)
+    return _executor
+
+
+def shutdown_render_pool():
+    global _executor, _history_executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+    if _history_executor is not None:
+        _history_executor.shutdown(wait=False, cancel_futures=True)
+        _history_executor = None
+
+
+def render_stats() -> dict:
+    """Snapshot of RENDER_METRICS plus averages and the current queue depth."""
+    stats = dict(RENDER_METRICS, in_flight=_in_flight)
+    n = RENDER_METRICS["renders"]
+    stats["render_s_avg"] = RENDER_METRICS["render_s_sum"] / n if n else 0.0
+    stats["wait_s_avg"] = RENDER_METRICS["wait_s_sum"] / n if n else 0.0
+    return stats
+
+
+async def render_map(territories, player_faction_id=None, label=None):
+    """
+    Render off the event loop.  Returns encoded bytes, or None when Pillow is
+    missing, the queue is full or the worker failed — callers fall back to
+    the text map.
+    """
+    global _in_flight
+    if not PIL_AVAILABLE:
+        return None
+    if _in_flight >= RENDER_MAX_QUEUE:
+        RENDER_METRICS["rejected"] += 1
+        return None
+
+    _in_flight += 1
+    started = time.perf_counter()
+    try:
+        loop = asyncio.get_running_loop()
+        png, render_s, encode_s = await loop.run_in_executor(
+            _get_executor(), render_map_png, territories, player_faction_id, label
+        )
+    except Exception as e:
+        RENDER_METRICS["failed"] += 1
+        logger.error(f"Map image generation failed: {e}")
+        return None
+    finally:
+        _in_flight -= 1
+
+    wait_s = time.perf_counter() - started
+    RENDER_METRICS["renders"] += 1
+    RENDER_METRICS["render_s_sum"] += render_s
+    RENDER_METRICS["render_s_max"] = max(RENDER_METRICS["render_s_max"], render_s)
+    RENDER_METRICS["wait_s_sum"] += wait_s
+    RENDER_METRICS["wait_s_max"] = max(RENDER_METRICS["wait_s_max"], wait_s)
+    _record_encode(encoding_label(), len(png), encode_s)
+    return png
+
+
+async def benchmark_encodings(territories, player_faction_id=None) -> list:
+    """Run compare_encodings in the render pool and fold the results into ENCODE_METRICS."""
+    loop = asyncio.get_running_loop()
+    results = await loop.run_in_executor(_get_executor(), compare_encodings, territories, player_faction_id)
+    for label, size, encode_s in results:
+        _record_encode(label, size, encode_s)
+    return results
+
+
+async def _render_and_store(key: tuple, load_snapshot):
+    version, player_faction_id, _ = key
+    territories, label = await load_snapshot()
+    png = await render_map(territories, player_faction_id, label)
+    if png and all(k[0] <= version for k in _png_cache):
+        for stale in [k for k in _png_cache if k[0] < version]:
+            del _png_cache[stale]
+        if len(_png_cache) >= MAP_CACHE_SIZE:
+            del _png_cache[next(iter(_png_cache))]
+        _png_cache[key] = png
+    return png
+
+
+async def render_map_cached(version: int, player_faction_id, load_snapshot, sector: tuple = (0, 0)):
+    """
+    Cached render_map.  `version` is the territory-state version read
+    *before* loading the snapshot; `load_snapshot` is an async callable
+    returning (territories, label), only awaited on a cache miss.
+    Concurrent identical misses share one render.
+    """
+    key = (version, player_faction_id, sector)
+    png = _png_cache.get(key)
+    if png is not None:
+        RENDER_METRICS["cache_hits"] += 1
+        return png
+    task = _pending.get(key)
+    if task is None:
+        task = _pending[key] = asyncio.ensure_future(_render_and_store(key, load_snapshot))
+        task.add_done_callback(lambda _t: _pending.pop(key, None))
+    return await asyncio.shield(task)
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# CDN URL REUSE
+# ═══════════════════════════════════════════════════════════════════════════
+# Once a render has been posted, Discord already hosts it.  Remember the
+# attachment URL per (territory version, viewer faction, sector) and point embeds at
+# it instead of uploading the same PNG again.  Signed CDN URLs carry their
+# expiry as a hex `ex` query parameter; unsigned ones get a fixed TTL.
+
+CDN_URL_TTL = 12 * 3600        # Used when the URL carries no expiry
+CDN_URL_MARGIN = 300           # Stop reusing a URL this many seconds before it expires
+
+_cdn_urls = {}                 # (territory_version, viewer_faction_id, sector) -> (url, expires_at)
+
+
+def _url_expiry(url: str) -> float:
+    try:
+        return float(int(parse_qs(urlparse(url).query)["ex"][0], 16))
+    except (KeyError, IndexError, ValueError):
+        return time.time() + CDN_URL_TTL
+
+
+def cached_map_url(key: tuple):
+    """Live CDN URL for this render, or None if it must be uploaded."""
+    hit = _cdn_urls.get(key)
+    if hit is None:
+        return None
+    url, expires_at = hit
+    if time.time() >= expires_at - CDN_URL_MARGIN:
+        del _cdn_urls[key]
+        return None
+    RENDER_METRICS["url_reuses"] += 1
+    return url
+
+
+def remember_map_url(key: tuple, url: str):
+    for stale in [k for k in _cdn_urls if k[0] < key[0]]:
+        del _cdn_urls[stale]
+    if key not in _cdn_urls and len(_cdn_urls) >= MAP_CACHE_SIZE:
+        del _cdn_urls[next(iter(_cdn_urls))]
+    _cdn_urls[key] = (url, _url_expiry(url))
+
+
+# ═══════════════════════════════════════════════════════════════════════════
+# HISTORY ANIMATION
+# ═══════════════════════════════════════════════════════════════════════════
+# The caller streams ownership events in time order and folds them into
+# per-frame diffs, so the worker only receives the opening snapshot plus the
+# tiles that changed in each frame: every frame is the previous one with
+# those tiles (and the date label) pasted over it.  Animations get their own
+# single worker so a long timeline never queues behind live map renders, and
+# are cached by (start, end, viewer faction, sector) — a closed time range
+# never changes.
+
+MAP_HISTORY_FORMAT = os.getenv("MAP_HISTORY_FORMAT", "gif").lower()   # gif | apng
+HISTORY_FILENAME = "map_history.png" if MAP_HISTORY_FORMAT == "apng" else "map_history.gif"
+HISTORY_WORKERS = 1
+HISTORY_FRAME_MS = 700
+HISTORY_HOLD_MS = 2500     # Opening and closing frames stay up longer
+HISTORY_CACHE_SIZE = 16
+_LABEL_BOX = (MAP_WIDTH - 300, MAP_HEIGHT - 34, MAP_WIDTH - 10, MAP_HEIGHT - 6)
+
+_history_executor = None
+_history_cache = {}        # (start, end, viewer_faction_id, sector) -> image bytes
+_history_pending = {}
+
+
+def render_history_frames(territories, player_faction_id, frames, fmt: str = MAP_HISTORY_FORMAT) -> tuple:
+    """
+    Encode a territory-control animation.
+
+    territories: map_snapshot at the start of the range.  frames: [(label,
+    {territory key: changed fields})] in time order.  Returns
+    (image_bytes, render_seconds).
+    """
+    started = time.perf_counter()
+    state = {t['key']: dict(t) for t in territories}
+    img = compose_map(territories, player_faction_id)
+    blank_label = base_layer().crop(_LABEL_BOX)
+    images = []
+    palette = None
+    for label, changes in frames:
+        img = img.copy()
+        for key, fields in changes.items():
+            territory = state.get(key)
+            if territory is None:
+                continue
+            territory.update(fields)
+            img.paste(_tile(territory, player_faction_id), (territory['x'], territory['y']))
+        img.paste(blank_label, _LABEL_BOX[:2])
+        _draw_label(img, label)
+        # One shared palette keeps colours stable between frames
+        if palette is None:
+            palette = img.quantize(colors=MAP_PNG_PALETTE or 64, method=Image.Quantize.FASTOCTREE)
+            images.append(palette)
+        else:
+            images.append(img.quantize(palette=palette, dither=Image.Dither.NONE))
+
+    durations = [HISTORY_FRAME_MS] * len(images)
+    durations[0] = durations[-1] = HISTORY_HOLD_MS
+    out = io.BytesIO()
+    images[0].save(
+        out, format='PNG' if fmt == "apng" else 'GIF', save_all=True,
+        append_images=images[1:], duration=durations, loop=0
+    )
+    return out.getvalue(), time.perf_counter() - started
+
+
+def _get_history_executor() -> ProcessPoolExecutor:
+    global _history_executor
+    if _history_executor is None:
+        _history_executor = ProcessPoolExecutor(max_workers=HISTORY_WORKERS, initializer=base_layer)
+    return _history_executor
+
+
+async def _render_history(key: tuple, load_frames):
+    _, _, player_faction_id, _ = key
+    territories, frames = await load_frames()
+    try:
+        loop = asyncio.get_running_loop()
+        data, render_s = await loop.run_in_executor(
+            _get_history_executor(), render_history_frames, territories, player_faction_id, frames
+        )
+    except Exception as e:
+        logger.error(f"Map history render failed: {e}")
+        return None
+    logger.info(f"Map history {key[0]:%Y-%m-%d} → {key[1]:%Y-%m-%d}: {len(frames)} frames, "
+                f"{len(data) / 1024:.0f} KB in {render_s:.2f}s")
+    if len(_history_cache) >= HISTORY_CACHE_SIZE:
+        del _history_cache[next(iter(_history_cache))]
+    _history_cache[key] = data
+    return data
+
+
+async def render_history_cached(start, end, player_faction_id, load_frames, sector: tuple = (0, 0)):
+    """
+    Animated map for the closed range (start, end].  `load_frames` is an
+    async callable returning (opening snapshot, frames), only awaited on a
+    cache miss; concurrent identical requests share one render.
+    """
+    if not PIL_AVAILABLE:
+        return None
+    key = (start, end, player_faction_id, sector)
+    data = _history_cache.get(key)
+    if data is not None:
+        return data
+    task = _history_pending.get(key)
+    if task is None:
+        task = _history_pending[key] = asyncio.ensure_future(_render_history(key, load_frames))
+        task.add_done_callback(lambda _t: _history_pending.pop(key, None))
+    return await asyncio.shield(task)
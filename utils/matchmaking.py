@@ -0,0 +1,97 @@
+# utils/matchmaking.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Rating-ordered PvP queue.  Pure Python — the cog owns the tick and the DB.
+#
+# Waiting players live in fixed-width ELO buckets.  join/leave touch one
+# bucket dict (O(1)); a bucket key is only insorted into the ordered key list
+# when it first becomes non-empty, so that list stays as small as the rating
+# spread (O(log B) search).  A tick walks the buckets in rating order and
+# greedily pairs neighbours whose gap fits inside both players' search window.
+# ─────────────────────────────────────────────────────────────────────────────
+import bisect
+import time
+
+BUCKET_WIDTH = 50          # ELO points per bucket
+WINDOW_BASE = 50           # Initial acceptable rating gap
+WINDOW_GROWTH = 25         # Extra gap allowed per WINDOW_STEP seconds waited
+WINDOW_STEP = 10
+WINDOW_MAX = 400
+
+
+def search_window(waited: float) -> int:
+    """Acceptable rating gap after waiting `waited` seconds."""
+    return min(WINDOW_MAX, WINDOW_BASE + WINDOW_GROWTH * int(waited // WINDOW_STEP))
+
+
+class MatchQueue:
+    """Players waiting for a ranked duel, indexed by rating bucket."""
+
+    def __init__(self):
+        self._buckets = {}      # bucket key -> {player_id: entry}
+        self._keys = []         # sorted non-empty bucket keys
+        self._where = {}        # player_id -> bucket key
+
+    def __len__(self):
+        return len(self._where)
+
+    def __contains__(self, player_id):
+        return player_id in self._where
+
+    def join(self, player_id: int, elo: int, now: float = None, **info) -> dict:
+        """Queue a player.  Extra keyword info (name, stance, channel…) rides along."""
+        if player_id in self._where:
+            raise ValueError("already queued")
+        entry = dict(info, player_id=player_id, elo=elo, joined_at=time.monotonic() if now is None else now)
+        key = elo // BUCKET_WIDTH
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = {}
+            bisect.insort(self._keys, key)
+        bucket[player_id] = entry
+        self._where[player_id] = key
+        return entry
+
+    def leave(self, player_id: int):
+        """Remove a player; returns their entry or None if they weren't queued."""
+        key = self._where.pop(player_id, None)
+        if key is None:
+            return None
+        bucket = self._buckets[key]
+        entry = bucket.pop(player_id)
+        if not bucket:
+            del self._buckets[key]
+            del self._keys[bisect.bisect_left(self._keys, key)]
+        return entry
+
+    def get(self, player_id: int):
+        key = self._where.get(player_id)
+        return None if key is None else self._buckets[key][player_id]
+
+    def pop_matches(self, now: float = None, limit: int = None) -> list:
+        """
+        Pair and dequeue players whose rating gap fits both search windows.
+
+        Walks entries in rating order and pairs each with its nearest
+        unpaired neighbour.  Returns up to `limit` (entry_a, entry_b) tuples.
+        """
+        now = time.monotonic() if now is None else now
+        pairs = []
+        prev = None
+        prev_window = 0
+        for key in self._keys:
+            for entry in sorted(self._buckets[key].values(), key=lambda e: e["elo"]):
+                window = search_window(now - entry["joined_at"])
+                if prev is not None and entry["elo"] - prev["elo"] <= min(window, prev_window):
+                    pairs.append((prev, entry))
+                    prev = None
+                    if limit is not None and len(pairs) >= limit:
+                        break
+                    continue
+                prev, prev_window = entry, window
+            else:
+                continue
+            break
+        for a, b in pairs:
+            self.leave(a["player_id"])
+            self.leave(b["player_id"])
+        return pairs
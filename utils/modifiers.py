@@ -0,0 +1,112 @@
+# utils/modifiers.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Timed world modifiers (event effects such as "trade prices ×1.4 for 1 hour").
+# Pure Python — utils/database keeps the live instance in sync with the
+# world_modifiers table.
+#
+# Modifiers are grouped by subsystem and each subsystem's effects are folded
+# into one combined dict whenever the set changes, so a lookup is a dict
+# read.  Expiry is a min-heap on expires_at: a lookup only peeks at the heap
+# top, and pops (then re-folds the affected subsystem) when something lapsed.
+#
+# Effect keys ending in _mult multiply, keys ending in _bonus add; a dict
+# value (e.g. per implant or per territory) combines per inner key.
+# ─────────────────────────────────────────────────────────────────────────────
+import heapq
+import random
+import time
+
+SUBSYSTEMS = ("trade", "combat", "implants", "territory")
+
+
+def _combine(into: dict, effects: dict):
+    for key, value in effects.items():
+        mult = key.endswith("_mult")
+        identity = 1.0 if mult else 0
+        if isinstance(value, dict):
+            inner = into.setdefault(key, {})
+            for k, v in value.items():
+                inner[k] = inner.get(k, identity) * v if mult else inner.get(k, identity) + v
+        else:
+            into[key] = into.get(key, identity) * value if mult else into.get(key, identity) + value
+
+
+def resolve_modifier(spec, implant_keys, rng=None):
+    """
+    Turn an event's modifier spec (or None) into the one to store: an
+    implant_mult of None is rolled per implant, each one doubled or zeroed.
+    """
+    if not spec:
+        return None
+    rng = rng or random.Random()
+    effects = dict(spec["effects"])
+    if "implant_mult" in effects and effects["implant_mult"] is None:
+        effects["implant_mult"] = {key: rng.choice((0, 2)) for key in implant_keys}
+    return dict(spec, effects=effects)
+
+
+class ActiveModifiers:
+    """Live modifiers indexed by subsystem, expiring off a min-heap."""
+
+    def __init__(self):
+        self._by_subsystem = {s: {} for s in SUBSYSTEMS}   # subsystem -> {id: modifier}
+        self._combined = {s: {} for s in SUBSYSTEMS}
+        self._heap = []                                    # (expires_at, id, subsystem)
+
+    def add(self, mod_id: int, subsystem: str, effects: dict, expires_at: float, source: str = None):
+        """Register a modifier; expires_at is a time.time() timestamp."""
+        if subsystem not in self._by_subsystem or mod_id in self._by_subsystem[subsystem]:
+            return
+        self._by_subsystem[subsystem][mod_id] = {
+            "id": mod_id, "effects": effects, "expires_at": expires_at, "source": source,
+        }
+        heapq.heappush(self._heap, (expires_at, mod_id, subsystem))
+        self._refold(subsystem)
+
+    def _refold(self, subsystem: str):
+        combined = {}
+        for mod in self._by_subsystem[subsystem].values():
+            _combine(combined, mod["effects"])
+        self._combined[subsystem] = combined
+
+    def _expire(self, now: float):
+        touched = set()
+        while self._heap and self._heap[0][0] <= now:
+            _, mod_id, subsystem = heapq.heappop(self._heap)
+            if self._by_subsystem[subsystem].pop(mod_id, None) is not None:
+                touched.add(subsystem)
+        for subsystem in touched:
+            self._refold(subsystem)
+
+    def effects(self, subsystem: str, now: float = None) -> dict:
+        """Combined live effects for one subsystem ({} when nothing is active)."""
+        if self._heap:
+            now = time.time() if now is None else now
+            if self._heap[0][0] <= now:
+                self._expire(now)
+        return self._combined.get(subsystem, {})
+
+    def ids(self) -> list:
+        """Ids of every loaded modifier (lapsed ones included until popped)."""
+        return [mod_id for ms in self._by_subsystem.values() for mod_id in ms]
+
+    def active(self, now: float = None) -> list:
+        """All live modifiers with their subsystem, soonest expiry first."""
+        self._expire(time.time() if now is None else now)
+        mods = [dict(m, subsystem=s) for s, ms in self._by_subsystem.items() for m in ms.values()]
+        return sorted(mods, key=lambda m: m["expires_at"])
+
+    # ── Hot-path accessors ──────────────────────────────────────────────
+    def price_mult(self) -> float:
+        return self.effects("trade").get("price_mult", 1.0)
+
+    def combat_effects(self) -> dict:
+        """What compute_effective_stats needs: combat multipliers plus implant multipliers."""
+        combat = self.effects("combat")
+        implants = self.effects("implants")
+        if not combat and not implants:
+            return {}
+        return dict(combat, **implants)
+
+    def defense_bonus(self, territory_key: str) -> int:
+        return self.effects("territory").get("defense_bonus", {}).get(territory_key, 0)
@@ -200,6 +200,8 @@ def leaderboard_embed(players, sort_label: str = "Credits") -> RiskEmbed:
         medal = medals[i] if i < 3 else f"`#{i+1}`"
         if sort_label == "Credits":
             val = f"{p['credits']:,.0f} ₵"
+        elif sort_label == "Net Worth":
+            val = f"{p['net_worth']:,.0f} ₵"
         elif sort_label == "Level":
             val = f"Lvl {p['level']}"
         else:
@@ -0,0 +1,95 @@
+# utils/territory_graph.py
+# ─────────────────────────────────────────────────────────────────────────────
+# District adjacency and per-faction reach.  Pure Python — utils/database owns
+# the loaded instance and feeds it captures.
+#
+# Links are undirected.  Hop distances for every pair are computed once per
+# topology (BFS from each node, O(V·(V+E))).  Ownership changes never touch
+# them; they only shift the per-faction frontier — the unowned-by-you
+# districts next to something you hold — and that is maintained by counting
+# owned neighbours, so a capture costs O(degree) and every lookup is a set
+# or dict probe.
+# ─────────────────────────────────────────────────────────────────────────────
+from collections import deque
+
+
+class TerritoryGraph:
+    """Adjacency, all-pairs hop distances and faction frontiers."""
+
+    def __init__(self, keys, links, owners=None):
+        self.adjacent = {k: set() for k in keys}
+        for a, b in links:
+            if a in self.adjacent and b in self.adjacent and a != b:
+                self.adjacent[a].add(b)
+                self.adjacent[b].add(a)
+        self.distance = {k: self._bfs(k) for k in self.adjacent}
+        self.owner = {}
+        self._held = {}        # faction -> set of keys it owns
+        self._touching = {}    # faction -> {key: owned neighbours of key}
+        self._frontier = {}    # faction -> set of attackable keys
+        for key, faction in (owners or {}).items():
+            self.set_owner(key, faction)
+
+    def _bfs(self, start) -> dict:
+        dist = {start: 0}
+        queue = deque([start])
+        while queue:
+            node = queue.popleft()
+            for nxt in self.adjacent[node]:
+                if nxt not in dist:
+                    dist[nxt] = dist[node] + 1
+                    queue.append(nxt)
+        return dist
+
+    def hops(self, a, b):
+        """Shortest path length between two districts, or None if unreachable."""
+        return self.distance.get(a, {}).get(b)
+
+    def _refresh(self, faction, key):
+        touching = self._touching.get(faction, {})
+        frontier = self._frontier.setdefault(faction, set())
+        if touching.get(key) and self.owner.get(key) != faction:
+            frontier.add(key)
+        else:
+            frontier.discard(key)
+
+    def set_owner(self, key, faction):
+        """Move `key` to `faction` (None = neutral), updating both sides' frontiers."""
+        if key not in self.adjacent:
+            return
+        old = self.owner.get(key)
+        if old == faction and key in self.owner:
+            return
+        self.owner[key] = faction
+        if old is not None:
+            self._held[old].discard(key)
+            touching = self._touching[old]
+            for n in self.adjacent[key]:
+                touching[n] -= 1
+                if not touching[n]:
+                    del touching[n]
+                self._refresh(old, n)
+            self._refresh(old, key)
+        if faction is not None:
+            self._held.setdefault(faction, set()).add(key)
+            touching = self._touching.setdefault(faction, {})
+            for n in self.adjacent[key]:
+                touching[n] = touching.get(n, 0) + 1
+                self._refresh(faction, n)
+            self._refresh(faction, key)
+
+    def holdings(self, faction) -> set:
+        return self._held.get(faction, set())
+
+    def borders(self, faction) -> set:
+        """Districts `faction` doesn't own that touch one it does."""
+        return self._frontier.get(faction, set())
+
+    def can_attack(self, faction, key) -> bool:
+        """
+        Adjacent to the faction's holdings — or anywhere, for a faction that
+        holds nothing yet and needs a foothold.
+        """
+        if self.owner.get(key) == faction:
+            return False
+        return key in self.borders(faction) or not self.holdings(faction)
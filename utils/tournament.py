@@ -0,0 +1,63 @@
+# utils/tournament.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Single-elimination bracket logic.  Pure Python — resolve_batch runs inside
+# worker processes, so nothing here may touch Discord or the DB.
+#
+# A bracket is a flat list of player ids in bracket order (length a power of
+# two, None for a bye).  Slots 2i and 2i+1 meet in match i; the winner takes
+# slot i of the next round's list.
+# ─────────────────────────────────────────────────────────────────────────────
+import random
+
+from utils.combat import simulate_duel
+
+TOURNAMENT_SIZES = [4, 8, 16, 32, 64, 128, 256]
+
+
+def bracket_order(size: int) -> list:
+    """Seed numbers (1-based) in bracket order: 1 meets `size`, and 1/2 can only meet in the final."""
+    order = [1]
+    while len(order) < size:
+        n = len(order) * 2 + 1
+        order = [x for s in order for x in (s, n - s)]
+    return order
+
+
+def seed_bracket(player_ids: list) -> list:
+    """Place players (best seed first) into a power-of-two bracket; missing seeds become byes."""
+    size = 1
+    while size < len(player_ids):
+        size *= 2
+    return [player_ids[s - 1] if s <= len(player_ids) else None for s in bracket_order(size)]
+
+
+def round_pairs(bracket: list) -> list:
+    """[(slot, a, b)] for the current round."""
+    return [(i, bracket[2 * i], bracket[2 * i + 1]) for i in range(len(bracket) // 2)]
+
+
+def round_name(players_left: int) -> str:
+    return {2: "Final", 4: "Semifinals", 8: "Quarterfinals"}.get(players_left, f"Round of {players_left}")
+
+
+def resolve_batch(batch: list) -> list:
+    """
+    Fight a chunk of bracket matches.  batch: [(slot, seed, s1, s2)].
+
+    Returns [{"slot", "winner", "advance", "rounds"}] where winner is the
+    duel result (1, 2 or None) and advance is who moves on — draws go to
+    the side with more HP left, then to a coin flip from the same seeded RNG.
+    """
+    out = []
+    for slot, seed, s1, s2 in batch:
+        rng = random.Random(seed)
+        result = simulate_duel(s1, s2, rng)
+        winner = result["winner"]
+        if winner is not None:
+            advance = winner
+        elif result["hp1"] != result["hp2"]:
+            advance = 1 if result["hp1"] > result["hp2"] else 2
+        else:
+            advance = rng.choice((1, 2))
+        out.append({"slot": slot, "winner": winner, "advance": advance, "rounds": result["rounds"]})
+    return out
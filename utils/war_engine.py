@@ -0,0 +1,82 @@
+# utils/war_engine.py
+# ─────────────────────────────────────────────────────────────────────────────
+# Faction war resolution.  Pure Python — the scheduled tick loads every active
+# war, faction power and held district in a few set-based queries, hands them
+# to resolve_tick, and commits the returned transfers and endings in one
+# transaction.
+#
+# Each tick every war fights one battle: power is member stats plus
+# aggression per member (the formula the daily job used) plus a d100.  The
+# winner takes a loser district on its border when its margin beats half that
+# district's defense.  A district changes hands at most once per tick even if
+# its owner is fighting several wars; a war ends when the loser holds nothing.
+# ─────────────────────────────────────────────────────────────────────────────
+import random
+
+WAR_TICK_MINUTES = 10
+WAR_ROLL = 100             # d100 added to each side's power every battle
+WAR_DEFENSE_WEIGHT = 0.5   # Margin needed per point of the target's defense
+WAR_VICTORY_CREDITS = 2000
+WAR_VICTORY_XP = 150
+
+
+def faction_power(stats: int, members: int, aggression: int) -> int:
+    return stats + aggression * members
+
+
+def resolve_tick(wars, factions, territories, graph=None, rng=None) -> dict:
+    """
+    Fight one battle per war.
+
+    wars:        [(war_id, faction_a, faction_b)] in id order
+    factions:    {faction_id: {"name", "power"}}
+    territories: {key: {"name", "owner", "defense"}} for districts held by
+                 a faction at war
+    graph:       TerritoryGraph; captures prefer the winner's border
+                 (any loser district when none border it)
+
+    Returns {"battles": [...], "transfers": [(key, from, to)],
+             "endings": [(war_id, winner, loser)]}.
+    """
+    rng = rng or random.Random()
+    held = {}
+    for key, t in territories.items():
+        held.setdefault(t["owner"], set()).add(key)
+    taken = set()
+    battles, transfers, endings = [], [], []
+
+    for war_id, fa, fb in wars:
+        if fa not in factions or fb not in factions:
+            continue
+        roll_a = factions[fa]["power"] + rng.randint(0, WAR_ROLL)
+        roll_b = factions[fb]["power"] + rng.randint(0, WAR_ROLL)
+        winner, loser = (fa, fb) if roll_a > roll_b else (fb, fa)
+        margin = abs(roll_a - roll_b)
+
+        targets = sorted(held.get(loser, set()) - taken)
+        if graph is not None:
+            border = graph.borders(winner)
+            targets = [k for k in targets if k in border] or targets
+        captured = None
+        if targets:
+            key = rng.choice(targets)
+            if margin > territories[key]["defense"] * WAR_DEFENSE_WEIGHT:
+                captured = key
+                taken.add(key)
+                held[loser].discard(key)
+                held.setdefault(winner, set()).add(key)
+                territories[key]["owner"] = winner
+                transfers.append((key, loser, winner))
+
+        ended = not held.get(loser)
+        if ended:
+            endings.append((war_id, winner, loser))
+        battles.append({
+            "war_id":   war_id,
+            "winner":   winner,
+            "loser":    loser,
+            "power":    (max(roll_a, roll_b), min(roll_a, roll_b)),
+            "captured": captured,
+            "ended":    ended,
+        })
+    return {"battles": battles, "transfers": transfers, "endings": endings}